@@ -0,0 +1,5 @@
+"""
+Benchmarks for the compiler passes, run them as modules from the repository root:
+
+    python -m benchmarks.bench_lexer
+"""
@@ -0,0 +1,52 @@
+"""
+Time to build the CFG of procedures with more and more blocks. The targets of
+the branches are found in the label index of their function and the
+predecessors are kept by the blocks, so the time per block should stay about
+the same. Finding each target by walking the whole CFG, as the construction
+used to, is timed on the smaller procedures for comparison
+"""
+import contextlib
+import io
+import time
+
+import src.driver as driver
+from benchmarks.programs import branch_program
+from src.ControlFlow.CFG import CFG
+from src.lexer import Lexer, TokenStream
+
+SIZES = (500, 1000, 2000, 4000, 8000)
+SCANNED = 2000
+
+
+def lowered(text: str) -> 'LoweredBlock':
+    with contextlib.redirect_stdout(io.StringIO()):
+        return driver.front_end(TokenStream.from_lexer(Lexer(text)), optimize=0)
+
+
+def scan_targets(cfg: CFG) -> int:
+    """Find the target of every branch by walking the CFG, :return: the targets found"""
+    found = 0
+    for bb in cfg:
+        if bb.target_lab is not None:
+            found += any(other.label_in == bb.target_lab for other in cfg)
+    return found
+
+
+def main_bench():
+    print(f"{'statements':>10} {'blocks':>7} {'cfg':>10} {'us/block':>9} {'scan':>10}")
+    for n in SIZES:
+        program = lowered(branch_program(n))
+        start = time.perf_counter()
+        cfg = CFG(program)
+        elapsed = time.perf_counter() - start
+        blocks = sum(1 for _ in cfg)
+        scan = ''
+        if n <= SCANNED:
+            start = time.perf_counter()
+            scan_targets(cfg)
+            scan = f'{(time.perf_counter() - start) * 1000:>8.1f}ms'
+        print(f'{n:>10} {blocks:>7} {elapsed * 1000:>8.1f}ms {elapsed / blocks * 1e6:>9.2f} {scan:>10}')
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,82 @@
+"""
+The graph coloring allocator against the linear scan on lifetime intervals, on
+the functions of programs optimized at level 2: the time to allocate, the
+registers spilled, and the loads and stores of spilled registers the program
+runs, counted by running it with the interpreter and adding, for every basic
+block, the times it ran by the accesses of its statements to spilled
+registers. Spilling the registers used in loops costs more at run time than
+the number of registers spilled says, the spill costs of the coloring weigh the
+uses by the loop depth. The copies coalesced by the coloring get the register
+of their source and cost nothing at run time.
+
+The liveness of the blocks is computed before the timings. The objects built
+before are frozen, so that the collections of the garbage collector don't grow
+with them
+"""
+import contextlib
+import gc
+import io
+import time
+
+import src.driver as driver
+from benchmarks.programs import branch_program, generate_program, loop_program, strided_program
+from src.Allocator.GraphColoring import GraphColoringRegAlloc
+from src.Allocator.LinearScan import IntervalScanRegAlloc
+from src.Allocator.Regalloc import SPILL_FLAG
+from src.ControlFlow.Interpreter import run
+from src.lexer import Lexer, TokenStream
+
+
+def programs() -> list[tuple[str, str]]:
+    return [('random', generate_program(1000, procedures=4)),
+            ('nests', loop_program(20, with_calls=True)),
+            ('deep nests', loop_program(10, depth=3)),
+            ('sweeps', strided_program(8)),
+            ('branches', branch_program(500))]
+
+
+def spill_accesses(blocks: list['LoweredBlock'], allocs: list['AllocInfo'], runs: 'Counter') -> int:
+    """The accesses to spilled registers the program runs"""
+    total = 0
+    for block, alloc in zip(blocks, allocs):
+        for bb in block.orders().layout:
+            if runs[bb]:
+                accesses = sum(alloc.var_to_reg.get(var) == SPILL_FLAG
+                               for instr in bb.statements for var in instr.get_used() | instr.get_defined())
+                total += runs[bb] * accesses
+    return total
+
+
+def main_bench():
+    allocators = (('scan', IntervalScanRegAlloc), ('color', GraphColoringRegAlloc))
+    print(f"{'program':>12} {'executed':>9} " +
+          ' '.join(f"{f'{n} time':>11} {f'{n} spills':>12} {f'{n} accesses':>14}" for n, _ in allocators) +
+          f" {'coalesced':>9}")
+    for name, text in programs():
+        with contextlib.redirect_stdout(io.StringIO()):
+            cfg = driver.build_cfg(TokenStream.from_lexer(Lexer(text)), optimize=2)
+        interp = run(cfg, [5])
+        blocks = cfg.blocks_in_order()
+        for block in blocks:
+            cfg.function_liveness(block)
+        gc.collect()
+        gc.freeze()
+        row = f'{name:>12} {interp.executed:>9}'
+        coalesced = 0
+        for _, allocator in allocators:
+            allocs = []
+            elapsed = 0
+            for block in blocks:
+                start = time.perf_counter()
+                alloc = allocator(driver.NREGS, lambda _: block.orders().layout)
+                allocs.append(alloc(cfg))
+                elapsed += time.perf_counter() - start
+                coalesced += getattr(alloc, 'coalesced', 0)
+            spills = sum(a.numspill for a in allocs)
+            row += f' {elapsed * 1000:>9.1f}ms {spills:>12} {spill_accesses(blocks, allocs, interp.blocks):>14}'
+        gc.unfreeze()
+        print(row + f' {coalesced:>9}')
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,63 @@
+"""
+Statements removed by constant folding on the sample programs and on generated
+programs, counted in the lowered program with and without the pass. The counts
+reported by the pass itself must match
+"""
+import contextlib
+import io
+import time
+from collections import Counter
+
+import main
+import src.Codegen.Lowered as lwr
+import src.driver as driver
+from benchmarks.programs import generate_program
+from src.ControlFlow.CFG import CFG
+from src.lexer import Lexer, TokenStream
+from src.Optimizer.ConstFold import fold_constants
+
+SAMPLES = ['prog_1', 'prog_2_simple_fun', 'prog_3_nested']
+
+
+def corpus() -> list[tuple[str, str]]:
+    progs = [(name, getattr(main, name)) for name in SAMPLES]
+    for statements in [100, 1000, 5000]:
+        progs.append((f'{statements} statements', generate_program(statements, procedures=statements // 100)))
+    return progs
+
+
+def count_statements(tokens: TokenStream, optimize: int) -> Counter:
+    # Only the front end, the passes on the CFG would remove statements as well
+    with contextlib.redirect_stdout(io.StringIO()):
+        cfg = CFG(driver.front_end(tokens, optimize=optimize))
+    return Counter(type(instr) for _, instr in cfg.statements())
+
+
+def main_bench():
+    print(f"{'program':>18} {'BinStat':>8} {'folded':>8} {'removed':>8} {'UnaryStat':>10} {'folded':>8} "
+          f"{'pass ms':>8}")
+    total = Counter()
+    for name, text in corpus():
+        tokens = TokenStream.from_lexer(Lexer(text))
+        plain = count_statements(tokens, 0)
+        folded = count_statements(tokens, 1)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            prog = driver.PARSERS['classic'](tokens)
+        start = time.perf_counter()
+        folder = fold_constants(prog)
+        elapsed = time.perf_counter() - start
+
+        removed = plain[lwr.BinStat] - folded[lwr.BinStat]
+        if removed != folder.removed_binary or \
+                plain[lwr.UnaryStat] - folded[lwr.UnaryStat] != folder.removed_unary:
+            raise AssertionError(f'{name}: the pass reports {folder.report()}')
+        share = removed / max(plain[lwr.BinStat], 1)
+        print(f'{name:>18} {plain[lwr.BinStat]:>8} {folded[lwr.BinStat]:>8} {share:>8.1%} '
+              f'{plain[lwr.UnaryStat]:>10} {folded[lwr.UnaryStat]:>8} {elapsed * 1e3:>8.1f}')
+        total.update({'before': plain[lwr.BinStat], 'after': folded[lwr.BinStat]})
+    print(f"corpus: {total['before'] - total['after']} of {total['before']} BinStat removed")
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,80 @@
+"""
+Liveness of every function computed by the dataflow solver, against the fixed
+point computed by repeating `BasicBlock.liveness_iter` over the blocks until
+none changes, which is how the CFG computed it before. Both must give the same
+live sets, the solver should evaluate fewer blocks in less time. The other
+analyses of the solver are timed on the same functions
+"""
+import contextlib
+import io
+import time
+
+import src.driver as driver
+from benchmarks.programs import branch_program, generate_program, loop_program
+from src.ControlFlow.CFG import CFG
+from src.ControlFlow.Dataflow import AvailableExpressions, Liveness, ReachingDefinitions
+from src.ControlFlow.Dominators import reverse_postorder
+from src.lexer import Lexer, TokenStream
+
+
+def programs() -> list[tuple[str, str]]:
+    return [('random 500', generate_program(500, procedures=4)),
+            ('random 2000', generate_program(2000)),
+            ('nests', loop_program(40)),
+            ('branches', branch_program(1000))]
+
+
+def round_robin(bbs: list['BasicBlock']) -> int:
+    """The fixed point of liveness_iter, :return: the blocks evaluated"""
+    for bb in bbs:
+        bb.live_in = set()
+        bb.live_out = set()
+    evaluations = 0
+
+    def step(bb: 'BasicBlock') -> bool:
+        nonlocal evaluations
+        evaluations += 1
+        return bb.liveness_iter()
+
+    while any(map(step, bbs)):
+        pass
+    return evaluations
+
+
+def main_bench():
+    print(f"{'program':>12} {'blocks':>7} {'fixed point':>18} {'solver':>18} {'speedup':>8} "
+          f"{'reaching':>10} {'available':>10}")
+    for name, text in programs():
+        with contextlib.redirect_stdout(io.StringIO()):
+            cfg = CFG(driver.front_end(TokenStream.from_lexer(Lexer(text)), optimize=0))
+        blocks = old_evals = new_evals = 0
+        old_time = new_time = reaching = available = 0.0
+        for block in cfg.blocks_in_order():
+            bbs = list(dict.fromkeys(reverse_postorder(block.entry_bb)))
+            blocks += len(bbs)
+            start = time.perf_counter()
+            old_evals += round_robin(bbs)
+            old_time += time.perf_counter() - start
+
+            exit_live = block.symtab.get_global_symbol_set() if block.function is not None else ()
+            start = time.perf_counter()
+            live = Liveness(block.entry_bb, exit_live).solve()
+            new_time += time.perf_counter() - start
+            new_evals += live.evaluations
+            if any(live.live_in(bb) != bb.live_in for bb in bbs):
+                raise AssertionError(f'{name}: different live sets')
+
+            start = time.perf_counter()
+            ReachingDefinitions(block.entry_bb).solve()
+            reaching += time.perf_counter() - start
+            start = time.perf_counter()
+            AvailableExpressions(block.entry_bb).solve()
+            available += time.perf_counter() - start
+
+        print(f'{name:>12} {blocks:>7} {old_evals:>7} {old_time * 1000:>8.1f}ms {new_evals:>7} '
+              f'{new_time * 1000:>8.1f}ms {old_time / new_time:>7.1f}x '
+              f'{reaching * 1000:>8.1f}ms {available * 1000:>8.1f}ms')
+
+
+if __name__ == '__main__':
+    main_bench()
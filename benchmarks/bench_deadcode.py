@@ -0,0 +1,61 @@
+"""
+Statements executed and kept by programs with and without dead code
+elimination after the other optimizations, counted by the interpreter of the
+lowered program. The output of every program must be the same with and without
+"""
+import contextlib
+import io
+
+import main
+import src.driver as driver
+from benchmarks.programs import generate_program, loop_program, strided_program
+from src.ControlFlow.CFG import CFG
+from src.ControlFlow.Dominators import reverse_postorder
+from src.ControlFlow.Interpreter import run
+from src.lexer import Lexer, TokenStream
+from src.Optimizer.DeadCode import eliminate_dead_code
+from src.Optimizer.LICM import hoist_invariants
+from src.Optimizer.StrengthReduction import reduce_strength
+from src.Optimizer.ValueNumbering import number_values
+
+
+def programs() -> list[tuple[str, str]]:
+    return [('prog_1', main.prog_1),
+            ('random', generate_program(400, procedures=6)),
+            ('nests', loop_program(8, depth=2)),
+            ('sweeps', strided_program(8))]
+
+
+def optimized(tokens: TokenStream, dce: bool) -> tuple[CFG, str]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        cfg = CFG(driver.front_end(tokens, optimize=2))
+    number_values(cfg)
+    hoist_invariants(cfg)
+    reduce_strength(cfg)
+    if not dce:
+        return cfg, ''
+    return cfg, eliminate_dead_code(cfg).report()
+
+
+def size(cfg: CFG) -> int:
+    return sum(len(bb.statements) for block in cfg.blocks_in_order()
+               for bb in reverse_postorder(block.entry_bb))
+
+
+def main_bench():
+    print(f"{'program':>10} {'size':>7} {'dce':>7} {'run':>8} {'dce':>8} {'saved':>7}")
+    for name, text in programs():
+        tokens = TokenStream.from_lexer(Lexer(text))
+        cfg, _ = optimized(tokens, False)
+        before = run(cfg, [5])
+        after_cfg, report = optimized(tokens, True)
+        after = run(after_cfg, [5])
+        if before.output != after.output:
+            raise AssertionError(f'{name}: different output')
+        saved = 1 - after.executed / before.executed
+        print(f'{name:>10} {size(cfg):>7} {size(after_cfg):>7} {before.executed:>8} {after.executed:>8} '
+              f'{saved:>7.1%}   {report}')
+
+
+if __name__ == '__main__':
+    main_bench()
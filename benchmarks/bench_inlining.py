@@ -0,0 +1,62 @@
+"""
+Statements executed, and lines of assembly, of programs calling procedures
+with and without the inlining of the small leaf procedures. The interpreter
+counts a call as one statement, the lines of assembly show the frames and
+register saves which are no longer emitted. The output of every program must
+be the same with and without
+"""
+import contextlib
+import io
+
+import main
+import src.driver as driver
+from benchmarks.programs import generate_program, loop_program
+from src.ControlFlow.CFG import CFG
+from src.ControlFlow.Interpreter import run
+from src.lexer import Lexer, TokenStream
+from src.Optimizer.DeadCode import eliminate_dead_code
+from src.Optimizer.Inlining import inline_procedures
+from src.Optimizer.LICM import hoist_invariants
+from src.Optimizer.StrengthReduction import reduce_strength
+from src.Optimizer.ValueNumbering import number_values
+
+
+def programs() -> list[tuple[str, str]]:
+    return [('prog_1', main.prog_1),
+            ('random', generate_program(400, procedures=6)),
+            ('random, seed 1', generate_program(400, procedures=6, seed=1)),
+            ('nests with calls', loop_program(8, depth=2, with_calls=True))]
+
+
+def optimized(tokens: TokenStream, inline: bool) -> tuple[CFG, str]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        cfg = CFG(driver.front_end(tokens, optimize=2))
+    inliner = inline_procedures(cfg) if inline else None
+    number_values(cfg)
+    hoist_invariants(cfg)
+    reduce_strength(cfg)
+    eliminate_dead_code(cfg)
+    if inliner is None:
+        return cfg, ''
+    inliner.remove_unused_variables(cfg)
+    return cfg, inliner.report()
+
+
+def main_bench():
+    print(f"{'program':>18} {'run':>8} {'inline':>8} {'saved':>7} {'asm':>6} {'inline':>6}")
+    for name, text in programs():
+        tokens = TokenStream.from_lexer(Lexer(text))
+        cfg, _ = optimized(tokens, False)
+        before = run(cfg, [5])
+        asm = len(driver.generate(cfg).lines)
+        cfg, report = optimized(tokens, True)
+        after = run(cfg, [5])
+        if before.output != after.output:
+            raise AssertionError(f'{name}: different output')
+        saved = 1 - after.executed / before.executed
+        print(f'{name:>18} {before.executed:>8} {after.executed:>8} {saved:>7.1%} '
+              f'{asm:>6} {len(driver.generate(cfg).lines):>6}   {report}')
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,55 @@
+"""
+Lexing throughput on sources of increasing size
+
+The time per megabyte should stay flat as the input grows, when streaming
+from a file the peak memory should not depend on the size of the file
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.programs import program_of_size
+from src.lexer import Lexer
+
+
+def lex_all(text: str) -> int:
+    count = 0
+    for _ in Lexer(text).tokens():
+        count += 1
+    return count
+
+
+def stream_peak_memory(text: str) -> int:
+    with tempfile.NamedTemporaryFile('w', suffix='.pl0', delete=False) as f:
+        f.write(text)
+    try:
+        tracemalloc.start()
+        for _ in Lexer.from_file(f.name).tokens():
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        os.unlink(f.name)
+    return peak
+
+
+def main():
+    print(f"{'size (MB)':>10} {'tokens':>10} {'time (s)':>10} {'s/MB':>8}")
+    for mb in [0.25, 0.5, 1, 2, 4]:
+        text = program_of_size(int(mb * 2 ** 20))
+        start = time.perf_counter()
+        count = lex_all(text)
+        elapsed = time.perf_counter() - start
+        size = len(text) / 2 ** 20
+        print(f'{size:>10.2f} {count:>10} {elapsed:>10.3f} {elapsed / size:>8.3f}')
+
+    print()
+    print(f"{'size (MB)':>10} {'peak streaming (KB)':>20}")
+    for mb in [0.5, 2]:
+        text = program_of_size(int(mb * 2 ** 20))
+        print(f'{len(text) / 2 ** 20:>10.2f} {stream_peak_memory(text) / 1024:>20.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Statements executed by loop heavy programs with and without loop invariant code
+motion, counted by the interpreter of the lowered program. The output of every
+program must be the same at all the optimization levels
+"""
+import contextlib
+import io
+
+import main
+import src.driver as driver
+from benchmarks.programs import loop_program
+from src.ControlFlow.CFG import CFG
+from src.ControlFlow.Interpreter import run
+from src.lexer import Lexer, TokenStream
+from src.Optimizer.LICM import hoist_invariants
+from src.Optimizer.ValueNumbering import number_values
+
+
+def programs() -> list[tuple[str, str]]:
+    return [('prog_1', main.prog_1),
+            ('single loops', loop_program(8, depth=1)),
+            ('nests', loop_program(8, depth=2)),
+            ('nests with calls', loop_program(8, depth=2, with_calls=True))]
+
+
+def optimized(tokens: TokenStream, licm: bool) -> tuple[CFG, str]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        cfg = CFG(driver.front_end(tokens, optimize=1))
+    number_values(cfg)
+    if not licm:
+        return cfg, ''
+    return cfg, hoist_invariants(cfg).report()
+
+
+def main_bench():
+    print(f"{'program':>18} {'-O0':>8} {'-O1':>8} {'-O2':>8} {'saved':>7}")
+    for name, text in programs():
+        tokens = TokenStream.from_lexer(Lexer(text))
+        with contextlib.redirect_stdout(io.StringIO()):
+            plain = run(driver.build_cfg(tokens, optimize=0), [5])
+        local = run(optimized(tokens, False)[0], [5])
+        cfg, report = optimized(tokens, True)
+        hoisted = run(cfg, [5])
+        if not plain.output == local.output == hoisted.output:
+            raise AssertionError(f'{name}: different output')
+        saved = 1 - hoisted.executed / local.executed
+        print(f'{name:>18} {plain.executed:>8} {local.executed:>8} {hoisted.executed:>8} {saved:>7.1%}   {report}')
+
+
+if __name__ == '__main__':
+    main_bench()
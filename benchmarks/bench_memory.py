@@ -0,0 +1,53 @@
+"""
+Memory held by the IR tree, by the lowered program and by the CFG, in bytes
+per source statement. Measured with tracemalloc as the growth of the traced
+memory after each phase, while the result of the previous phases is kept alive
+"""
+import contextlib
+import gc
+import io
+import tracemalloc
+
+import src.driver as driver
+from benchmarks.programs import generate_program
+from src.ControlFlow.CFG import CFG
+from src.lexer import Lexer, TokenStream
+
+
+def measure(statements: int) -> dict[str, int]:
+    tokens = TokenStream.from_lexer(Lexer(generate_program(statements, procedures=statements // 200)))
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            before = tracemalloc.get_traced_memory()[0]
+            prog = driver.PARSERS['classic'](tokens)
+            gc.collect()
+            ir = tracemalloc.get_traced_memory()[0]
+
+            prog.mxdt_navigate(driver.lower_func, [], [])
+            lowered_prog = prog.lowered
+            lowered_prog.perform_data_layout()
+            gc.collect()
+            lowered = tracemalloc.get_traced_memory()[0]
+
+            cfg = CFG(lowered_prog)
+            gc.collect()
+            graph = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del cfg, prog
+    return {'ir': ir - before, 'lowered': lowered - ir, 'cfg': graph - lowered}
+
+
+def main():
+    print(f"{'stmts':>7} {'IR B/stmt':>10} {'lowered B/stmt':>15} {'CFG B/stmt':>11} {'total MB':>9}")
+    for statements in [1000, 5000, 10000]:
+        m = measure(statements)
+        total = sum(m.values())
+        print(f"{statements:>7} {m['ir'] / statements:>10.0f} {m['lowered'] / statements:>15.0f} "
+              f"{m['cfg'] / statements:>11.0f} {total / 2 ** 20:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Time to order the basic blocks of procedures with more and more blocks. The
+orders of a function are computed once, by a depth first walk, and kept until
+its edges change, so the time per block should stay about the same and asking
+for them again costs nothing. The breadth first walk the back end used to do
+for every traversal, taking the blocks from the front of a list, is timed on
+the smaller procedures for comparison.
+
+The code of every program is compiled twice and must be the same both times,
+the orders don't depend on where the blocks are in memory. At every
+optimization level each block falling through to another must be followed by it
+in the layout or end with a jump to it, the jumps are counted. The objects built
+before the timings are frozen, so that the collections of the garbage
+collector don't grow with them
+"""
+import contextlib
+import gc
+import io
+import time
+
+import main
+import src.driver as driver
+from benchmarks.programs import branch_program, generate_program, loop_program
+from src.ControlFlow.Orders import fall_through
+from src.lexer import Lexer, TokenStream
+
+SIZES = (500, 1000, 2000, 4000, 8000)
+WALKED = 2000
+USES = 10
+
+
+def breadth_first(entry: 'BasicBlock') -> list['BasicBlock']:
+    """The traversal the back end used to do"""
+    queue = [entry]
+    visited = set()
+    order = []
+    while queue:
+        bb = queue.pop(0)
+        if bb in visited:
+            continue
+        visited.add(bb)
+        queue.extend(set(bb.successors()) - visited)
+        order.append(bb)
+    return order
+
+
+def compiled(text: str) -> list[str]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return driver.compile_program(TokenStream.from_lexer(Lexer(text))).lines
+
+
+def fall_through_jumps(text: str, optimize: int) -> tuple[int, int]:
+    """
+    Check that the code keeps every fall through edge
+    :return: The number of fall through edges and of jumps added for them
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        cfg = driver.build_cfg(TokenStream.from_lexer(Lexer(text)), optimize=optimize)
+    edges = 0
+    jumps = []
+    for block in cfg.blocks_in_order():
+        layout = block.orders().layout
+        for bb, after in zip(layout, layout[1:] + [None]):
+            follower = fall_through(bb)
+            if follower is not None:
+                edges += 1
+                if follower is not after:
+                    jumps.append(f'b {follower.label_in.name}')
+    # The jumps of the lowered code don't emit any instruction yet
+    emitted = [line.strip() for line in driver.generate(cfg, optimize=optimize).lines if line.startswith('\tb ')]
+    if sorted(emitted) != sorted(jumps):
+        raise AssertionError(f'fall through edges left without a jump: {sorted(set(jumps) - set(emitted))}')
+    return edges, len(jumps)
+
+
+def main_bench():
+    print(f"{'statements':>10} {'blocks':>7} {'orders':>10} {'us/block':>9} {f'{USES} uses':>10} "
+          f"{f'{USES} walks':>10}")
+    for n in SIZES:
+        with contextlib.redirect_stdout(io.StringIO()):
+            cfg = driver.build_cfg(TokenStream.from_lexer(Lexer(branch_program(n))), optimize=0)
+        block = cfg.functions[next(iter(cfg.functions))]
+        block.cached_orders = None
+        gc.collect()
+        gc.freeze()
+        start = time.perf_counter()
+        blocks = len(block.orders().layout)
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(USES):
+            block.orders()
+        uses = time.perf_counter() - start
+        walks = ''
+        if n <= WALKED:
+            start = time.perf_counter()
+            for _ in range(USES):
+                breadth_first(block.entry_bb)
+            walks = f'{(time.perf_counter() - start) * 1000:>8.1f}ms'
+        gc.unfreeze()
+        print(f'{n:>10} {blocks:>7} {elapsed * 1000:>8.2f}ms {elapsed / blocks * 1e6:>9.2f} '
+              f'{uses * 1000:>8.3f}ms {walks:>10}')
+
+    programs = {'random': generate_program(1000, procedures=4), 'nests': loop_program(20, with_calls=True),
+                'branches': branch_program(500)}
+    for name, text in programs.items():
+        if compiled(text) != compiled(text):
+            raise AssertionError(f'{name}: different code when compiled again')
+    print(f'{len(programs)} programs compiled twice to the same code')
+    programs['prog_1'] = main.prog_1
+    for optimize in (0, 1, 2):
+        counts = [fall_through_jumps(text, optimize) for text in programs.values()]
+        print(f'-O{optimize}: {sum(e for e, _ in counts)} fall through edges, '
+              f'{sum(j for _, j in counts)} jumps added')
+
+
+if __name__ == '__main__':
+    main_bench()
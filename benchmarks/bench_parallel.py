@@ -0,0 +1,39 @@
+"""
+Serial against parallel back end on programs with many procedures, the
+generated code must be the same. The speedup is bounded by the number of cores
+"""
+import contextlib
+import io
+import os
+import time
+
+import src.driver as driver
+from benchmarks.programs import generate_program
+from src.ControlFlow.CFG import CFG
+from src.lexer import Lexer
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    jobs = sorted({2, 4, cpus} - {1})
+    print(f'{cpus} cores')
+    print(f"{'procs':>6} {'stmts':>7} {'serial (s)':>11} " + ' '.join(f'{f"-j{j} (s)":>9}' for j in jobs))
+    for procs in [50, 200]:
+        text = generate_program(procs * 60, procedures=procs)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cfg = CFG(driver.front_end(Lexer(text)))
+
+        start = time.perf_counter()
+        serial = driver.back_end(cfg).lines
+        times = [time.perf_counter() - start]
+        for j in jobs:
+            start = time.perf_counter()
+            parallel = driver.parallel_back_end(cfg, j).lines
+            times.append(time.perf_counter() - start)
+            if parallel != serial:
+                raise AssertionError(f"Different code with {j} jobs")
+        print(f'{procs:>6} {procs * 60:>7} {times[0]:>11.2f} ' + ' '.join(f'{t:>9.2f}' for t in times[1:]))
+
+
+if __name__ == '__main__':
+    main()
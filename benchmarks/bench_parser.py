@@ -0,0 +1,62 @@
+"""
+Parse throughput of the parser classes in src.parser against the TableParser
+engine, on the same token streams. Both must produce the same IR tree
+
+The collector is paused while parsing: on big trees its passes over the
+growing object graph take most of the time and hide the cost of the engines
+"""
+import contextlib
+import gc
+import io
+import time
+
+import src.IR.IR as ir
+import src.parser as parser
+from benchmarks.programs import generate_program
+from src.Symbols.Symbols import Symbol, SymbolTable
+from src.lexer import Lexer, TokenStream
+from src.tableparser import TableParser
+
+
+def ir_signature(node):
+    """A structural description of an IR tree, equal for equal trees"""
+    if isinstance(node, list):
+        return [ir_signature(c) for c in node]
+    if isinstance(node, Symbol):
+        return 'symbol', node.name, node.level, node.alloct, node.stype.name
+    if isinstance(node, SymbolTable):
+        return 'symtab', node.lvl, [ir_signature(s) for s in node]
+    if isinstance(node, ir.IRNode):
+        attrs = {k: ir_signature(v) for k, v in vars(node).items() if k != 'lowered'}
+        return type(node).__name__, sorted(attrs.items())
+    return node
+
+
+def timed(fun):
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # the parser classes log conditions
+            res = fun()
+        return res, time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def main():
+    print(f"{'stmts':>8} {'tokens':>9} {'classic (s)':>12} {'table (s)':>10} "
+          f"{'classic tok/s':>14} {'table tok/s':>12}")
+    for stmts in [2000, 8000, 32000]:
+        text = generate_program(stmts, procedures=stmts // 500)
+        stream = TokenStream.from_lexer(Lexer(text))
+        classic, t_classic = timed(lambda: parser.Program(stream).parse())
+        table, t_table = timed(lambda: TableParser(stream).parse())
+        if ir_signature(classic) != ir_signature(table):
+            raise AssertionError("The parser engines produced different trees")
+        print(f'{stmts:>8} {len(stream):>9} {t_classic:>12.3f} {t_table:>10.3f} '
+              f'{len(stream) / t_classic:>14.0f} {len(stream) / t_table:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Instructions of the prologues and epilogues of the functions, emitted once and
+executed at every call, counted by the interpreter of the lowered program.
+The reference is the sequence which saved all the callee saved registers,
+the frame pointer and the link register of every function: a store and a load
+for each of the nine, plus setting up and freeing the frame and the return
+"""
+import contextlib
+import io
+
+import main
+import src.driver as driver
+from benchmarks.programs import generate_program, loop_program
+from src.Codegen.Code import Code
+from src.ControlFlow.Interpreter import run
+from src.lexer import Lexer, TokenStream
+
+FULL_SAVE = 2 * 9 + 4
+
+
+def programs() -> list[tuple[str, str]]:
+    return [('prog_1', main.prog_1),
+            ('random', generate_program(400, procedures=6)),
+            ('nests with calls', loop_program(8, depth=2, with_calls=True))]
+
+
+def frame_instructions(cfg: 'CFG') -> dict['Symbol', int]:
+    """
+    The instructions of the prologue and epilogue of each function, by symbol,
+    with all the saves in them (see bench_shrinkwrap)
+    """
+    blocks = cfg.blocks_in_order()
+    allocs = {b: driver.allocate_function(cfg, b) for b in blocks}
+    layouts = driver.prepare_layouts(cfg, allocs)
+    counts = {}
+    for block in blocks:
+        code = Code()
+        saves = block.register_saves(allocs[block], wrap=False)
+        block.emit_prologue(code, layout=layouts[block], regalloc=allocs[block], saves=saves)
+        block.emit_epilogue(code, layout=layouts[block], regalloc=allocs[block], saves=saves)
+        counts[block.function] = sum(not line.startswith('@') for line in code.lines)
+    return counts
+
+
+def main_bench():
+    print(f"{'program':>18} {'level':>5} {'functions':>9} {'static':>7} {'full':>7} "
+          f"{'executed':>8} {'full':>8} {'per call':>8}")
+    for name, text in programs():
+        tokens = TokenStream.from_lexer(Lexer(text))
+        for level in (0, 2):
+            with contextlib.redirect_stdout(io.StringIO()):
+                cfg = driver.build_cfg(tokens, optimize=level)
+            counts = frame_instructions(cfg)
+            calls = run(cfg, [5]).calls
+            executed = sum(counts[f] * n for f, n in calls.items())
+            full = FULL_SAVE * sum(calls.values())
+            print(f'{name:>18} {level:>5} {len(counts):>9} {sum(counts.values()):>7} {FULL_SAVE * len(counts):>7} '
+                  f'{executed:>8} {full:>8} {(full - executed) / sum(calls.values()):>8.1f}')
+
+
+if __name__ == '__main__':
+    main_bench()
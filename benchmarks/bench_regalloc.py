@@ -0,0 +1,91 @@
+"""
+Register allocation of the functions of programs of growing size, the linear
+scan on the lifetime intervals of the registers against the linear scan on
+[first definition, last use] over the numbered statements it replaced: the time
+to allocate, the registers spilled, and the pairs of registers live at the same
+time which got the same register. The old intervals ignore the values live
+around the loops, so it gives their registers away while they are still needed,
+the new allocator must never do it.
+
+The liveness of the blocks is computed before the timings, both allocators get
+the blocks in the order of the layout. The objects built before are frozen, so
+that the collections of the garbage collector don't grow with them
+"""
+import contextlib
+import gc
+import io
+import time
+
+import src.driver as driver
+from benchmarks.programs import branch_program, generate_program, loop_program, strided_program
+from src.Allocator.LinearScan import IntervalScanRegAlloc
+from src.Allocator.Regalloc import LinearScanRegAlloc, SPILL_FLAG
+from src.lexer import Lexer, TokenStream
+
+SIZES = (500, 1000, 2000, 4000)
+
+
+def programs() -> list[tuple[str, str]]:
+    progs = [(f'random {n}', generate_program(n, procedures=4)) for n in SIZES]
+    progs.append(('nests', loop_program(40, with_calls=True)))
+    progs.append(('branches', branch_program(1000)))
+    progs.append(('sweeps', strided_program(8)))
+    return progs
+
+
+def _registers(symbols: set['Symbol']) -> set['Symbol']:
+    return {s for s in symbols if s.alloct == 'reg'}
+
+
+def clobbered(block: 'LoweredBlock', alloc: 'AllocInfo') -> int:
+    """The pairs of registers of block live at the same time, or read and written by
+    the same statement, which got the same register"""
+    pairs = set()
+    for bb in block.orders().layout:
+        live = _registers(bb.live_out)
+        for instr in reversed(bb.statements):
+            defined = _registers(instr.get_defined())
+            used = _registers(instr.get_used())
+            for group in (live | defined, used | defined):
+                holder: dict[int, 'Symbol'] = {}
+                for var in group:
+                    reg = alloc.var_to_reg.get(var, SPILL_FLAG)
+                    if reg == SPILL_FLAG:
+                        continue
+                    if reg in holder and holder[reg] is not var:
+                        pairs.add(frozenset((var, holder[reg])))
+                    holder[reg] = var
+            live = (live - defined) | used
+    return len(pairs)
+
+
+def main_bench():
+    allocators = (('old', LinearScanRegAlloc), ('new', IntervalScanRegAlloc))
+    print(f"{'program':>12} {'registers':>9} " +
+          ' '.join(f"{f'{n} time':>10} {f'{n} spills':>10} {f'{n} clobb':>9}" for n, _ in allocators))
+    for name, text in programs():
+        with contextlib.redirect_stdout(io.StringIO()):
+            cfg = driver.build_cfg(TokenStream.from_lexer(Lexer(text)))
+        blocks = cfg.blocks_in_order()
+        for block in blocks:
+            cfg.function_liveness(block)
+        registers = len(set().union(*(_registers(instr.get_defined()) for _, instr in cfg.statements())))
+        gc.collect()
+        gc.freeze()
+        row = f'{name:>12} {registers:>9}'
+        for _, allocator in allocators:
+            elapsed = 0
+            spills = clobbers = 0
+            for block in blocks:
+                start = time.perf_counter()
+                alloc = allocator(driver.NREGS, lambda _: block.orders().layout)(cfg)
+                elapsed += time.perf_counter() - start
+                spills += alloc.numspill
+                clobbers += clobbered(block, alloc)
+            row += f' {elapsed * 1000:>8.1f}ms {spills:>10} {clobbers:>9}'
+        gc.unfreeze()
+        print(row)
+
+
+if __name__ == '__main__':
+    main_bench()
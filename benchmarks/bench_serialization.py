@@ -0,0 +1,84 @@
+"""
+Binary encoding of the lowered program against pickle: size and time to dump
+and load. Every program is checked to round trip, encoding the loaded program
+must give the same bytes and the back end must produce the same code from it
+"""
+import contextlib
+import gc
+import io
+import pickle
+import sys
+import time
+
+import main
+import src.driver as driver
+from benchmarks.programs import generate_program
+from src.ControlFlow import Serialization
+from src.ControlFlow.CFG import CFG
+from src.lexer import Lexer
+
+SAMPLES = ['prog_1', 'prog_2_simple_fun', 'prog_3_nested']
+
+
+def lowered(text: str) -> CFG:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return driver.build_cfg(Lexer(text))
+
+
+def allocate(cfg: CFG) -> dict:
+    return {b: driver.allocate_function(cfg, b) for b in cfg.blocks_in_order()}
+
+
+def check_round_trip(name: str, cfg: CFG):
+    allocs = allocate(cfg)
+    data = Serialization.dumps(cfg.global_block, allocs)
+    prog, loaded_allocs = Serialization.loads(data)
+    if Serialization.dumps(prog, loaded_allocs) != data:
+        raise AssertionError(f"{name}: different encoding after loading")
+
+    # The order of the blocks in the output depends on the objects, compare the lines
+    loaded = CFG(prog)
+    if sorted(driver.back_end(loaded).lines) != sorted(driver.back_end(cfg).lines):
+        raise AssertionError(f"{name}: different code after loading")
+
+
+def timed(func, repeat=5):
+    """Best of `repeat` runs, the collector is paused as it dominates with many live objects"""
+    best = None
+    res = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            res = func()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return res, best
+
+
+def main_bench():
+    for name in SAMPLES:
+        check_round_trip(name, lowered(getattr(main, name)))
+    print(f'{len(SAMPLES)} sample programs round trip')
+
+    sys.setrecursionlimit(100000)  # pickle recurses along the chains of basic blocks
+    print(f"{'stmts':>7} {'binary KB':>10} {'dump ms':>8} {'load ms':>8} "
+          f"{'pickle KB':>10} {'dump ms':>8} {'load ms':>8}")
+    for statements in [100, 1000, 5000]:
+        cfg = lowered(generate_program(statements, procedures=statements // 100))
+        check_round_trip(f'{statements} statements', cfg)
+        allocs = allocate(cfg)
+
+        data, dump_t = timed(lambda: Serialization.dumps(cfg.global_block, allocs))
+        _, load_t = timed(lambda: Serialization.loads(data))
+        pdata, pdump_t = timed(lambda: pickle.dumps((cfg.global_block, allocs), pickle.HIGHEST_PROTOCOL))
+        _, pload_t = timed(lambda: pickle.loads(pdata))
+        print(f'{statements:>7} {len(data) / 1024:>10.1f} {dump_t * 1e3:>8.1f} {load_t * 1e3:>8.1f} '
+              f'{len(pdata) / 1024:>10.1f} {pdump_t * 1e3:>8.1f} {pload_t * 1e3:>8.1f}')
+
+
+if __name__ == '__main__':
+    main_bench()
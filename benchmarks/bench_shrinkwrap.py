@@ -0,0 +1,139 @@
+"""
+Register saves and restores executed by programs with all the saves in the
+prologues and epilogues and with shrink-wrapping, counted from the times the
+interpreter of the lowered program runs each function and basic block. The
+count is checked against the stores and loads of registers the emitted
+assembly has in each block.
+
+At level 2 the small leaf procedures are inlined and the procedures left are
+the ones calling others, the procedure of "recursion" calls itself on a rare
+path only: its return address is saved there instead of at every call
+"""
+import contextlib
+import io
+
+import main
+import src.Codegen.registers as R
+import src.driver as driver
+from benchmarks.programs import generate_program, loop_program
+from src.ControlFlow.Interpreter import run
+from src.lexer import Lexer, TokenStream
+
+SOURCE = '''VAR n, s;
+
+PROCEDURE report;
+BEGIN
+   if n > 40 then begin
+      !n;
+      !s
+   end;
+   s := s + n
+END;
+
+BEGIN
+   n := 0;
+   while n < 50 do begin
+      CALL report;
+      n := n + 1
+   end;
+   !s
+END.'''
+
+
+RECURSIVE_SOURCE = '''VAR n, s, k;
+
+PROCEDURE report;
+BEGIN
+   if n > 40 then begin
+      !n;
+      if k > 0 then begin
+         k := k - 1;
+         CALL report
+      end;
+      !s
+   end;
+   s := s + n
+END;
+
+BEGIN
+   n := 0;
+   k := 3;
+   while n < 50 do begin
+      CALL report;
+      n := n + 1
+   end;
+   !s
+END.'''
+
+
+def programs() -> list[tuple[str, str]]:
+    return [('prog_1', main.prog_1),
+            ('early exits', SOURCE),
+            ('recursion', RECURSIVE_SOURCE),
+            ('random', generate_program(400, procedures=6)),
+            ('nests with calls', loop_program(8, depth=2, with_calls=True))]
+
+
+def executed_saves(allocs: dict['LoweredBlock', 'AllocInfo'], interp: 'Interpreter',
+                   wrap: bool) -> tuple[int, int]:
+    """:return: The registers saved and restored during a run, and the ones moved out of the prologues"""
+    executed = moved = 0
+    for block, alloc in allocs.items():
+        for save, restore in block.register_saves(alloc, wrap).values():
+            moved += save is not block.entry_bb
+            executed += interp.calls[block.function] if save is block.entry_bb else interp.blocks[save]
+            executed += interp.calls[block.function] if restore is block.exit_bb else interp.blocks[restore]
+    return executed, moved
+
+
+def emitted_saves(cfg: 'CFG', allocs: dict['LoweredBlock', 'AllocInfo'], interp: 'Interpreter') -> int:
+    """
+    The registers saved and restored during a run by the emitted assembly: the
+    stores and loads following the comments of save_registers and restore_regs,
+    run as many times as the block of the label before them. The epilogue, the
+    restores followed by the return, runs once per call
+    """
+    layouts = driver.prepare_layouts(cfg, allocs)
+    executed = 0
+    for block in cfg.blocks_in_order():
+        calls = interp.calls[block.function]
+        runs = {bb.label_in.name: interp.blocks[bb] for bb in block.orders().layout if bb.label_in is not None}
+        runs[block.function.name if block.function else '__pl0_start'] = calls
+        lines = [line.strip() for line in driver.emit_function(block, layouts[block], allocs[block])]
+        label = None
+        for idx, line in enumerate(lines):
+            if line.endswith(':'):
+                label = line[:-1]
+            elif line.endswith(('Saving registers', 'Restoring registers')):
+                end = idx + 1
+                while end < len(lines) and lines[end].startswith(('str', 'ldr')):
+                    end += 1
+                epilogue = end < len(lines) and lines[end].startswith((f'add {R.SP}', 'bx'))
+                executed += (end - idx - 1) * (calls if epilogue else runs[label])
+    return executed
+
+
+def main_bench():
+    print(f"{'program':>18} {'level':>5} {'entry':>8} {'wrapped':>8} {'saved':>7} {'moved':>5}")
+    for name, text in programs():
+        tokens = TokenStream.from_lexer(Lexer(text))
+        outputs = []
+        for level in (0, 2):
+            with contextlib.redirect_stdout(io.StringIO()):
+                cfg = driver.build_cfg(tokens, optimize=level)
+            interp = run(cfg, [5])
+            outputs.append(interp.output)
+            allocs = {b: driver.allocate_function(cfg, b) for b in cfg.blocks_in_order()}
+            entry, _ = executed_saves(allocs, interp, False)
+            wrapped, moved = executed_saves(allocs, interp, True)
+            emitted = emitted_saves(cfg, allocs, interp)
+            if emitted != wrapped:
+                raise AssertionError(f'{name}: the assembly saves and restores {emitted} registers, '
+                                     f'expected {wrapped}')
+            print(f'{name:>18} {level:>5} {entry:>8} {wrapped:>8} {1 - wrapped / entry:>7.1%} {moved:>5}')
+        if outputs[0] != outputs[1]:
+            raise AssertionError(f'{name}: different output')
+
+
+if __name__ == '__main__':
+    main_bench()
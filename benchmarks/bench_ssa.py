@@ -0,0 +1,77 @@
+"""
+Time spent building the SSA form of the registers, propagating the constants
+and the copies on it and going out of SSA form, on programs of growing size
+after the other optimizations. The time per block should stay about the same
+as the programs grow. The output of every program must be the same with and
+without the passes
+
+The random programs are straight code and branches, their registers are all
+defined once. Strength reduction only runs on the loop nests, whose induction
+variables give the PhiStats, since its own cost grows faster with the size of
+a function. The objects built before are frozen, so that the collections of
+the garbage collector don't grow with them
+"""
+import contextlib
+import gc
+import io
+
+import src.driver as driver
+from benchmarks.programs import generate_program, loop_program
+from src.ControlFlow.CFG import CFG
+from src.ControlFlow.Dominators import reverse_postorder
+from src.ControlFlow.Interpreter import run
+from src.lexer import Lexer, TokenStream
+from src.Optimizer.LICM import hoist_invariants
+from src.Optimizer.Propagation import propagate
+from src.Optimizer.StrengthReduction import reduce_strength
+from src.Optimizer.ValueNumbering import number_values
+
+SIZES = (500, 1000, 2000, 4000)
+NESTS = (10, 20, 40, 80)
+
+
+def programs() -> list[tuple[str, str, bool]]:
+    """:return: The programs, with whether to reduce the strength of their loops"""
+    progs = [(f'random {n}', generate_program(n), False) for n in SIZES]
+    progs.extend((f'loops {n}', loop_program(n), True) for n in NESTS)
+    return progs
+
+
+def optimized(text: str, strength: bool) -> CFG:
+    with contextlib.redirect_stdout(io.StringIO()):
+        cfg = CFG(driver.front_end(TokenStream.from_lexer(Lexer(text)), optimize=2))
+    number_values(cfg)
+    hoist_invariants(cfg)
+    if strength:
+        reduce_strength(cfg)
+    return cfg
+
+
+def size(cfg: CFG) -> tuple[int, int]:
+    """:return: The number of blocks and of statements of cfg"""
+    bbs = [bb for block in cfg.blocks_in_order() for bb in reverse_postorder(block.entry_bb)]
+    return len(bbs), sum(len(bb.statements) for bb in bbs)
+
+
+def main_bench():
+    steps = ('construction', 'constants', 'copies', 'destruction')
+    print(f"{'program':>12} {'blocks':>7} {'stats':>7} {'phis':>5} " + ' '.join(f'{s:>12}' for s in steps) +
+          f" {'us/stat':>8}")
+    for name, text, strength in programs():
+        expected = run(optimized(text, strength), [5]).output
+        cfg = optimized(text, strength)
+        blocks, statements = size(cfg)
+        gc.collect()
+        gc.freeze()
+        passes = propagate(cfg)
+        gc.unfreeze()
+        if run(cfg, [5]).output != expected:
+            raise AssertionError(f'{name}: different output')
+        total = sum(passes.times.values())
+        print(f'{name:>12} {blocks:>7} {statements:>7} {passes.phis:>5} ' +
+              ' '.join(f'{passes.times[s] * 1000:>10.2f}ms' for s in steps) +
+              f' {total / statements * 1e6:>8.2f}')
+
+
+if __name__ == '__main__':
+    main_bench()
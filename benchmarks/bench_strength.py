@@ -0,0 +1,52 @@
+"""
+Statements executed by loops indexing arrays with and without the strength
+reduction of their induction variables, counted by the interpreter of the
+lowered program. The output of every program must be the same with and without
+"""
+import contextlib
+import io
+
+import main
+import src.driver as driver
+from benchmarks.programs import loop_program, strided_program
+from src.ControlFlow.CFG import CFG
+from src.ControlFlow.Interpreter import run
+from src.lexer import Lexer, TokenStream
+from src.Optimizer.LICM import hoist_invariants
+from src.Optimizer.StrengthReduction import reduce_strength
+from src.Optimizer.ValueNumbering import number_values
+
+
+def programs() -> list[tuple[str, str]]:
+    return [('prog_1', main.prog_1),
+            ('nests', loop_program(8, depth=2)),
+            ('sweeps', strided_program(8)),
+            ('sweeps, seed 1', strided_program(8, seed=1))]
+
+
+def optimized(tokens: TokenStream, strength: bool) -> tuple[CFG, str]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        cfg = CFG(driver.front_end(tokens, optimize=2))
+    number_values(cfg)
+    hoist_invariants(cfg)
+    if not strength:
+        return cfg, ''
+    return cfg, reduce_strength(cfg).report()
+
+
+def main_bench():
+    print(f"{'program':>16} {'licm':>8} {'sr':>8} {'saved':>7} {'BinStat':>8} {'sr':>8}")
+    for name, text in programs():
+        tokens = TokenStream.from_lexer(Lexer(text))
+        before = run(optimized(tokens, False)[0], [5])
+        cfg, report = optimized(tokens, True)
+        after = run(cfg, [5])
+        if before.output != after.output:
+            raise AssertionError(f'{name}: different output')
+        saved = 1 - after.executed / before.executed
+        print(f'{name:>16} {before.executed:>8} {after.executed:>8} {saved:>7.1%} '
+              f'{before.executed_by_kind["BinStat"]:>8} {after.executed_by_kind["BinStat"]:>8}   {report}')
+
+
+if __name__ == '__main__':
+    main_bench()
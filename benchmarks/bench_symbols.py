@@ -0,0 +1,42 @@
+"""
+Symbol lookups from nested scopes with many globals, the time per lookup
+should not depend on the number of symbols
+"""
+import time
+
+from src.Symbols.Symbols import Symbol, SymbolTable, TYPENAMES
+
+
+def build(nglobals: int, depth: int) -> tuple[SymbolTable, list[str]]:
+    table = SymbolTable()
+    names = []
+    for i in range(nglobals):
+        names.append(f'g{i}')
+        table.append(Symbol(names[-1], TYPENAMES['int']))
+    for d in range(depth):
+        table = table.create_local()
+        names.append(f'l{d}')
+        table.append(Symbol(names[-1], TYPENAMES['int']))
+    return table, names
+
+
+def main():
+    print(f"{'globals':>8} {'depth':>6} {'ns/lookup':>10} {'ns/global_symbols':>18}")
+    for nglobals in [100, 1000, 10000]:
+        for depth in [1, 8]:
+            table, names = build(nglobals, depth)
+            queries = names * (200000 // len(names) + 1)
+            start = time.perf_counter()
+            for n in queries:
+                table.lookup(n)
+            per_lookup = (time.perf_counter() - start) / len(queries)
+
+            start = time.perf_counter()
+            for _ in range(10000):
+                table.get_global_symbols()
+            per_globals = (time.perf_counter() - start) / 10000
+            print(f'{nglobals:>8} {depth:>6} {per_lookup * 1e9:>10.0f} {per_globals * 1e9:>18.0f}')
+
+
+if __name__ == '__main__':
+    main()
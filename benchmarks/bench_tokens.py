@@ -0,0 +1,35 @@
+"""
+Cost of lexing as a separate phase into a TokenStream, and parsing from the
+stream compared to parsing straight from the lexer
+"""
+import contextlib
+import io
+import time
+
+import src.parser as parser
+from benchmarks.programs import generate_program
+from src.lexer import Lexer, TokenStream
+
+
+def timed(fun, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # the parser logs conditions
+        res = fun(*args)
+    return res, time.perf_counter() - start
+
+
+def main():
+    print(f"{'stmts':>8} {'tokens':>9} {'lex (s)':>8} {'B/token':>8} "
+          f"{'parse lexer (s)':>16} {'parse stream (s)':>17}")
+    for stmts in [2000, 8000, 32000]:
+        text = generate_program(stmts, procedures=stmts // 500)
+        stream, t_lex = timed(TokenStream.from_lexer, Lexer(text))
+        size = sum(a.itemsize * len(a) for a in [stream.kinds, stream.values, stream.lines, stream.cols])
+        _, t_direct = timed(lambda: parser.Program(Lexer(text)).parse())
+        _, t_stream = timed(lambda: parser.Program(stream).parse())
+        print(f'{stmts:>8} {len(stream):>9} {t_lex:>8.3f} {size / len(stream):>8.1f} '
+              f'{t_direct:>16.3f} {t_stream:>17.3f}')
+
+
+if __name__ == '__main__':
+    main()
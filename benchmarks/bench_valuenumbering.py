@@ -0,0 +1,50 @@
+"""
+Statements eliminated by local value numbering, in total and per basic block,
+on the sample programs and on generated programs. Constant folding runs first,
+as in the driver
+"""
+import contextlib
+import io
+import time
+from collections import Counter
+
+import src.driver as driver
+from benchmarks.bench_constfold import corpus
+from src.ControlFlow.CFG import CFG
+from src.lexer import Lexer
+from src.Optimizer.ValueNumbering import number_values
+
+
+def count_statements(cfg: CFG) -> Counter:
+    return Counter(type(instr).__name__ for _, instr in cfg.statements())
+
+
+def main_bench():
+    print(f"{'program':>18} {'stmts':>7} {'after':>7} {'removed':>8} {'blocks':>7} {'changed':>8} "
+          f"{'max/bb':>7} {'pass ms':>8}")
+    kinds = Counter()
+    per_block = Counter()
+    for name, text in corpus():
+        with contextlib.redirect_stdout(io.StringIO()):
+            cfg = CFG(driver.front_end(Lexer(text), optimize=1))
+        before = count_statements(cfg)
+        blocks = len(list(cfg))
+
+        start = time.perf_counter()
+        lvn = number_values(cfg)
+        elapsed = time.perf_counter() - start
+
+        after = count_statements(cfg)
+        kinds.update(before - after)
+        per_block.update(lvn.eliminated.values())
+        removed = sum(lvn.eliminated.values())
+        total = sum(before.values())
+        print(f'{name:>18} {total:>7} {total - removed:>7} {removed / total:>8.1%} {blocks:>7} '
+              f'{len(lvn.eliminated):>8} {max(lvn.eliminated.values(), default=0):>7} {elapsed * 1e3:>8.1f}')
+
+    print('eliminated by kind: ' + ', '.join(f'{k} {n}' for k, n in kinds.most_common()))
+    print('blocks by statements eliminated: ' + ', '.join(f'{k}: {n}' for k, n in sorted(per_block.items())))
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,208 @@
+"""
+Generators of synthetic PL/0 sources used by the benchmarks
+
+The programs are valid, terminate and only use the subset of the language the
+front end understands, their size is controlled by the number of statements
+"""
+import random
+
+HEADER = '''VAR x, y, z, squ;
+VAR arr[16]: char;
+var multid[8][8]: short;
+
+{Generated program, every loop runs a bounded number of times}
+'''
+
+
+def _expression(rnd: random.Random, depth=0) -> str:
+    choice = rnd.randrange(6 if depth < 2 else 3)
+    if choice == 0:
+        return rnd.choice(['x', 'y', 'z', 'squ'])
+    elif choice == 1:
+        return repr(rnd.randrange(1, 100))
+    elif choice == 2:
+        return f'arr[{rnd.randrange(0, 16)}]'
+    elif choice == 3:
+        return f'({_expression(rnd, depth + 1)} + {_expression(rnd, depth + 1)})'
+    elif choice == 4:
+        return f'{_expression(rnd, depth + 1)} * {_expression(rnd, depth + 1)}'
+    else:
+        return f'(-{_expression(rnd, depth + 1)} - {_expression(rnd, depth + 1)})'
+
+
+def _statements(rnd: random.Random, count: int, procs: list[str], indent='   ') -> list[str]:
+    stats = []
+    while len(stats) < count:
+        kind = rnd.randrange(8)
+        if kind < 3:
+            stats.append(f'{indent}{rnd.choice(["y", "z", "squ"])} := {_expression(rnd)}')
+        elif kind == 3:
+            stats.append(f'{indent}arr[{rnd.randrange(0, 16)}] := {_expression(rnd)}')
+        elif kind == 4:
+            stats.append(f'{indent}!{_expression(rnd)}')
+        elif kind == 5 and procs:
+            stats.append(f'{indent}CALL {rnd.choice(procs)}')
+        elif kind == 6:
+            stats.append(f'{indent}if {_expression(rnd)} > {_expression(rnd)} then begin\n'
+                         f'{indent}   y := y + 1\n'
+                         f'{indent}end else begin\n'
+                         f'{indent}   z := z - 1\n'
+                         f'{indent}end')
+        else:
+            stats.append(f'{indent}x := 0;\n'
+                         f'{indent}while x < 8 do begin\n'
+                         f'{indent}   arr[x] := x;\n'
+                         f'{indent}   multid[x][7 - x] := arr[x] + y;\n'
+                         f'{indent}   x := x + 1\n'
+                         f'{indent}end')
+    return stats
+
+
+def generate_program(statements: int, procedures: int = 0, seed: int = 0) -> str:
+    """
+    :param statements: Approximate number of statements in the whole program
+    :param procedures: How many procedures to split the statements across
+    :param seed: Seed for the pseudo random generator, same seed same program
+    :return: The source of the program
+    """
+    rnd = random.Random(seed)
+    parts = [HEADER]
+    per_body = statements // (procedures + 1)
+    procs = []
+    for p in range(procedures):
+        name = f'proc{p}'
+        body = _statements(rnd, per_body, [])
+        parts.append(f'PROCEDURE {name};\nVAR loc;\nBEGIN\n   loc := {p};\n' +
+                     ';\n'.join(body) + '\nEND;\n')
+        procs.append(name)
+    body = _statements(rnd, per_body, procs)
+    parts.append('BEGIN\n   y := 1;\n   z := 2;\n' + ';\n'.join(body) + '\nEND.\n')
+    return '\n'.join(parts)
+
+
+LOOP_HEADER = '''CONST n = 8, stride = 3;
+VAR i, j, s, y, z, k;
+VAR arr[16];
+var multid[8][8]: short;
+
+{Generated loop nests, y and z are not assigned inside the loops, k only by bump}
+'''
+
+
+def _invariant(rnd: random.Random) -> str:
+    return rnd.choice(['y * z', 'z + k', 'y * stride', 'arr[k]', 'multid[k][2]', '(y + 1) * (z - 2)'])
+
+
+def _loop_nest(rnd: random.Random, depth: int, with_calls: bool) -> str:
+    if depth > 1:
+        inner = [f'multid[i][j] := arr[j] + {_invariant(rnd)}',
+                 f's := s + multid[i][j] * {_invariant(rnd)}',
+                 'j := j + 1']
+        if with_calls and rnd.randrange(4) == 0:
+            inner.append('CALL bump')
+        body = ['j := 0',
+                'while j < n do begin\n         ' + ';\n         '.join(inner) + '\n      end',
+                f'arr[i] := s - {_invariant(rnd)}']
+    else:
+        body = [f'arr[i] := arr[i] + {_invariant(rnd)}',
+                's := s + arr[i]']
+    body.append('i := i + 1')
+    return '   i := 0;\n' \
+           '   while i < n do begin\n      ' + ';\n      '.join(body) + '\n   end;\n' \
+           '   !s'
+
+
+def loop_program(nests: int, depth: int = 2, seed: int = 0, with_calls=False) -> str:
+    """
+    Loop nests over the arrays whose bodies compute values which don't change
+    in the loop, as test for the loop optimizations
+    :param nests: How many loop nests the program runs
+    :param depth: 1 for single loops, 2 for nests of two loops
+    :param with_calls: Call a procedure from some of the inner loops
+    """
+    rnd = random.Random(seed)
+    parts = [LOOP_HEADER,
+             '''PROCEDURE bump;
+BEGIN
+   k := k + 1;
+   if k > 7 then k := 0
+END;
+''']
+    nest = [_loop_nest(rnd, depth, with_calls) for _ in range(nests)]
+    parts.append('BEGIN\n   y := 3;\n   z := 5;\n   k := 1;\n   s := 0;\n' + ';\n'.join(nest) + '\nEND.\n')
+    return '\n'.join(parts)
+
+
+STRIDED_HEADER = '''VAR s;
+VAR vec[64];
+var grid[8][8]: short;
+
+{Generated sweeps over the arrays, the counters of the procedures are local}
+'''
+
+
+def _sweep(rnd: random.Random, name: str) -> str:
+    stride = rnd.randrange(1, 4)
+    start = rnd.randrange(0, 8)
+    scale = rnd.randrange(2, 6)
+    if rnd.randrange(2):
+        return (f'PROCEDURE {name};\nVAR i;\nBEGIN\n'
+                f'   i := {start};\n'
+                f'   while i < {64 // stride} do begin\n'
+                f'      vec[i * {stride}] := vec[i * {stride}] + i * {scale};\n'
+                f'      i := i + 1\n'
+                f'   end\nEND;\n')
+    return (f'PROCEDURE {name};\nVAR i, j;\nBEGIN\n'
+            f'   i := 0;\n'
+            f'   while i < 8 do begin\n'
+            f'      j := 7;\n'
+            f'      while j >= 0 do begin\n'
+            f'         grid[i][j] := grid[i][j] + (i - j) * {scale};\n'
+            f'         s := s + grid[j][i];\n'
+            f'         j := j - 1\n'
+            f'      end;\n'
+            f'      i := i + 1\n'
+            f'   end\nEND;\n')
+
+
+def strided_program(procedures: int, seed: int = 0) -> str:
+    """
+    Procedures sweeping arrays with loops whose counters are only used to
+    index the arrays, as test for the strength reduction of the loops
+    :param procedures: How many procedures, each runs one sweep
+    """
+    rnd = random.Random(seed)
+    parts = [STRIDED_HEADER]
+    names = [f'sweep{p}' for p in range(procedures)]
+    parts.extend(_sweep(rnd, name) for name in names)
+    calls = ''.join(f'   CALL {name};\n' for name in names)
+    parts.append('BEGIN\n   s := 0;\n' + calls + '   !s;\n   !vec[63];\n   !grid[7][7]\nEND.\n')
+    return '\n'.join(parts)
+
+
+def branch_program(statements: int) -> str:
+    """
+    A single procedure alternating short loops and conditionals, about three
+    basic blocks per statement, as test for the size of the CFG of a procedure
+    :param statements: How many loops and conditionals the procedure runs
+    """
+    body = []
+    for i in range(statements):
+        if i % 2:
+            body.append(f'   if x > {i % 50} then y := y + 1 else z := z - 1')
+        else:
+            body.append('   x := 0;\n   while x < 2 do x := x + 1')
+    return ('VAR x, y, z;\n\nPROCEDURE branches;\nBEGIN\n' + ';\n'.join(body) + '\nEND;\n\n'
+            'BEGIN\n   y := 0;\n   z := 0;\n   CALL branches;\n   !y;\n   !z\nEND.\n')
+
+
+def program_of_size(nbytes: int, seed: int = 0) -> str:
+    """
+    Generate a program whose source is at least nbytes long
+    """
+    statements = max(nbytes // 40, 1)
+    while True:
+        prog = generate_program(statements, seed=seed)
+        if len(prog) >= nbytes:
+            return prog
+        statements *= 2
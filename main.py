@@ -1,10 +1,12 @@
-import src
+import argparse
+import os
+import sys
+import time
+from typing import Optional as Opt
+
+import src.cache as cache
+import src.driver as driver
 import src.lexer as lexer
-import src.parser as parser
-from src.Allocator.Regalloc import LinearScanRegAlloc
-from src.Codegen.Code import Code
-from src.ControlFlow.BBs import BasicBlock
-from src.ControlFlow.CodeContainers import LoweredBlock
 
 prog_1 = '''VAR x, y, squ;
 VAR arr[5]: char;
@@ -96,67 +98,79 @@ BEGIN
     x:=0
 END."""
 
-test_program = prog_1
-lex = lexer.Lexer(test_program)
-prog = parser.Program(lex).parse()
-
-def lower_func(obj, log, errs):
-    if not isinstance(obj, src.IR.IR.IRNode):
-        errs.append(obj)
+argp = argparse.ArgumentParser(
+    description='Compile PL/0 programs. A single file is compiled to the standard output, '
+                'with more files or directories each program is compiled to a .s file '
+                'next to its source')
+argp.add_argument('sources', nargs='*',
+                  help='files or directories to search for .pl0 files, the sample program if missing')
+argp.add_argument('--parser', choices=driver.PARSERS, default='classic',
+                  help='the parser engine, they produce the same IR')
+argp.add_argument('-j', '--jobs', type=int, default=1,
+                  help='worker processes: for a single file they run the per function back end, '
+                       'otherwise they compile the files concurrently')
+argp.add_argument('-O', '--optimize', type=int, choices=[0, 1, 2], default=driver.OPT_LEVEL,
+                  help='optimization level: 0 none, 1 constant folding and value numbering, '
+                       '2 also loop invariant code motion and graph coloring register allocation')
+argp.add_argument('--cache-dir',
+                  help='reuse the results of previous compilations stored in this directory')
+argp.add_argument('--cache-size', type=int, default=cache.DEFAULT_MAX_BYTES // 2 ** 20,
+                  help='the size in MB the cache is trimmed to, least recently used first')
+
+
+def open_cache(args) -> Opt[cache.ArtifactCache]:
+    if args.cache_dir is None:
         return None
-    low = obj.lower()
-    log.append((obj, low))
-    return low
-
-
-log = []
-errs = []
-
-prog.mxdt_navigate(lower_func, log, errs)
-prog = prog.lowered
-prog: LoweredBlock
-
-prog.perform_data_layout()
-
-import src.ControlFlow.CFG as CFG
-
-def iter_bbs_in_fun(entry, instr=False):
-    entry: 'BasicBlock'
-    queue = [entry]
-    visited = set()
-    while len(queue) > 0:
-        while True:
-            bb = queue.pop(0) # first in first out should guarantee breadth first
-            if bb not in visited:
-                break
-        visited.add(bb)
-        queue.extend(set(bb.successors()) - visited)
-        if instr:
-            for ins in bb.statements:
-                yield bb, ins
+    return cache.ArtifactCache(args.cache_dir, args.cache_size * 2 ** 20)
+
+
+def batch(args) -> int:
+    sources = driver.find_sources(args.sources)
+    results = {}
+    start = time.perf_counter()
+    for res in driver.compile_batch(sources, jobs=args.jobs, parser_name=args.parser,
+                                    cache_dir=args.cache_dir, optimize=args.optimize):
+        results[res.source] = res
+    wall = time.perf_counter() - start
+
+    failed = 0
+    for source in sources:
+        res = results[source]
+        if res.error is None:
+            print(f'{res.seconds:8.3f}s  {source} -> {res.output}')
         else:
-            yield bb
-
-def iter_cfg(cfg, instr=False):
-    cfg: 'CFG'
-    funcs: list['LoweredBlock'] = [cfg.global_block] + list(cfg.functions.values())
-    funcs: list['BasicBlock'] = [i.entry_bb for i in funcs if i.entry_bb]
-    for entry_bb in funcs:
-        for el in iter_bbs_in_fun(entry_bb, instr):
-            yield el
-
-cfg = CFG.CFG(prog)
-cfg.liveness()
-#lsa = LinearScanRegAlloc(11, CFG.CFGIter)
-lsa = LinearScanRegAlloc(6, iter_cfg)
-allocator = lsa(cfg)
+            failed += 1
+            print(f'{res.seconds:8.3f}s  {source} FAILED {res.error}')
+    busy = sum(r.seconds for r in results.values())
+    print(f'{len(sources)} files, {failed} failed, {wall:.3f}s elapsed, '
+          f'{busy:.3f}s compiling, {len(sources) / wall if wall else 0:.1f} files/s with {args.jobs} jobs')
+    if art_cache := open_cache(args):
+        # The workers count hits and misses in their own processes
+        hits = sum(1 for r in results.values() if r.cached)
+        art_cache.trim()
+        print(f'cache: {hits} hits, {len(sources) - hits} misses, {art_cache.evicted} evicted, '
+              f'{art_cache.size() / 2 ** 20:.1f} MB in {args.cache_dir}')
+    return 1 if failed else 0
 
-code = Code()
-layout = cfg.global_block.prepare_layout(allocinfo=allocator)
-ret = cfg.global_block.emit_code(code, layout=layout, regalloc=allocator)
 
-print('\n'.join(code.lines))
-
-entry_glob = cfg.global_block.entry_bb
 if __name__ == '__main__':
-    pass
+    args = argp.parse_args()
+
+    if len(args.sources) > 1 or any(os.path.isdir(p) for p in args.sources):
+        sys.exit(batch(args))
+
+    test_program = prog_1
+    art_cache = open_cache(args)
+    if args.sources and art_cache:
+        lines, _ = driver.compile_cached(args.sources[0], art_cache, parser_name=args.parser, jobs=args.jobs,
+                                         optimize=args.optimize)
+        art_cache.trim()
+        print(art_cache.report(), file=sys.stderr)
+    else:
+        if args.sources:
+            lex = lexer.Lexer.from_file(args.sources[0])
+        else:
+            lex = lexer.Lexer(test_program)
+        lines = driver.compile_program(lex, parser_name=args.parser, jobs=args.jobs,
+                                       optimize=args.optimize).lines
+    print('\n'.join(lines))
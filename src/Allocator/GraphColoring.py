@@ -0,0 +1,222 @@
+"""
+Register allocation by coloring the interference graph, after Chaitin and Briggs
+
+The graph has a node for each register of the function and an edge between two
+registers live at the same time, from the liveness of the statements: a
+register written by a statement interferes with the registers live after it and
+with the ones the statement reads, so the result never gets the register of an
+operand. The source of a copy is the exception, the two ends of a copy can get
+the same register.
+
+The copies are coalesced conservatively, the test of Briggs: the two ends are
+merged into one node when it would have fewer than K neighbours with K
+neighbours or more, such a node can always be removed before them so the
+merge can't make the graph harder to color. The copies run most often are
+tried first.
+
+The nodes are then removed from the graph one at a time, the ones with fewer
+than K neighbours first, since whatever the colors of their neighbours one is
+left for them. When all have K neighbours or more, the one with the lowest
+spill cost for its number of neighbours is removed too, optimistically: its
+neighbours may still end up sharing colors. The colors are given in the
+reverse order, each node gets the lowest one its neighbours don't have, a node
+left without is spilled. The spill cost of a register is the number of
+statements reading or writing it, each weighted by 10 to the power of the loop
+depth of its block.
+
+The spilled registers are reloaded in the last two registers where they are
+used (see AllocInfo), so no statement is added and the graph doesn't have to be
+built again
+"""
+import heapq
+from typing import Iterable
+
+import src.Codegen.Lowered as lwr
+from src.Allocator.Regalloc import AllocInfo, RegisterAllocator, SPILL_FLAG
+from src.ControlFlow.Dominators import Dominators
+from src.ControlFlow.Loops import find_loops
+from src.utils.Arithmetic import same_representation
+
+LOOP_WEIGHT = 10
+
+
+def _registers(symbols: Iterable['Symbol']) -> list['Symbol']:
+    return [s for s in symbols if s.alloct == 'reg']
+
+
+def _copied(instr: 'LoweredStat') -> 'Symbol':
+    """The register instr copies to its destination without changing it, None if it's not a copy"""
+    if type(instr) is not lwr.UnaryStat or instr.op != 'plus' or instr.src.alloct != 'reg':
+        return None
+    return instr.src if same_representation(instr.src.stype, instr.dest.stype) else None
+
+
+class GraphColoringRegAlloc(RegisterAllocator):
+    """
+    Chaitin-Briggs coloring of the registers of a function, the liveness of its
+    blocks (see CFG.function_liveness) has to be computed first
+
+    + graph: the neighbours of each node, the registers merged by coalescing
+      share the node of one of them
+    + alias: the register whose node each merged register joined
+    + costs: the spill cost of each node
+    + coalesced: the copies whose two ends were merged
+    + numspill: the registers spilled
+    """
+
+    def __init__(self, nregs, cfg_iterator):
+        """
+        :param nregs: the number of registers available, the last two are kept
+        to reload the spilled registers
+        :param cfg_iterator: a callable receiving a 'CFG' and returning the basic
+        blocks of the function, starting from its entry
+        """
+        self.nreg = nregs
+        self.iterclass = cfg_iterator
+        self.graph: dict['Symbol', set['Symbol']] = {}
+        self.alias: dict['Symbol', 'Symbol'] = {}
+        self.costs: dict['Symbol', float] = {}
+        self.coalesced = 0
+        self.numspill = 0
+
+    def __call__(self, cfg: 'CFG', root: 'LoweredBlock' = None) -> AllocInfo:
+        bbs = list(self.iterclass(cfg))
+        copies = self.build(bbs)
+        self.coalesce(copies)
+        colors = self.select(self.simplify())
+
+        var_to_reg = {}
+        for var in list(self.graph) + list(self.alias):
+            var_to_reg[var] = colors[self.node(var)]
+            self.numspill += var_to_reg[var] == SPILL_FLAG
+        return AllocInfo(var_to_reg, self.numspill, self.nreg)
+
+    def node(self, var: 'Symbol') -> 'Symbol':
+        while var in self.alias:
+            var = self.alias[var]
+        return var
+
+    @staticmethod
+    def loop_depths(bbs: list['BasicBlock']) -> dict['BasicBlock', int]:
+        depths = {}
+        # Inner loops come first, a block gets the depth of the innermost loop it's in
+        for loop in find_loops(Dominators(bbs[0])):
+            depth = loop.depth()
+            for bb in loop.body:
+                depths.setdefault(bb, depth)
+        return depths
+
+    def build(self, bbs: list['BasicBlock']) -> list[tuple['Symbol', 'Symbol', float]]:
+        """
+        Build the interference graph and the spill costs
+        :return: The copies between registers, with their weight
+        """
+        graph, costs = self.graph, self.costs
+        depths = self.loop_depths(bbs)
+        copies = []
+
+        def add(var: 'Symbol'):
+            if var not in graph:
+                graph[var] = set()
+                costs[var] = 0
+
+        def interfere(a: 'Symbol', b: 'Symbol'):
+            if a is not b:
+                graph[a].add(b)
+                graph[b].add(a)
+
+        for bb in bbs:
+            weight = LOOP_WEIGHT ** depths.get(bb, 0)
+            live = set(_registers(bb.live_out))
+            # By name so the order of the nodes, which breaks the ties, doesn't depend on the order of the sets
+            for var in sorted(live, key=lambda v: v.name):
+                add(var)
+            for instr in reversed(bb.statements):
+                defined = _registers(getattr(instr, 'def_set', ()))
+                used = _registers(getattr(instr, 'use_set', ()))
+                for var in defined + used:
+                    add(var)
+                    costs[var] += weight
+                source = _copied(instr) if defined else None
+                if source is not None:
+                    copies.append((defined[0], source, weight))
+                for d in defined:
+                    for var in live:
+                        if var is not source:
+                            interfere(d, var)
+                    for var in used + defined:
+                        if var is not source:
+                            interfere(d, var)
+                live.difference_update(defined)
+                live.update(used)
+        return copies
+
+    def coalesce(self, copies: list[tuple['Symbol', 'Symbol', float]]):
+        """Merge the ends of the copies which pass the test of Briggs, until none does"""
+        k = self.nreg - 2
+        graph = self.graph
+        # Stable, the copies of the same weight are tried in the order of the code
+        copies = sorted(copies, key=lambda c: -c[2])
+        merged = True
+        while merged:
+            merged = False
+            for dest, src, _ in copies:
+                a, b = self.node(dest), self.node(src)
+                if a is b or b in graph[a]:
+                    continue
+                both = graph[a] & graph[b]
+                significant = sum(len(graph[n]) - (n in both) >= k for n in graph[a] | graph[b])
+                if significant >= k:
+                    continue
+                for n in graph.pop(b):
+                    graph[n].discard(b)
+                    graph[n].add(a)
+                    graph[a].add(n)
+                self.alias[b] = a
+                self.costs[a] += self.costs.pop(b)
+                self.coalesced += 1
+                merged = True
+
+    def simplify(self) -> list['Symbol']:
+        """:return: The nodes in the order they are removed from the graph"""
+        k = self.nreg - 2
+        graph = self.graph
+        # The order the nodes were added in breaks the ties
+        order = {n: i for i, n in enumerate(graph)}
+        degree = {n: len(adj) for n, adj in graph.items()}
+        low = [order[n] for n in graph if degree[n] < k]
+        heapq.heapify(low)
+        high = [(self.costs[n] / degree[n], order[n], n) for n in graph if degree[n] >= k]
+        heapq.heapify(high)
+        nodes = list(graph)
+        removed = set()
+        stack = []
+        while len(stack) < len(graph):
+            if low:
+                n = nodes[heapq.heappop(low)]
+            else:
+                _, _, n = heapq.heappop(high)
+                if n in removed or degree[n] < k:
+                    continue
+                cost = self.costs[n] / degree[n]
+                if high and cost > high[0][0]:
+                    # Its neighbours were removed since it was pushed
+                    heapq.heappush(high, (cost, order[n], n))
+                    continue
+            removed.add(n)
+            stack.append(n)
+            for m in graph[n]:
+                if m not in removed:
+                    degree[m] -= 1
+                    if degree[m] == k - 1:
+                        heapq.heappush(low, order[m])
+        return stack
+
+    def select(self, stack: list['Symbol']) -> dict['Symbol', int]:
+        """:return: The color of each node, SPILL_FLAG for the spilled ones"""
+        k = self.nreg - 2
+        colors: dict['Symbol', int] = {}
+        for n in reversed(stack):
+            taken = {colors[m] for m in self.graph[n] if m in colors}
+            colors[n] = next((c for c in range(k) if c not in taken), SPILL_FLAG)
+        return colors
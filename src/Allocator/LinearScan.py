@@ -0,0 +1,227 @@
+"""
+Linear scan register allocation on lifetime intervals with holes
+
+The statements are numbered in the order of the layout of the function, each
+one has two positions, its operands are read at the first and its result is
+written at the second. The interval of a register is the list of the ranges of
+positions where it's live, built from the liveness of the blocks: a register
+live at the end of a block is live over the whole block up to its definition,
+so a value used around a loop stays live through the body of the loop, even
+when the body comes after its last use in the layout. Between its ranges an
+interval has a hole, where its register can hold another interval fitting in
+it. A register read by a statement is live until the result of the statement is
+written, so the result never gets the register of an operand.
+
+The intervals are scanned by increasing start. The ones holding a register are
+active, ordered in a heap by the end of their current range, or inactive in a
+hole, ordered in a heap by the start of their next range, so each interval goes
+through the heaps once per range. An interval gets the lowest register none of
+the active intervals holds and whose inactive intervals don't intersect it.
+When there is none, the interval ending last among the current one and the
+active intervals it could take the register of is spilled.
+"""
+import heapq
+from bisect import bisect_right
+from typing import Iterable, Optional as Opt
+
+from src.Allocator.Regalloc import AllocInfo, RegisterAllocator, SPILL_FLAG
+
+
+def _registers(symbols: Iterable['Symbol']) -> list['Symbol']:
+    return [s for s in symbols if s.alloct == 'reg']
+
+
+class Interval:
+    """
+    + var: the register of the IR
+    + ranges: the sorted disjoint [start, end) ranges of positions where var is live
+    + reg: the register allocated, SPILL_FLAG if spilled, None before the allocation
+    """
+    __slots__ = ('var', 'ranges', 'starts', 'reg')
+
+    def __init__(self, var: 'Symbol'):
+        self.var = var
+        self.ranges: list[list[int]] = []
+        self.starts: list[int] = []
+        self.reg: Opt[int] = None
+
+    @property
+    def start(self) -> int:
+        return self.ranges[0][0]
+
+    @property
+    def end(self) -> int:
+        return self.ranges[-1][1]
+
+    def add_range(self, start: int, end: int):
+        """Add a range starting before the ones already there, the intervals are
+        built from the last position so their ranges are kept backwards until
+        `finish`"""
+        if self.ranges and self.ranges[-1][0] <= end:
+            first = self.ranges[-1]
+            first[0] = min(first[0], start)
+            first[1] = max(first[1], end)
+        else:
+            self.ranges.append([start, end])
+
+    def set_from(self, position: int):
+        """Start the first range where the register is defined, a register which
+        isn't used after the definition is live at its position only"""
+        if self.ranges and self.ranges[-1][0] <= position:
+            self.ranges[-1][0] = position
+        else:
+            self.ranges.append([position, position + 1])
+
+    def finish(self):
+        self.ranges.reverse()
+        self.starts = [r[0] for r in self.ranges]
+
+    def range_after(self, position: int) -> Opt[list[int]]:
+        """The first range ending after position, None if the interval ends before"""
+        idx = bisect_right(self.starts, position) - 1
+        if idx >= 0 and self.ranges[idx][1] > position:
+            return self.ranges[idx]
+        if idx + 1 < len(self.ranges):
+            return self.ranges[idx + 1]
+        return None
+
+    def intersects(self, other: 'Interval') -> bool:
+        if len(self.ranges) > len(other.ranges):
+            return other.intersects(self)
+        for start, end in self.ranges:
+            r = other.range_after(start)
+            if r is not None and r[0] < end:
+                return True
+        return False
+
+    def __repr__(self):
+        return f'{self.var.name} {self.ranges} -> {self.reg}'
+
+
+class IntervalScanRegAlloc(RegisterAllocator):
+    """
+    Linear scan on the lifetime intervals of the registers of a function, the
+    liveness of its blocks (see CFG.function_liveness) has to be computed first
+
+    + intervals: the interval of each register, sorted by start
+    + numspill: the registers spilled
+    """
+
+    def __init__(self, nregs, cfg_iterator):
+        """
+        :param nregs: the number of registers available, the last two are kept
+        to reload the spilled registers
+        :param cfg_iterator: a callable receiving a 'CFG' and returning the basic
+        blocks of the function in the order of their code
+        """
+        self.nreg = nregs
+        self.iterclass = cfg_iterator
+        self.intervals: list[Interval] = []
+        self.numspill = 0
+
+    def build_intervals(self, cfg: 'CFG'):
+        bbs = list(self.iterclass(cfg))
+        bounds = []
+        position = 0
+        for bb in bbs:
+            bounds.append(position)
+            position += 2 * len(bb.statements)
+        intervals: dict['Symbol', Interval] = {}
+        for bb, start in zip(reversed(bbs), reversed(bounds)):
+            end = start + 2 * len(bb.statements)
+            for var in _registers(bb.live_out):
+                if var not in intervals:
+                    intervals[var] = Interval(var)
+                intervals[var].add_range(start, end)
+            for idx in range(len(bb.statements) - 1, -1, -1):
+                instr = bb.statements[idx]
+                read = start + 2 * idx
+                for var in _registers(getattr(instr, 'def_set', ())):
+                    if var not in intervals:
+                        intervals[var] = Interval(var)
+                    intervals[var].set_from(read + 1)
+                for var in _registers(getattr(instr, 'use_set', ())):
+                    if var not in intervals:
+                        intervals[var] = Interval(var)
+                    intervals[var].add_range(start, read + 2)
+
+        for itv in intervals.values():
+            itv.finish()
+        # Ties are broken by name so the allocation doesn't depend on the order of the sets
+        self.intervals = sorted(intervals.values(), key=lambda i: (i.start, i.var.name))
+
+    def __call__(self, cfg: 'CFG', root: 'LoweredBlock' = None) -> AllocInfo:
+        self.build_intervals(cfg)
+        nregs = self.nreg - 2
+        # The intervals holding each register, active or in a hole
+        holders: list[set[Interval]] = [set() for _ in range(nregs)]
+        active: list[tuple[int, int, Interval]] = []  # by end of the current range
+        inactive: list[tuple[int, int, Interval]] = []  # by start of the next range
+        is_active: set[Interval] = set()
+
+        def place(itv: Interval, position: int, seq: int):
+            """Put itv in the right heap for position, or release its register"""
+            r = itv.range_after(position)
+            if r is None:
+                holders[itv.reg].discard(itv)
+                is_active.discard(itv)
+            elif r[0] <= position:
+                is_active.add(itv)
+                heapq.heappush(active, (r[1], seq, itv))
+            else:
+                is_active.discard(itv)
+                heapq.heappush(inactive, (r[0], seq, itv))
+
+        for seq, current in enumerate(self.intervals):
+            position = current.start
+            while active and active[0][0] <= position:
+                _, s, itv = heapq.heappop(active)
+                if itv.reg != SPILL_FLAG:
+                    place(itv, position, s)
+            while inactive and inactive[0][0] <= position:
+                _, s, itv = heapq.heappop(inactive)
+                if itv.reg != SPILL_FLAG:
+                    place(itv, position, s)
+
+            reg = self.free_register(current, holders, is_active)
+            if reg is None:
+                reg = self.spill(current, holders, is_active)
+            if reg is None:
+                current.reg = SPILL_FLAG
+                self.numspill += 1
+                continue
+            current.reg = reg
+            holders[reg].add(current)
+            place(current, position, seq)
+
+        var_to_reg = {itv.var: itv.reg for itv in self.intervals}
+        return AllocInfo(var_to_reg, self.numspill, self.nreg)
+
+    @staticmethod
+    def free_register(current: Interval, holders: list[set[Interval]], is_active: set[Interval]) -> Opt[int]:
+        for reg, held in enumerate(holders):
+            if all(itv not in is_active and not itv.intersects(current) for itv in held):
+                return reg
+        return None
+
+    def spill(self, current: Interval, holders: list[set[Interval]], is_active: set[Interval]) -> Opt[int]:
+        """
+        Spill the active interval ending last, if it ends after current and its
+        register is otherwise free for current
+        :return: The register freed for current, None if current is spilled instead
+        """
+        victim = None
+        for reg, held in enumerate(holders):
+            actives = [itv for itv in held if itv in is_active]
+            if len(actives) != 1 or any(itv.intersects(current) for itv in held if itv not in is_active):
+                continue
+            if actives[0].end > current.end and (victim is None or actives[0].end > victim.end):
+                victim = actives[0]
+        if victim is None:
+            return None
+        reg = victim.reg
+        holders[reg].discard(victim)
+        is_active.discard(victim)
+        victim.reg = SPILL_FLAG
+        self.numspill += 1
+        return reg
@@ -1 +1 @@
-from . import Regalloc
+from . import GraphColoring, LinearScan, Regalloc
@@ -11,13 +11,19 @@ class StackLayout:
 
     At the global level it'll just contain the space needed for spill
     variables and for the register saving
+
+    The layouts of the enclosing functions are kept in `enclosing`, the
+    outermost first, the frame of a variable is found from its nesting distance
+    without going through the parents
     """
 
     def __init__(self, older: Opt['FrozenLayout'] = None):
         if older:
             self.level = older.level + 1
+            self.enclosing: list['FrozenLayout'] = older.enclosing + [older]
         else:
             self.level = 0
+            self.enclosing = []
         self.parent = older
 
         self.before_fp: list[str] = []
@@ -62,13 +68,15 @@ class StackLayout:
     def has_section(self, name: str):
         return name in self.sections
 
-    def get_level(self, lvl: Opt[int]) -> 'StackLayout':
-        if self.level < lvl:
-            raise CodegenException("Trying to get a lever higher than self")
-        if self.level == lvl:
+    def frame(self, levels: int) -> 'StackLayout':
+        """
+        The layout of the function levels functions out, self for 0
+        """
+        if levels > self.level:
+            raise CodegenException("Trying to get a frame outside the global one")
+        if levels == 0:
             return self
-        else:
-            return self.parent.get_level(lvl)
+        return self.enclosing[-levels]
 
     def frame_size(self):
         """
@@ -90,6 +98,7 @@ class FrozenLayout(StackLayout):
         """
         self.level = layout.level
         self.parent = layout.parent
+        self.enclosing = layout.enclosing
         self.before_fp: list[(str, int)] = [(i, layout.offset(i)) for i in layout.before_fp if i in sections]
         self.after_fp: list[(str, int)] = [(i, layout.offset(i)) for i in layout.after_fp if i in sections]
         self.sections: dict[str, tuple['FrozenSection', bool]] = \
@@ -1,17 +1,37 @@
 from typing import Optional as Opt
 
 import src
+from src.Codegen.codegenUtils import frame_address
+from src.ControlFlow.DataLayout import LocalSymbolLayout
 from src.Symbols.Symbols import PrintFun, ReadFun
 from src.utils.Exceptions import IRException
 from src.utils.markers import Lowered
 
 
+def _in_register(var: 'Symbol', regalloc: 'AllocInfo') -> Opt[int]:
+    """The register of var, None if it was spilled"""
+    reg = regalloc.var_to_reg.get(var)
+    if reg is None or regalloc.is_spilled_var(var):
+        return None
+    return reg
+
+
 class LoweredStat(Lowered):
     """
     Lowered statements are low level statements which
     can be directly converted to machine code as well
     as analyzed to extract control flow information.
+
+    Programs have many statements, all the classes define __slots__ and
+    use_set and def_set are tuples, get_used and get_defined build the sets.
+    They are only set by the statements using or defining symbols
+
+    use_fields names the attributes holding the symbols of use_set, the
+    optimizations rename the registers a statement uses through replace_used
+    and the symbols it defines through replace_defined
     """
+    __slots__ = ('dest', 'label', 'use_set', 'def_set')
+    use_fields: tuple[str, ...] = ()
 
     def __init__(self, *, dest=None, label=None):
         self.dest = dest
@@ -28,17 +48,37 @@ class LoweredStat(Lowered):
 
     def get_used(self) -> set['Symbol']:
         try:
-            s = self.use_set.copy()
-            return s
+            return set(self.use_set)
         except AttributeError:
             return set()
 
     def get_defined(self) -> set['Symbol']:
         try:
-            return self.def_set.copy()
+            return set(self.def_set)
         except AttributeError:
             return set()
 
+    def replace_used(self, mapping: dict['Symbol', 'Symbol']):
+        """
+        Replace the symbols used by the statement which are keys of mapping
+        with the corresponding values
+        """
+        for field in self.use_fields:
+            symb = getattr(self, field)
+            if symb in mapping:
+                setattr(self, field, mapping[symb])
+        if hasattr(self, 'use_set'):
+            self.use_set = tuple(mapping.get(s, s) for s in self.use_set)
+
+    def replace_defined(self, mapping: dict['Symbol', 'Symbol']):
+        """
+        Same as replace_used for the symbols the statement defines
+        """
+        if hasattr(self, 'def_set'):
+            if self.dest in mapping:
+                self.dest = mapping[self.dest]
+            self.def_set = tuple(mapping.get(s, s) for s in self.def_set)
+
     def prepare_layout(self, *,
                        layout: 'StackLayout' = None,
                        symtab: 'SymbolTable' = None,
@@ -62,6 +102,9 @@ class BranchStat(LoweredStat):
     Jumps (conditionally) to a label (expecting to return)
     If it expects to return it's a function call
     """
+    __slots__ = ('target', 'rets', 'condition', 'negcond')
+    use_fields = ('condition',)
+
     def __init__(self, *,
                  target,
                  returns=False,
@@ -78,7 +121,7 @@ class BranchStat(LoweredStat):
         self.negcond: bool = negcond
         super().__init__()
         if self.condition is not None:
-            self.use_set = {self.condition}
+            self.use_set = (self.condition,)
 
     def __repr__(self):
         cond = ""
@@ -147,10 +190,13 @@ class PrintStat(BranchStat):
         call print
         restore regs
     """
+    __slots__ = ('src',)
+    use_fields = ('src',)
+
     def __init__(self, *, src: 'RegisterSymb'):
         super().__init__(returns=True, target=PrintFun)
         self.src = src
-        self.use_set = {src}
+        self.use_set = (src,)
 
     def __repr__(self):
         return f"{repr(self.label) + ': ' if self.label else ''}print {self.src}"
@@ -176,10 +222,12 @@ class ReadStat(BranchStat):
         reg[dest] := a0
         restore_regs
     """
+    __slots__ = ()
+
     def __init__(self, *, dest: 'RegisterSymb'):
         super().__init__(returns=True, target=ReadFun)
         LoweredStat.__init__(self, dest=dest)
-        self.def_set = {dest}
+        self.def_set = (dest,)
 
     def __repr__(self):
         return f"{repr(self.label) + ': ' if self.label else ''}{self.dest} <- read"
@@ -196,6 +244,8 @@ class ReadStat(BranchStat):
 
 
 class EmptyStat(LoweredStat):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
@@ -215,29 +265,53 @@ class EmptyStat(LoweredStat):
 class LoadPtrToSymb(LoweredStat):
     """
     Loads in dest the pointer to the symbol in memory
+    levels is the nesting distance from the function of the statement to the
+    one whose frame holds the symbol, as resolved by the parser, 0 for its own
+    variables
     """
-    def __init__(self, *, dest, symbol):
+    __slots__ = ('symbol', 'levels')
+    use_fields = ('symbol',)
+
+    def __init__(self, *, dest, symbol, levels=0):
         super().__init__(dest=dest)
         self.symbol = symbol
-        self.use_set = {self.symbol}
-        self.def_set = {self.dest}
+        self.levels = levels
+        self.use_set = (self.symbol,)
+        self.def_set = (self.dest,)
 
     def __repr__(self):
         return f"{repr(self.label) + ': ' if self.label else ''}{self.dest} <- ADDR[{self.symbol}]"
 
+    def emit_code(self, code: 'Code', *,
+                  layout: 'StackLayout' = None,
+                  symtab: 'SymbolTable' = None,
+                  regalloc: 'AllocInfo' = None,
+                  bblock: 'BasicBlock' = None,
+                  container: 'LoweredBlock' = None) -> Opt['Code']:
+        dest = _in_register(self.dest, regalloc)
+        if isinstance(self.symbol.allocinfo, LocalSymbolLayout) and dest is not None:
+            base, offset = frame_address(code, layout, self.symbol, self.levels)
+            code.instruction(f'add {dest}, {base}, #{offset}')
+        # TODO: global variables and spilled registers
+
 
 class StoreStat(LoweredStat):
     """
-    TODO
+    Stores symbol in the variable dest, or at the address in dest if it's a
+    register. levels is the nesting distance of the variable, see LoadPtrToSymb
     """
-    def __init__(self, *, dest, symbol):
+    __slots__ = ('symbol', 'levels')
+    use_fields = ('symbol', 'dest')
+
+    def __init__(self, *, dest, symbol, levels=0):
         super().__init__(dest=dest)
         self.symbol = symbol
+        self.levels = levels
         if self.dest.alloct == 'reg':
-            self.use_set = {symbol, dest}
+            self.use_set = (symbol, dest)
         else:
-            self.def_set = {dest}
-            self.use_set = {symbol}
+            self.def_set = (dest,)
+            self.use_set = (symbol,)
 
     def __repr__(self):
         if self.dest.alloct == 'reg':
@@ -245,20 +319,37 @@ class StoreStat(LoweredStat):
         else:
             return f"{repr(self.label) + ': ' if self.label else ''}MEM[{self.dest}] <- {self.symbol}"
 
+    def emit_code(self, code: 'Code', *,
+                  layout: 'StackLayout' = None,
+                  symtab: 'SymbolTable' = None,
+                  regalloc: 'AllocInfo' = None,
+                  bblock: 'BasicBlock' = None,
+                  container: 'LoweredBlock' = None) -> Opt['Code']:
+        value = _in_register(self.symbol, regalloc)
+        if isinstance(self.dest.allocinfo, LocalSymbolLayout) and value is not None:
+            base, offset = frame_address(code, layout, self.dest, self.levels)
+            code.instruction(f'str {value}, [{base}, #{offset}]')
+        # TODO: global variables, stores through pointers and spilled registers
+
 
 class LoadStat(LoweredStat):
     """
     Loads from memory into dest
     If symbols is a register it loads the value at the address in symbol
-    If it's a variable it loads the variable from memory
+    If it's a variable it loads the variable from memory, levels is its nesting
+    distance, see LoadPtrToSymb
     """
-    def __init__(self, *, dest, symbol):
+    __slots__ = ('symbol', 'levels')
+    use_fields = ('symbol',)
+
+    def __init__(self, *, dest, symbol, levels=0):
         super().__init__(dest=dest)
         self.symbol = symbol
+        self.levels = levels
         if self.dest.alloct != 'reg':
             raise IRException("Load not to a register")
-        self.use_set = {self.symbol}
-        self.def_set = {self.dest}
+        self.use_set = (self.symbol,)
+        self.def_set = (self.dest,)
 
     def __repr__(self):
         if self.symbol.alloct == 'reg':
@@ -266,16 +357,30 @@ class LoadStat(LoweredStat):
         else:
             return f"{repr(self.label) + ': ' if self.label else ''}{self.dest} <- MEM[{self.symbol}]"
 
+    def emit_code(self, code: 'Code', *,
+                  layout: 'StackLayout' = None,
+                  symtab: 'SymbolTable' = None,
+                  regalloc: 'AllocInfo' = None,
+                  bblock: 'BasicBlock' = None,
+                  container: 'LoweredBlock' = None) -> Opt['Code']:
+        dest = _in_register(self.dest, regalloc)
+        if isinstance(self.symbol.allocinfo, LocalSymbolLayout) and dest is not None:
+            base, offset = frame_address(code, layout, self.symbol, self.levels)
+            code.instruction(f'ldr {dest}, [{base}, #{offset}]')
+        # TODO: global variables, loads through pointers and spilled registers
+
 
 
 class LoadImmStat(LoweredStat):
     """
     Places an immediate value in the register
     """
+    __slots__ = ('val',)
+
     def __init__(self, *, dest, val):
         super().__init__(dest=dest)
         self.val = val
-        self.def_set = {self.dest}
+        self.def_set = (self.dest,)
 
     def __repr__(self):
         return f"{repr(self.label) + ': ' if self.label else ''}{self.dest} <- IMM[{self.val}]"
@@ -285,13 +390,16 @@ class BinStat(LoweredStat):
     """
     Binary operation between two registers
     """
+    __slots__ = ('op', 'srca', 'srcb')
+    use_fields = ('srca', 'srcb')
+
     def __init__(self, *, dest: 'RegisterSymb', op, srca, srcb):
         super(BinStat, self).__init__(dest=dest)
         self.op = op
         self.srca: 'RegisterSymb' = srca
         self.srcb: 'RegisterSymb' = srcb
-        self.def_set = {self.dest}
-        self.use_set = {self.srcb, self.srca}
+        self.def_set = (self.dest,)
+        self.use_set = (self.srcb, self.srca)
 
     def __repr__(self):
         return f"{repr(self.label) + ': ' if self.label else ''}{self.dest} <- {self.srca} '{self.op}' {self.srcb}"
@@ -318,18 +426,50 @@ class UnaryStat(LoweredStat):
     """
     Unary operation on a register
     """
+    __slots__ = ('op', 'src')
+    use_fields = ('src',)
+
     def __init__(self, *, dest, op, src):
         super(UnaryStat, self).__init__(dest=dest)
         self.op = op
         self.src = src
-        self.def_set = {self.dest}
-        self.use_set = {self.src}
+        self.def_set = (self.dest,)
+        self.use_set = (self.src,)
 
     def __repr__(self):
         return f"{repr(self.label) + ': ' if self.label else ''}{self.dest} <- '{self.op}' {self.src}"
 
 
+class PhiStat(LoweredStat):
+    """
+    Selects in dest the source of the predecessor the block was entered from
+    Only found at the start of the blocks of a function in SSA form, the
+    sources are keyed by predecessor
+    """
+    __slots__ = ('sources',)
+
+    def __init__(self, *, dest, sources: dict['BasicBlock', 'RegisterSymb']):
+        super().__init__(dest=dest)
+        self.sources = sources
+        self.def_set = (self.dest,)
+        self.use_set = tuple(sources.values())
+
+    def replace_used(self, mapping: dict['Symbol', 'Symbol']):
+        self.sources = {bb: mapping.get(s, s) for bb, s in self.sources.items()}
+        self.use_set = tuple(self.sources.values())
+
+    def set_source(self, pred: 'BasicBlock', source: 'RegisterSymb'):
+        self.sources[pred] = source
+        self.use_set = tuple(self.sources.values())
+
+    def __repr__(self):
+        sources = ', '.join(str(s) for s in self.sources.values())
+        return f"{repr(self.label) + ': ' if self.label else ''}{self.dest} <- PHI({sources})"
+
+
 class StatList(LoweredStat):
+    __slots__ = ('children', 'function')
+
     def __init__(self, *, children=None):
         self.children = []
         dest = None
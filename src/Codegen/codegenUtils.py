@@ -1,25 +1,69 @@
 import src
+import src.Codegen.registers as R
+
+
+def _offsets(section: str, slots: list[int], layout: 'StackLayout') -> list[int]:
+    """
+    The offsets from the stack pointer of the words of section, the stack
+    pointer is below the frame pointer by the size of the frame
+    """
+    top = layout.frame_size() - layout.offset(section)
+    return [(top - slot - 1) * 4 for slot in slots]
 
 
 def restore_regs(*regs,
                  section: str,
                  code: 'Code',
                  layout: 'StackLayout',
-                 regalloc: 'AllocInfo'):
+                 regalloc: 'AllocInfo',
+                 slots: list[int] = None):
+    """
+    Load regs from their words of section
+    :param slots: The word of each register, the first words in order if None
+    """
+    if not regs:
+        return
     code.comment("Restoring registers")
-    pass
+    for reg, off in zip(regs, _offsets(section, slots or range(len(regs)), layout)):
+        code.instruction(f'ldr {reg}, [{R.SP}, #{off}]')
 
 
 def save_registers(*regs,
                    section: str,
                    code: 'Code',
                    layout: 'StackLayout',
-                   regalloc: 'AllocInfo'):
+                   regalloc: 'AllocInfo',
+                   slots: list[int] = None):
+    """
+    Store regs in their words of section
+    :param slots: The word of each register, the first words in order if None
+    """
+    if not regs:
+        return
     code.comment("Saving registers")
-    pass
+    for reg, off in zip(regs, _offsets(section, slots or range(len(regs)), layout)):
+        code.instruction(f'str {reg}, [{R.SP}, #{off}]')
+
+
+def frame_address(code: 'Code', layout: 'StackLayout', symbol: 'Symbol', levels: int) -> tuple[int, int]:
+    """
+    Where a local variable of the function levels functions out is, from its
+    nesting distance. The frame pointers of the enclosing functions are kept in
+    the level_ref section, the closest first, the one needed is loaded in the
+    scratch register
+    :return: The base register and the offset of the variable from it
+    """
+    offset = symbol.allocinfo.reloff - layout.frame(levels).offset('local_vars') * 4
+    if levels == 0:
+        return R.FP, offset
+    # The sections before the frame pointer have negative offsets, to their far end
+    refs = -layout.offset('level_ref') - layout.get_section('level_ref').max_size
+    code.instruction(f'ldr {R.SCR}, [{R.FP}, #{(refs + levels - 1) * 4}]')
+    return R.SCR, offset
 
 
 if __name__ == '__main__':
     Code = src.Codegen.Code.Code
     StackLayout = src.Codegen.FrameUtils.StackLayout
     AllocInfo = src.Allocator.Regalloc.AllocInfo
+    Symbol = src.Symbols.Symbols.Symbol
@@ -13,5 +13,8 @@ A2 = 1
 A3 = 2
 A4 = 3
 
+# Preserved across calls, a function writing them saves them first
+CALLEE_SAVED = (4, 5, 6, 7, 8, 9, 10)
+
 for i in range(16):
     exec(f'R{i} = {i}')
\ No newline at end of file
@@ -8,6 +8,10 @@ from src.utils.Exceptions import CFGException
 
 
 class BasicBlock:
+    __slots__ = ('statements', 'label_in', 'next', 'next_lab', 'target', 'target_lab',
+                 'function', 'symtab', 'container_block', 'kill', 'gen',
+                 'live_in', 'live_out', 'total_vars_used', 'preds')
+
     def __init__(self, function, symtab):
         self.statements: list['LoweredStat'] = []
         self.label_in: Opt['Symbol'] = None
@@ -15,6 +19,7 @@ class BasicBlock:
         self.next_lab: Opt['Symbol'] = None
         self.target: Opt['BasicBlock'] = None  # the target of a branch instruction
         self.target_lab: Opt['Symbol'] = None
+        self.preds: list['BasicBlock'] = []  # kept by add_succs and remove_succs
 
         self.function: Opt['Symbol'] = function  # if None then it's part of the global function
         self.symtab: 'SymbolTable' = symtab
@@ -70,7 +75,13 @@ class BasicBlock:
 
         self.live_in = set()
         self.live_out = set()
+        self.compute_gen_kill()
 
+    def compute_gen_kill(self):
+        """
+        The symbols used before being defined in the block (gen) and the ones it
+        defines (kill), to recompute whenever the statements change
+        """
         self.kill = set()
         self.gen = set()
 
@@ -88,15 +99,47 @@ class BasicBlock:
         if self.label_in:
             raise CFGException("Adding label to already labeled block")
         self.label_in = label
+        if self.container_block is not None:
+            self.container_block.labels[label] = self
 
     def add_succs(self, *, next: Opt['BasicBlock'] = None, alt: Opt['BasicBlock'] = None):
         if next:
+            old = self.next
             self.next = next
             self.next_lab = next.label_in
+            self._relink(old, next)
         if alt:
             if self.target_lab != alt.label_in:
                 raise CFGException("Adding target with incorrect label")
+            old = self.target
             self.target = alt
+            self._relink(old, alt)
+
+    def remove_succs(self, *, next=False, alt=False):
+        """Remove the edge to the next block and/or to the target, with its label"""
+        if next:
+            old = self.next
+            self.next = None
+            self.next_lab = None
+            self._relink(old, None)
+        if alt:
+            old = self.target
+            self.target = None
+            self.target_lab = None
+            self._relink(old, None)
+
+    def _relink(self, old: Opt['BasicBlock'], new: Opt['BasicBlock']):
+        """Update the predecessors of the blocks after an edge of self went from old to new"""
+        if old is not None and old is not self.next and old is not self.target and self in old.preds:
+            old.preds.remove(self)
+        if new is not None and self not in new.preds:
+            new.preds.append(self)
+        self.drop_orders()
+
+    def drop_orders(self):
+        """Forget the orders of the blocks of the function, to call when its edges change"""
+        if self.container_block is not None:
+            self.container_block.cached_orders = None
 
     def successors(self) -> list['BasicBlock']:
         """
@@ -132,8 +175,7 @@ class BasicBlock:
             if func is None:
                 self.live_out = set()
             else:
-                globs = self.symtab.get_global_symbols()
-                self.live_out = set(globs)
+                self.live_out = self.symtab.get_global_symbol_set()
 
         self.live_in = self.gen | (self.live_out - self.kill)
         return not ((lin == len(self.live_in)) and (lout == len(self.live_out)))
@@ -143,7 +185,7 @@ class BasicBlock:
         Backwards evaluation of instruction level liveness
         :return:
         """
-        currently_live = self.live_out
+        currently_live = set(self.live_out)
 
         i: 'LoweredStat'
         for i in reversed(self.statements):
@@ -162,10 +204,9 @@ class BasicBlock:
 
     def remove_useless_next(self):
         last_instr = self.statements[-1]
-        if isinstance(last_instr, BranchStat):
+        if isinstance(last_instr, BranchStat) and not last_instr.rets:
             if last_instr.condition is None:
-                self.next = None
-                self.next_lab = None
+                self.remove_succs(next=True)
 
     def func_calls(self) -> set['Symbol']:
         s = set()
@@ -177,6 +218,9 @@ class BasicBlock:
 
     def bind_to_block(self, block: 'LoweredBlock'):
         self.container_block = block
+        block.cached_orders = None
+        if self.label_in is not None:
+            block.labels[self.label_in] = self
 
     def __repr__(self):
         if self.label_in:
@@ -189,46 +233,38 @@ class BasicBlock:
             return f"BasicBlock: {repr(self.label_in)} -> {' | '.join(out)}"
         return f"BasicBlock_{len(self.statements)}_instrs"
 
-    @staticmethod
-    def iter_bbs(head, instr=False):
-        """
-        :param head: The first basic block
-        :param instr: If true return all the statements in a block,
-        if false just return the basic block
-        :return:
-        """
-        visited = set()
-        queue = [head]
-        while len(queue) > 0:
-            bb: BasicBlock = queue.pop()
-            if instr:
-                for instr in bb.statements:
-                    yield bb, instr
-            else:
-                yield bb
-            visited.add(bb)
-
-            queue.extend(set(bb.successors()) - visited)
     # TODO: allow inserting instruction/basic blocks within a pre-existing
     #  basic block
 
 
 class FakeBlock(BasicBlock):
+    __slots__ = ('folls', 'folls_labs')
+
     def __init__(self, function, symtab, *,
                  preds: Opt[list[BasicBlock]] = None,
                  folls: Opt[list[BasicBlock]] = None):
         super(FakeBlock, self).__init__(function, symtab)
         self.finalize()
-        if folls is None:
-            folls = []
-        self.folls = folls
-        self.folls_labs = [i.label_in for i in folls]
+        self.folls: list[BasicBlock] = []
+        self.folls_labs: list['Symbol'] = []
+        self.set_folls(folls or [])
 
         if preds is None:
             preds = []
         for b in preds:
             b.add_succs(next=self)
 
+    def set_folls(self, folls: list[BasicBlock]):
+        for f in self.folls:
+            if f not in folls and self in f.preds:
+                f.preds.remove(self)
+        for f in folls:
+            if self not in f.preds:
+                f.preds.append(self)
+        self.folls = folls
+        self.folls_labs = [i.label_in for i in folls]
+        self.drop_orders()
+
     def get_follower_labels(self) -> set['Symbol']:
         return set(self.folls_labs)
 
@@ -243,6 +279,22 @@ class FakeBlock(BasicBlock):
                    f" -> {'|'.join([repr(i.label_in) for i in self.successors()])}"
 
 
+def redirect(pred: 'BasicBlock', old: 'BasicBlock', new: 'BasicBlock'):
+    """Make pred continue to new wherever it continued to old"""
+    if isinstance(pred, FakeBlock):
+        pred.set_folls([new if f is old else f for f in pred.folls])
+        return
+    if pred.next is old:
+        pred.add_succs(next=new)
+    if pred.target is old:
+        branch = pred.statements[-1]
+        if not isinstance(branch, BranchStat) or branch.target != old.label_in:
+            raise CFGException("Branch to a block not ending its predecessor")
+        branch.target = new.label_in
+        pred.target_lab = new.label_in
+        pred.add_succs(alt=new)
+
+
 if __name__ == '__main__':
     Symbol = src.Symbols.Symbols.Symbol
     LoweredStat = src.Codegen.Lowered.LoweredStat
@@ -1,7 +1,8 @@
-from typing import Optional as Opt
+from typing import Iterator, Optional as Opt
 
 import src
 from src.ControlFlow.CodeContainers import LoweredBlock, LoweredDef
+from src.ControlFlow.Dataflow import Liveness
 from src.utils.Exceptions import CFGException
 
 
@@ -22,7 +23,8 @@ class CFG:
                 for i in el.defs.lst:
                     i: 'LoweredDef'
                     queue.append(i)
-                _ = el.to_bbs()
+                if el.entry_bb is None:  # a block loaded by Serialization already has them
+                    self.link(el.to_bbs(), el.labels)
                 if el.function is None:
                     self.global_block = el
             elif isinstance(el, LoweredDef):
@@ -37,17 +39,26 @@ class CFG:
             blocks_labs.add(bb.label_in)
             follows_labs |= bb.get_follower_labels()
 
+        self.heads_labels = blocks_labs - follows_labs
+
+    @staticmethod
+    def link(bbs: list['BasicBlock'], labels: dict['Symbol', 'BasicBlock']):
+        """
+        Connect the blocks of a function to the targets of their branches, found
+        by label in the index of the function, and drop the fall through edges
+        of the blocks ending with an unconditional jump
+        """
+        for bb in bbs:
             if lab_t := bb.target_lab:
-                bb.add_succs(alt=self.find_by_lab(lab_t))
+                if lab_t not in labels:
+                    raise CFGException("Couldn't find block with the right label")
+                bb.add_succs(alt=labels[lab_t])
             bb.remove_useless_next()
 
-        self.heads_labels = blocks_labs - follows_labs
-
     def find_by_lab(self, label: 'Symbol') -> 'BasicBlock':
-        bb: 'BasicBlock'
-        for bb in self:
-            if label == bb.label_in:
-                return bb
+        for block in self.blocks_in_order():
+            if label in block.labels:
+                return block.labels[label]
         raise CFGException("Couldn't find block with the right label")
 
     def get_heads(self):
@@ -56,51 +67,59 @@ class CFG:
     def find_pred(self, label: 'Symbol') -> set['BasicBlock']:
         """
         Returns a set of basic blocks such that for each of them
-        label is in their `.get_followers_labels`
+        label is in their `.get_followers_labels`, from the predecessors
+        kept by the block starting with label
         :param label:
         :return:
         """
-        s = set()
-        i: 'BasicBlock'
-        for i in self:
-            if label in i.get_follower_labels():
-                s.add(i)
-        return s
+        return set(self.find_by_lab(label).preds)
 
     def liveness(self):
-        bb: 'BasicBlock'
-        while any(map(lambda bb: bb.liveness_iter(), self)):
-            pass
+        for block in self.blocks_in_order():
+            self.function_liveness(block)
 
-        for bb in self:
+    def function_liveness(self, block: 'LoweredBlock') -> Liveness:
+        """
+        Liveness of the basic blocks of a single function, functions don't share
+        blocks so this gives the same result as `liveness` for those blocks.
+        At the end of a procedure the global symbols are live
+        :return: The solved analysis
+        """
+        exit_live = block.symtab.get_global_symbol_set() if block.function is not None else ()
+        live = Liveness(block.entry_bb, exit_live, block.orders().reverse_postorder).solve()
+        for bb in live.order:
+            bb.live_in = live.live_in(bb)
+            bb.live_out = live.live_out(bb)
             bb.instr_liveness()
+        return live
+
+    def blocks_in_order(self) -> list['LoweredBlock']:
+        """
+        :return: The global block and all the functions, every function comes
+                 after the functions it defines, in the order of definition.
+                 This is the order in which the code for them is emitted
+        """
+        order = []
 
-    def __iter__(self):
-        return CFGIter(self)
+        def visit(block: 'LoweredBlock'):
+            for defun in block.defs.lst:
+                visit(defun.body)
+            order.append(block)
 
-class CFGIter:
-    def __init__(self, cfg: CFG):
-        self.queue: list['BasicBlock'] = []
-        for _, b in cfg.functions.items():
-            b: 'LoweredBlock'
-            self.queue.append(b.entry_bb)
-        self.queue.append(cfg.global_block.entry_bb)
-        self.visited = set()
+        visit(self.global_block)
+        return order
 
-    def __next__(self):
-        try:
-            bb = self.queue.pop()
-            nxt = set(bb.successors())
-            self.visited.add(bb)
-            self.queue.extend(nxt - self.visited)
-            return bb
-        except IndexError:
-            raise StopIteration()
+    def __iter__(self) -> Iterator['BasicBlock']:
+        """The basic blocks of the functions in the order of `blocks_in_order`,
+        the ones of each function in the order of its layout"""
+        for block in self.blocks_in_order():
+            yield from block.orders().layout
 
-    def __iter__(self):
-        return self
+    def statements(self) -> Iterator[tuple['BasicBlock', 'LoweredStat']]:
+        """The statements of every function, with their block, in the same order"""
+        for block in self.blocks_in_order():
+            yield from block.statements()
 
 
 if __name__ == '__main__':
     Symbol = src.Symbols.Symbols.Symbol
-    BasicBlock = src.ControlFlow.BBs.BasicBlock
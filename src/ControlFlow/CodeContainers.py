@@ -1,17 +1,24 @@
-from typing import Optional as Opt
+from typing import Iterator, Optional as Opt
 
 import src
 from src.Codegen.FrameUtils import FrozenLayout, StackLayout, StackSection
-from src.Codegen.Lowered import EmptyStat
+from src.Allocator.Regalloc import SPILL_FLAG
+from src.Codegen.Lowered import BranchStat, EmptyStat
 from src.Codegen.codegenUtils import save_registers, restore_regs
-from src.ControlFlow.BBs import BasicBlock, FakeBlock
+from src.ControlFlow.BBs import FakeBlock
 from src.ControlFlow.DataLayout import DataLayout, GlobalSymbolLayout, LocalSymbolLayout
+from src.ControlFlow.Orders import BlockOrders, fall_through
+from src.ControlFlow.ShrinkWrapping import ShrinkWrapping
+from src.Symbols.Symbols import PrintFun, ReadFun, Symbol
 from src.utils.Exceptions import IRException
 from src.utils.markers import Lowered
 import src.Codegen.registers as R
 
 
 class LoweredBlock(Lowered, DataLayout):
+    __slots__ = ('symtab', 'function', 'statlist', 'defs', 'entry_bb', 'exit_bb', 'labels',
+                 'cached_orders')
+
     def set_label(self, label):
         raise IRException("Trying to set a label to a block")
 
@@ -30,6 +37,10 @@ class LoweredBlock(Lowered, DataLayout):
 
         self.entry_bb: Opt['FakeBlock'] = None
         self.exit_bb: Opt['FakeBlock'] = None
+        # The block starting with each label, filled as the blocks are bound to this one
+        self.labels: dict['Symbol', 'BasicBlock'] = {}
+        # Dropped by the basic blocks whenever an edge between them changes
+        self.cached_orders: Opt[BlockOrders] = None
 
     def perform_data_layout(self):
         """
@@ -44,14 +55,14 @@ class LoweredBlock(Lowered, DataLayout):
 
             var: 'Symbol'
             for var in self.symtab:
-                if var.stype.size == 0:
+                if var.stype.size == 0 or var.alloct == 'const':
                     continue
                 var.set_alloc_info(GlobalSymbolLayout(prefix + var.name, var.stype.size // 8))
         else:
             prefix = "_l_"
             offs = 0
             for var in self.symtab:
-                if var.stype.size == 0:
+                if var.stype.size == 0 or var.alloct == 'const':
                     continue
                 bsize = var.stype.size // 8
                 offs -= bsize
@@ -65,27 +76,61 @@ class LoweredBlock(Lowered, DataLayout):
             i.perform_data_layout()
         return
 
+    def add_variable(self, name: str, stype: 'Type') -> 'Symbol':
+        """
+        Declare a variable of the block after the data layout, it's placed
+        after the variables already there. The name is made unique in the block
+        """
+        while name in self.symtab.index:
+            name += '_'
+        var = Symbol(name, stype)
+        self.symtab.append(var)
+        bsize = stype.size // 8
+        if self.function is None:
+            var.set_alloc_info(GlobalSymbolLayout("_g_" + name, bsize))
+        else:
+            offs = min((s.allocinfo.reloff for s in self.symtab.lst
+                        if isinstance(s.allocinfo, LocalSymbolLayout)), default=0)
+            var.set_alloc_info(LocalSymbolLayout("_l_" + name, offs - bsize, bsize, self.symtab.lvl))
+        return var
+
+    def remove_variables(self, variables: set['Symbol']):
+        """
+        Remove variables of the block no statement uses any more, the local
+        variables left are packed again
+        """
+        self.symtab.remove(variables)
+        if self.function is not None:
+            offs = 0
+            for var in self.symtab:
+                if isinstance(var.allocinfo, LocalSymbolLayout):
+                    offs -= var.allocinfo.bsize
+                    var.allocinfo.reloff = offs
+
+    def orders(self) -> BlockOrders:
+        """The orders of the basic blocks, computed again after the edges changed"""
+        if self.cached_orders is None:
+            self.cached_orders = BlockOrders(self)
+        return self.cached_orders
+
+    def statements(self) -> Iterator[tuple['BasicBlock', 'LoweredStat']]:
+        """The statements of the basic blocks, with their block, in the order of the layout"""
+        for bb in self.orders().layout:
+            for instr in bb.statements:
+                yield bb, instr
+
     def to_bbs(self) -> list['BasicBlock']:
         lst = self.statlist.to_bbs(symtab=self.symtab)
 
         exit_bbs = []
-        entry_bbs = []
-        bblocks = set()
-        bb_succ = set()
         for b in lst:
             b.bind_to_block(self)
-            bblocks.add(b)
-            folls = b.get_follower_labels()
-            if len(folls) == 0:
+            if len(b.get_follower_labels()) == 0:
                 exit_bbs.append(b)
-            else:
-                bb_succ |= folls
-
-        for b in bblocks:
-            if b.label_in not in bb_succ:
-                entry_bbs.append(b)
-            else:
-                bb_succ.discard(b.label_in)
+
+        # The function starts from its first block, the blocks no branch goes to
+        # are not entries but dead code
+        entry_bbs = lst[:1]
         self.entry_bb = FakeBlock(self.function, self.symtab, folls=entry_bbs)
         self.entry_bb.bind_to_block(self)
 
@@ -120,13 +165,14 @@ class LoweredBlock(Lowered, DataLayout):
         new.add_section(StackSection('args_in'), True)
 
         reg_save_in = StackSection('regsave_in', False)
-        reg_save_in.set_size(len(self.get_regs_save()))
+        reg_save_in.set_size(len(self.get_regs_save(allocinfo)))
         new.add_section(reg_save_in)
 
         local_vars = StackSection('local_vars')
         if self.function is not None:
             for sym in self.symtab:
-                local_vars.grow(symb=sym)
+                if sym.alloct != 'const':
+                    local_vars.grow(symb=sym)
         new.add_section(local_vars)
 
         spll = StackSection('spill')
@@ -135,14 +181,45 @@ class LoweredBlock(Lowered, DataLayout):
         new.add_section(StackSection('regsave_out'))
         new.add_section(StackSection('args_out'))
 
-        for bb, instr in BasicBlock.iter_bbs(self.entry_bb, instr=True):
+        for bb, instr in self.statements():
             instr: 'LoweredStat'
             instr.prepare_layout(layout=new, symtab=self.symtab, regalloc=allocinfo, bblock=bb, container=self)
 
         return new
 
-    def get_regs_save(self):
-        return [4, 5, 6, 7, 8, 9, 10, R.FP, R.LR]
+    def get_regs_save(self, allocinfo: 'AllocInfo') -> list[int]:
+        """
+        The registers to save on entry and restore on exit: the callee saved
+        registers the allocator gave to the registers of the function, and the
+        two used to reload the spilled ones if any, then the frame pointer if
+        the function sets it up and the link register if it calls anything,
+        print and read included
+        """
+        used = {reg for reg in allocinfo.var_to_reg.values() if reg != SPILL_FLAG}
+        if allocinfo.numspill:
+            used |= {allocinfo.nregs - 2, allocinfo.nregs - 1}
+        regs = sorted(used & set(R.CALLEE_SAVED))
+        if self.uses_frame_pointer(allocinfo):
+            regs.append(R.FP)
+        if any(bb.func_calls() for bb in self.orders().layout):
+            regs.append(R.LR)
+        return regs
+
+    def uses_frame_pointer(self, allocinfo: 'AllocInfo') -> bool:
+        """
+        The frame pointer is needed to address the local variables, the
+        variables of the enclosing functions (through the frame pointers
+        passed by the caller) and the spilled registers, and to pass the frame
+        pointers to the procedures called. Leaves doing none of this omit it
+        """
+        if allocinfo.numspill:
+            return True
+        for _, instr in self.statements():
+            if isinstance(instr, BranchStat) and instr.rets and instr.target not in (PrintFun, ReadFun):
+                return True
+            if any(isinstance(s.allocinfo, LocalSymbolLayout) for s in instr.get_used() | instr.get_defined()):
+                return True
+        return False
 
     def emit_code(self, code: 'Code', *,
                   layout: 'StackLayout' = None,
@@ -152,12 +229,7 @@ class LoweredBlock(Lowered, DataLayout):
 
         # If global prepare global variables
         if self.function is None:
-            for sym in self.symtab:
-                sym: 'Symbol'
-                if sym.allocinfo:
-                    code.global_var(sym.name, sym.allocinfo.bsize)
-            code.set_ident(1)
-            code.new_line()
+            self.emit_globals(code)
 
         # Add the code for all defined functions before generating any code
         for defun in self.defs.lst:
@@ -168,7 +240,26 @@ class LoweredBlock(Lowered, DataLayout):
                                                       layout=layout_child,
                                                       regalloc=regalloc))
 
-        # From here I'm generating the actual block code
+        self.emit_body(code, layout=layout, regalloc=regalloc)
+        return None
+
+    def emit_globals(self, code: 'Code'):
+        """
+        Declare the global variables, only for the global block
+        """
+        for sym in self.symtab:
+            sym: 'Symbol'
+            if sym.allocinfo:
+                code.global_var(sym.name, sym.allocinfo.bsize)
+        code.set_ident(1)
+        code.new_line()
+
+    def emit_body(self, code: 'Code', *,
+                  layout: 'StackLayout' = None,
+                  regalloc: 'AllocInfo' = None):
+        """
+        Emit the code of this block alone, without the functions it defines
+        """
         if self.function:
             code.comment(f"Block for {self.function}")
             code.label(self.function.name)
@@ -177,46 +268,150 @@ class LoweredBlock(Lowered, DataLayout):
             code.instruction('.global __pl0_start')
             code.label('__pl0_start')
 
-        code.instruction(f'mov {R.FP}, {R.SP}')
-        code.instruction(f'sub {R.SP}, {R.SP}, #{layout.frame_size()*4}')
+        saves = self.register_saves(regalloc)
+        at_start: dict['BasicBlock', list[int]] = {}
+        at_end: dict['BasicBlock', list[int]] = {}
+        for reg, (save, restore) in saves.items():
+            if save is not self.entry_bb:
+                at_start.setdefault(save, []).append(reg)
+            if restore is not self.exit_bb:
+                at_end.setdefault(restore, []).append(reg)
+        regs = list(saves)
 
-        save_registers(*self.get_regs_save(),
-                       section='regsave_in',
-                       code=code,
-                       layout=layout,
-                       regalloc=regalloc)
+        def save_restore(emit, bb: 'BasicBlock', where: dict['BasicBlock', list[int]]):
+            if bb in where:
+                emit(*where[bb], section='regsave_in', code=code, layout=layout, regalloc=regalloc,
+                     slots=[regs.index(r) for r in where[bb]])
+
+        self.emit_prologue(code, layout=layout, regalloc=regalloc, saves=saves)
 
         later_code_instr: list['Code'] = []
-        for bb, instr in BasicBlock.iter_bbs(self.entry_bb, instr=True):
-            instr: 'LoweredStat'
+        bbs = self.orders().layout
+        for pos, bb in enumerate(bbs):
             bb: 'BasicBlock'
-            try:
-                if not isinstance(instr, EmptyStat):
-                    code.comment(repr(instr))
-                later_code_instr.append(instr.emit_code(code,
-                                                    layout=layout,
-                                                    symtab=self.symtab,
-                                                    regalloc=regalloc,
-                                                    bblock=bb,
-                                                    container=self))
-            except:
-                # TODO: temporary to avoid exceptions
-                pass
-
-        code.instruction(f'mov sp, fp')
-        restore_regs(*self.get_regs_save(),
+            statements = bb.statements
+            # Saves after the label, restores before the jump ending the block
+            head = 1 if statements and isinstance(statements[0], EmptyStat) else 0
+            tail = len(statements)
+            if statements and type(statements[-1]) is BranchStat and not statements[-1].rets:
+                tail = max(tail - 1, head)
+            for idx in range(len(statements) + 1):
+                if idx == head:
+                    save_restore(save_registers, bb, at_start)
+                if idx == tail:
+                    save_restore(restore_regs, bb, at_end)
+                if idx == len(statements):
+                    break
+                instr: 'LoweredStat' = statements[idx]
+                try:
+                    if not isinstance(instr, EmptyStat):
+                        code.comment(repr(instr))
+                    later_code_instr.append(instr.emit_code(code,
+                                                            layout=layout,
+                                                            symtab=self.symtab,
+                                                            regalloc=regalloc,
+                                                            bblock=bb,
+                                                            container=self))
+                except:
+                    # TODO: temporary to avoid exceptions
+                    pass
+            follower = fall_through(bb)
+            if follower is not None and (pos + 1 == len(bbs) or bbs[pos + 1] is not follower):
+                code.instruction(f'b {follower.label_in.name}')
+
+        self.emit_epilogue(code, layout=layout, regalloc=regalloc, saves=saves)
+
+        # TODO: do something with the two lists if needed
+        code.new_line()
+
+    def register_saves(self, allocinfo: 'AllocInfo',
+                       wrap=True) -> dict[int, tuple['BasicBlock', 'BasicBlock']]:
+        """
+        Where the registers of `get_regs_save` are saved and restored, see
+        ShrinkWrapping, in the order of `get_regs_save` which is the order of
+        their slots. The frame pointer is always set up by the prologue
+        :param wrap: If False all the registers are saved by the prologue and
+                     restored by the epilogue
+        :return: The block to save at the start of and the block to restore at
+                 the end of, by register
+        """
+        regs = self.get_regs_save(allocinfo)
+        if not wrap:
+            return {reg: (self.entry_bb, self.exit_bb) for reg in regs}
+
+        uses: dict[int, set['BasicBlock']] = {reg: set() for reg in regs}
+        allocated: dict[int, set['Symbol']] = {reg: set() for reg in regs}
+        spill_regs = (allocinfo.nregs - 2, allocinfo.nregs - 1)
+        for bb, instr in self.statements():
+            if isinstance(instr, BranchStat) and instr.rets and R.LR in uses:
+                uses[R.LR].add(bb)
+            for symb in instr.get_used() | instr.get_defined():
+                if symb.alloct != 'reg':
+                    continue
+                spilled = allocinfo.is_spilled_var(symb)
+                for reg in spill_regs if spilled else (allocinfo.var_to_reg.get(symb),):
+                    if reg in uses:
+                        uses[reg].add(bb)
+                        allocated[reg].add(symb)
+
+        wrapping = ShrinkWrapping(self)
+        return {reg: (self.entry_bb, self.exit_bb) if reg == R.FP else wrapping.place(uses[reg], allocated[reg])
+                for reg in regs}
+
+    def emit_prologue(self, code: 'Code', *,
+                      layout: 'StackLayout' = None,
+                      regalloc: 'AllocInfo' = None,
+                      saves: dict[int, tuple['BasicBlock', 'BasicBlock']] = None):
+        """
+        Allocate the frame and save the registers which are saved on entry,
+        nothing for the functions without a frame. The registers are saved
+        relative to the stack pointer, then the frame pointer is set to the top
+        of the frame
+        :param saves: The result of `register_saves`, computed if None
+        """
+        if saves is None:
+            saves = self.register_saves(regalloc)
+        regs = list(saves)
+        entry = [reg for reg, (save, _) in saves.items() if save is self.entry_bb]
+        frame = layout.frame_size() * 4
+        if frame:
+            code.instruction(f'sub {R.SP}, {R.SP}, #{frame}')
+        save_registers(*entry,
+                       section='regsave_in',
+                       code=code,
+                       layout=layout,
+                       regalloc=regalloc,
+                       slots=[regs.index(r) for r in entry])
+        if R.FP in regs:
+            code.instruction(f'add {R.FP}, {R.SP}, #{frame}')
+
+    def emit_epilogue(self, code: 'Code', *,
+                      layout: 'StackLayout' = None,
+                      regalloc: 'AllocInfo' = None,
+                      saves: dict[int, tuple['BasicBlock', 'BasicBlock']] = None):
+        """
+        Restore the registers which are restored on exit, free the frame and return
+        :param saves: The result of `register_saves`, computed if None
+        """
+        if saves is None:
+            saves = self.register_saves(regalloc)
+        regs = list(saves)
+        exit_ = [reg for reg, (_, restore) in saves.items() if restore is self.exit_bb]
+        frame = layout.frame_size() * 4
+        restore_regs(*exit_,
                      section='regsave_in',
                      code=code,
                      layout=layout,
-                     regalloc=regalloc)
+                     regalloc=regalloc,
+                     slots=[regs.index(r) for r in exit_])
+        if frame:
+            code.instruction(f'add {R.SP}, {R.SP}, #{frame}')
         code.instruction(f'bx lr')  # Return to function
 
-        # TODO: do something with the two lists if needed
-        code.new_line()
-        return None
-
 
 class LoweredDef(Lowered, DataLayout):
+    __slots__ = ('body', 'function')
+
     def set_label(self, label):
         raise IRException("Trying to set label of definition")
 
@@ -233,6 +428,8 @@ class LoweredDef(Lowered, DataLayout):
 
 
 class LowDefList(Lowered):
+    __slots__ = ('lst',)
+
     def set_label(self, label):
         raise IRException("Trying to set label to definition list")
 
@@ -244,9 +441,9 @@ class LowDefList(Lowered):
 
 
 if __name__ == '__main__':
-    Symbol = src.Symbols.Symbols.Symbol
     SymbolTable = src.Symbols.Symbols.SymbolTable
     LoweredStat = src.Codegen.Lowered.LoweredStat
     StatList = src.Codegen.Lowered.StatList
     AllocInfo = src.Allocator.Regalloc.AllocInfo
     Code = src.Codegen.Code.Code
+    Type = src.Symbols.Symbols.Type
@@ -40,6 +40,8 @@ class GlobalSymbolLayout(SymbolLayout):
 
 
 class DataLayout:
+    __slots__ = ()
+
     @staticmethod
     def perform_program_layout(root: 'LoweredBlock'):
         root.perform_data_layout()
@@ -0,0 +1,273 @@
+"""
+Iterative dataflow analyses on the basic blocks of a function
+
+The facts of an analysis (symbols, definitions, expressions) get dense integer
+ids and a set of facts is an int with a bit per id, so the meet and the transfer
+functions are a few operations on ints. Every block has a gen and a kill set
+and its transfer function is out = gen | (in & ~kill).
+
+The solver keeps a worklist of blocks ordered by reverse postorder for the
+forward analyses and by postorder for the backward ones, so a block is
+evaluated after the blocks it depends on except across back edges. Only the
+blocks depending on a block whose value changed are evaluated again, in sweeps
+along the order: a block further in the order is evaluated in the current
+sweep, one before it, reached by a back edge, waits for the next sweep. A loop
+whose body comes after the rest of the function in the order would otherwise
+send the rest through the worklist again at each change of its body.
+
+The analyses:
++ Liveness, backward: the symbols whose value may be used later
++ ReachingDefinitions, forward: the statements defining a symbol whose value
+  may still be the current one
++ AvailableExpressions, forward, the facts holding on every path: the
+  operations on registers computed before whose operands weren't defined since
+"""
+import heapq
+from typing import Hashable, Iterable, Optional as Opt
+
+import src.Codegen.Lowered as lwr
+from src.ControlFlow.Dominators import predecessors, reverse_postorder
+from src.utils.Arithmetic import COMMUTATIVE
+
+
+def _used(instr: 'LoweredStat') -> tuple['Symbol', ...]:
+    return getattr(instr, 'use_set', ())
+
+
+def _defined(instr: 'LoweredStat') -> tuple['Symbol', ...]:
+    return getattr(instr, 'def_set', ())
+
+
+class BitIndex:
+    """Dense ids of the facts of an analysis, a set of facts is an int with their bits set"""
+
+    def __init__(self):
+        self.ids: dict[Hashable, int] = {}
+        self.facts: list[Hashable] = []
+
+    def bit(self, fact: Hashable) -> int:
+        """The bit of fact, which gets the next id if it has none"""
+        idx = self.ids.get(fact)
+        if idx is None:
+            idx = self.ids[fact] = len(self.facts)
+            self.facts.append(fact)
+        return 1 << idx
+
+    def bits(self, facts: Iterable[Hashable]) -> int:
+        bits = 0
+        for fact in facts:
+            bits |= self.bit(fact)
+        return bits
+
+    def facts_of(self, bits: int) -> set[Hashable]:
+        facts = set()
+        while bits:
+            low = bits & -bits
+            facts.add(self.facts[low.bit_length() - 1])
+            bits ^= low
+        return facts
+
+    def __contains__(self, fact: Hashable) -> bool:
+        return fact in self.ids
+
+    def __len__(self) -> int:
+        return len(self.facts)
+
+
+class DataflowAnalysis:
+    """
+    Base class of the analyses, they define `local` and possibly `boundary`
+
+    + forward: whether the facts flow along the edges or against them
+    + must: whether the meet is the intersection, the facts holding on every
+      path, instead of the union
+    + order: the blocks reachable from the entry, in reverse postorder
+    + index: the ids of the facts
+    + gen, kill: the local sets of each block
+    + ins, outs: the facts at the start and at the end of each block, once solved
+    + evaluations: the transfer functions evaluated by the solver
+    """
+    forward = True
+    must = False
+
+    def __init__(self, entry: 'BasicBlock', order: Opt[list['BasicBlock']] = None):
+        """:param order: The blocks reachable from entry in reverse postorder, computed if None"""
+        self.entry = entry
+        self.order = order if order is not None else reverse_postorder(entry)
+        self.preds = predecessors(self.order)
+        self.index = BitIndex()
+        self.gen: dict['BasicBlock', int] = {}
+        self.kill: dict['BasicBlock', int] = {}
+        self.ins: dict['BasicBlock', int] = {}
+        self.outs: dict['BasicBlock', int] = {}
+        self.evaluations = 0
+
+    def local(self, bb: 'BasicBlock') -> tuple[int, int]:
+        """:return: The gen and kill sets of bb"""
+        raise NotImplementedError()
+
+    def boundary(self) -> int:
+        """The facts at the start of the entry, or at the end of the blocks
+        without successors for the backward analyses"""
+        return 0
+
+    def solve(self) -> 'DataflowAnalysis':
+        for bb in self.order:
+            self.gen[bb], self.kill[bb] = self.local(bb)
+        boundary = self.boundary()
+        initial = (1 << len(self.index)) - 1 if self.must else 0
+
+        if self.forward:
+            order = self.order
+            sources = self.preds.__getitem__
+            targets = lambda bb: bb.successors()
+        else:
+            order = self.order[::-1]
+            sources = lambda bb: bb.successors()
+            targets = self.preds.__getitem__
+        position = {bb: i for i, bb in enumerate(order)}
+        before: dict['BasicBlock', int] = {}
+        after = {bb: initial for bb in order}
+        gen, kill = self.gen, self.kill
+
+        work = list(range(len(order)))  # sorted, so already a heap
+        later: list[int] = []  # for the next sweep
+        queued = bytearray(b'\x01' * len(order))
+        while work:
+            i = heapq.heappop(work)
+            queued[i] = 0
+            bb = order[i]
+            value = None
+            for s in sources(bb):
+                if s in position:
+                    if value is None:
+                        value = after[s]
+                    elif self.must:
+                        value &= after[s]
+                    else:
+                        value |= after[s]
+            if value is None:
+                value = boundary
+            before[bb] = value
+            self.evaluations += 1
+            new = gen[bb] | (value & ~kill[bb])
+            if new != after[bb]:
+                after[bb] = new
+                for t in targets(bb):
+                    j = position.get(t)
+                    if j is not None and not queued[j]:
+                        queued[j] = 1
+                        heapq.heappush(work if j > i else later, j)
+            if not work:
+                work, later = later, work
+
+        if self.forward:
+            self.ins, self.outs = before, after
+        else:
+            self.ins, self.outs = after, before
+        return self
+
+
+class Liveness(DataflowAnalysis):
+    """The symbols live at the start and at the end of the blocks"""
+    forward = False
+
+    def __init__(self, entry: 'BasicBlock', exit_live: Iterable['Symbol'] = (),
+                 order: Opt[list['BasicBlock']] = None):
+        """:param exit_live: The symbols live at the end of the function"""
+        super().__init__(entry, order)
+        self.exit_live = exit_live
+
+    def local(self, bb: 'BasicBlock') -> tuple[int, int]:
+        bit = self.index.bit
+        gen = kill = 0
+        for instr in bb.statements:
+            for u in _used(instr):
+                gen |= bit(u) & ~kill
+            for d in _defined(instr):
+                kill |= bit(d)
+        return gen, kill
+
+    def boundary(self) -> int:
+        return self.index.bits(self.exit_live)
+
+    def live_in(self, bb: 'BasicBlock') -> set['Symbol']:
+        return self.index.facts_of(self.ins[bb])
+
+    def live_out(self, bb: 'BasicBlock') -> set['Symbol']:
+        return self.index.facts_of(self.outs[bb])
+
+    def is_live_in(self, bb: 'BasicBlock', symb: 'Symbol') -> bool:
+        return symb in self.index and bool(self.ins[bb] >> self.index.ids[symb] & 1)
+
+
+class ReachingDefinitions(DataflowAnalysis):
+    """The definitions reaching the start and the end of the blocks, the facts
+    are (statement, symbol) pairs"""
+
+    def __init__(self, entry: 'BasicBlock', order: Opt[list['BasicBlock']] = None):
+        super().__init__(entry, order)
+        # The definitions of each symbol
+        self.definitions: dict['Symbol', int] = {}
+        for bb in self.order:
+            for instr in bb.statements:
+                for d in _defined(instr):
+                    self.definitions[d] = self.definitions.get(d, 0) | self.index.bit((instr, d))
+
+    def local(self, bb: 'BasicBlock') -> tuple[int, int]:
+        bit = self.index.bit
+        gen = kill = 0
+        for instr in bb.statements:
+            for d in _defined(instr):
+                others = self.definitions[d]
+                gen = (gen & ~others) | bit((instr, d))
+                kill |= others
+        return gen, kill
+
+    def reaching(self, bb: 'BasicBlock') -> set[tuple['LoweredStat', 'Symbol']]:
+        return self.index.facts_of(self.ins[bb])
+
+
+def expression(instr: 'LoweredStat') -> Hashable:
+    """The operation computed by a BinStat or a UnaryStat, the operands of the
+    commutative operators in any order, None for the other statements"""
+    typ = type(instr)
+    if typ is lwr.BinStat:
+        if instr.op in COMMUTATIVE:
+            return instr.op, frozenset((instr.srca, instr.srcb))
+        return instr.op, instr.srca, instr.srcb
+    if typ is lwr.UnaryStat:
+        return instr.op, instr.src
+    return None
+
+
+class AvailableExpressions(DataflowAnalysis):
+    """The expressions (see `expression`) computed on every path to the start
+    and to the end of the blocks and whose operands weren't defined since"""
+    must = True
+
+    def __init__(self, entry: 'BasicBlock', order: Opt[list['BasicBlock']] = None):
+        super().__init__(entry, order)
+        # The expressions using each register
+        self.using: dict['Symbol', int] = {}
+        for bb in self.order:
+            for instr in bb.statements:
+                expr = expression(instr)
+                if expr is not None:
+                    for u in _used(instr):
+                        self.using[u] = self.using.get(u, 0) | self.index.bit(expr)
+
+    def local(self, bb: 'BasicBlock') -> tuple[int, int]:
+        gen = kill = 0
+        for instr in bb.statements:
+            expr = expression(instr)
+            if expr is not None:
+                gen |= self.index.bit(expr)
+            for d in _defined(instr):
+                killed = self.using.get(d, 0)
+                gen &= ~killed
+                kill |= killed
+        return gen, kill
+
+    def available(self, bb: 'BasicBlock') -> set[Hashable]:
+        return self.index.facts_of(self.ins[bb])
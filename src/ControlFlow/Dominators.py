@@ -0,0 +1,155 @@
+"""
+Dominator tree of the basic blocks of a function
+
+Computed with the iterative algorithm of Cooper, Harvey and Kennedy: the
+immediate dominators are refined in reverse postorder until they don't change,
+intersecting the dominators of the predecessors by walking up the tree. The
+dominance frontiers come from the same paper: the frontier of a block holds the
+joins it reaches without dominating them
+
+The graph can be walked backwards, from the exit through the predecessors,
+which gives the post dominators
+"""
+from typing import Callable, Optional as Opt
+
+from src.ControlFlow.BBs import BasicBlock
+
+Successors = Callable[['BasicBlock'], list['BasicBlock']]
+
+
+def _successors(bb: 'BasicBlock') -> list['BasicBlock']:
+    return bb.successors()
+
+
+def reverse_postorder(entry: 'BasicBlock', successors: Opt[Successors] = None) -> list['BasicBlock']:
+    """
+    The blocks reachable from entry in reverse postorder, successors are
+    visited in the order of `successors` so the order only depends on the graph
+    :param successors: The successors of a block, the ones of `BasicBlock.successors` if None
+    """
+    if successors is None:
+        successors = _successors
+    order = []
+    visited = {entry}
+    stack = [(entry, iter(successors(entry)))]
+    while stack:
+        bb, succs = stack[-1]
+        for s in succs:
+            if s not in visited:
+                visited.add(s)
+                stack.append((s, iter(successors(s))))
+                break
+        else:
+            stack.pop()
+            order.append(bb)
+    order.reverse()
+    return order
+
+
+def predecessors(bbs: list['BasicBlock'],
+                 successors: Opt[Successors] = None) -> dict['BasicBlock', list['BasicBlock']]:
+    """
+    :return: The predecessors of each of bbs, among bbs. The ones kept by the
+             blocks when successors is None, in the order of bbs
+    """
+    if successors is None:
+        index = {bb: i for i, bb in enumerate(bbs)}
+        return {bb: sorted((p for p in bb.preds if p in index), key=index.__getitem__) for bb in bbs}
+    preds = {bb: [] for bb in bbs}
+    for bb in bbs:
+        for s in successors(bb):
+            if s in preds and bb not in preds[s]:
+                preds[s].append(bb)
+    return preds
+
+
+class Dominators:
+    """
+    + order: the blocks reachable from the entry, in reverse postorder
+    + preds: the predecessors of each block
+    + idom: the immediate dominator of each block, the entry is its own
+    """
+
+    def __init__(self, entry: 'BasicBlock', successors: Opt[Successors] = None,
+                 order: Opt[list['BasicBlock']] = None):
+        """
+        :param successors: The successors of a block, the ones of
+                           `BasicBlock.successors` if None. Pass the predecessors,
+                           with the exit as entry, for the post dominators
+        :param order: The blocks reachable from entry in reverse postorder along
+                      successors, computed if None
+        """
+        self.entry = entry
+        self.order = order if order is not None else reverse_postorder(entry, successors)
+        self.preds = predecessors(self.order, successors)
+        self.rpo_index = {bb: i for i, bb in enumerate(self.order)}
+        self.idom: dict['BasicBlock', 'BasicBlock'] = {entry: entry}
+
+        changed = True
+        while changed:
+            changed = False
+            for bb in self.order[1:]:
+                new_idom = None
+                for p in self.preds[bb]:
+                    if p in self.idom:
+                        new_idom = p if new_idom is None else self._intersect(p, new_idom)
+                if self.idom.get(bb) is not new_idom:
+                    self.idom[bb] = new_idom
+                    changed = True
+
+        # Preorder and postorder numbers of the tree answer `dominates` in constant time
+        self.children: dict['BasicBlock', list['BasicBlock']] = {bb: [] for bb in self.order}
+        for bb in self.order[1:]:
+            self.children[self.idom[bb]].append(bb)
+        self._pre: dict['BasicBlock', int] = {}
+        self._post: dict['BasicBlock', int] = {}
+        counter = 0
+        stack = [(entry, False)]
+        while stack:
+            bb, done = stack.pop()
+            counter += 1
+            if done:
+                self._post[bb] = counter
+                continue
+            self._pre[bb] = counter
+            stack.append((bb, True))
+            stack.extend((c, False) for c in reversed(self.children[bb]))
+
+    def _intersect(self, a: 'BasicBlock', b: 'BasicBlock') -> 'BasicBlock':
+        index = self.rpo_index
+        while a is not b:
+            while index[a] > index[b]:
+                a = self.idom[a]
+            while index[b] > index[a]:
+                b = self.idom[b]
+        return a
+
+    def nearest_common(self, bbs: list['BasicBlock']) -> 'BasicBlock':
+        """The closest block dominating all of bbs"""
+        common = bbs[0]
+        for bb in bbs[1:]:
+            common = self._intersect(common, bb)
+        return common
+
+    def frontiers(self) -> dict['BasicBlock', set['BasicBlock']]:
+        """The dominance frontier of each block: the blocks with a predecessor it
+        dominates which it doesn't strictly dominate"""
+        frontier: dict['BasicBlock', set['BasicBlock']] = {bb: set() for bb in self.order}
+        for bb in self.order:
+            preds = [p for p in self.preds[bb] if p in self.idom]
+            if len(preds) < 2:
+                continue
+            for p in preds:
+                runner = p
+                while runner is not self.idom[bb]:
+                    frontier[runner].add(bb)
+                    runner = self.idom[runner]
+        return frontier
+
+    def dominates(self, a: 'BasicBlock', b: 'BasicBlock') -> bool:
+        """Whether every path from the entry to b goes through a, a block dominates itself"""
+        return self._pre[a] <= self._pre[b] and self._post[b] <= self._post[a]
+
+    def reachable(self, bb: 'BasicBlock') -> bool:
+        return bb in self.rpo_index
+
@@ -0,0 +1,133 @@
+"""
+Interpreter of the lowered program, runs the basic blocks of the CFG
+
+Used to check that the optimizations preserve the output of a program and to
+count the statements it executes. Registers hold integers, or (symbol, byte
+offset) pairs for the pointers built by LoadPtrToSymb, which are compared by
+offset when they point to the same variable, and values are wrapped to the size
+of the register or memory receiving them. Variables live in a memory
+indexed by symbol and byte offset; the variables of a procedure are saved when
+it is called and restored when it returns, so recursive calls get their own.
+"""
+from collections import Counter
+
+import src.Codegen.Lowered as lwr
+from src.Symbols.Symbols import PrintFun, ReadFun
+from src.utils.Arithmetic import BINARY_OPS, UNARY_OPS, divide, wrap_to
+from src.utils.Exceptions import InterpreterException
+
+DEFAULT_STEPS = 10 ** 7
+
+
+class Interpreter:
+    """
+    + output: the values printed
+    + executed: the number of statements executed, labels excluded
+    + executed_by_kind: the same by class of statement
+    + calls: the times each function ran, by symbol, None for the program
+    + blocks: the times each basic block ran
+    """
+
+    def __init__(self, cfg: 'CFG', inputs: list[int] = None, max_steps=DEFAULT_STEPS):
+        """
+        :param inputs: The values returned by the read statements, 0 once they run out
+        :param max_steps: Raise InterpreterException after executing this many statements
+        """
+        self.cfg = cfg
+        self.inputs = list(inputs or [])
+        self.max_steps = max_steps
+        self.memory: dict[tuple['Symbol', int], int] = {}
+        self.output: list[int] = []
+        self.executed = 0
+        self.executed_by_kind: Counter[str] = Counter()
+        self.calls: Counter['Symbol'] = Counter()
+        self.blocks: Counter['BasicBlock'] = Counter()
+
+    def run(self) -> list[int]:
+        self.call(self.cfg.global_block)
+        return self.output
+
+    def call(self, block: 'LoweredBlock'):
+        self.calls[block.function] += 1
+        local = set(block.symtab.lst) if block.function is not None else set()
+        saved = {k: v for k, v in self.memory.items() if k[0] in local}
+        regs: dict['Symbol', object] = {}
+
+        entries = block.entry_bb.successors()
+        bb = entries[0] if entries else None
+        while bb is not None and bb is not block.exit_bb:
+            following = bb.next
+            self.blocks[bb] += 1
+            for instr in bb.statements:
+                if type(instr) is lwr.EmptyStat:
+                    continue
+                self.executed += 1
+                self.executed_by_kind[type(instr).__name__] += 1
+                if self.executed > self.max_steps:
+                    raise InterpreterException(f"More than {self.max_steps} statements executed")
+                if self.execute(instr, regs):
+                    following = bb.target
+            bb = following
+
+        for k in [k for k in self.memory if k[0] in local]:
+            del self.memory[k]
+        self.memory.update(saved)
+
+    def execute(self, instr: 'LoweredStat', regs: dict) -> bool:
+        """:return: If the statement is a branch which is taken"""
+        typ = type(instr)
+        if typ is lwr.LoadImmStat:
+            regs[instr.dest] = wrap_to(instr.val, instr.dest.stype)
+        elif typ is lwr.LoadPtrToSymb:
+            regs[instr.dest] = (instr.symbol, 0)
+        elif typ is lwr.BinStat:
+            a, b = regs[instr.srca], regs[instr.srcb]
+            if type(a) is tuple and type(b) is tuple:
+                if a[0] is not b[0]:
+                    raise InterpreterException("Comparison of pointers to different variables")
+                regs[instr.dest] = BINARY_OPS[instr.op](a[1], b[1])
+            elif type(a) is tuple:
+                regs[instr.dest] = (a[0], a[1] + b)
+            elif instr.op == 'slash':
+                if b == 0:
+                    raise InterpreterException("Division by zero")
+                regs[instr.dest] = wrap_to(divide(a, b), instr.dest.stype)
+            else:
+                regs[instr.dest] = wrap_to(BINARY_OPS[instr.op](a, b), instr.dest.stype)
+        elif typ is lwr.UnaryStat:
+            regs[instr.dest] = wrap_to(UNARY_OPS[instr.op](regs[instr.src]), instr.dest.stype)
+        elif typ is lwr.LoadStat:
+            address = regs[instr.symbol] if instr.symbol.alloct == 'reg' else (instr.symbol, 0)
+            regs[instr.dest] = wrap_to(self.memory.get(address, 0), instr.dest.stype)
+        elif typ is lwr.StoreStat:
+            if instr.dest.alloct == 'reg':
+                address, stype = regs[instr.dest], instr.dest.stype.pointed_type
+            else:
+                address, stype = (instr.dest, 0), instr.dest.stype
+            self.memory[address] = wrap_to(regs[instr.symbol], stype)
+        elif typ is lwr.PrintStat:
+            self.output.append(regs[instr.src])
+        elif typ is lwr.ReadStat:
+            regs[instr.dest] = self.inputs.pop(0) if self.inputs else 0
+        elif typ is lwr.BranchStat:
+            if instr.rets:
+                if instr.target in (PrintFun, ReadFun):
+                    raise InterpreterException(f"Call to the builtin {instr.target.name}")
+                self.call(self.cfg.functions[instr.target])
+                return False
+            if instr.condition is None:
+                return True
+            return bool(regs[instr.condition]) != instr.negcond
+        else:
+            raise InterpreterException(f"Can't execute {instr}")
+        return False
+
+
+def run(cfg: 'CFG', inputs: list[int] = None, max_steps=DEFAULT_STEPS) -> Interpreter:
+    """
+    Run the program of cfg
+    :return: The interpreter, with the output and the statistics
+    """
+    interp = Interpreter(cfg, inputs, max_steps)
+    interp.run()
+    return interp
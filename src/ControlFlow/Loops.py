@@ -0,0 +1,139 @@
+"""
+Natural loops of a function and their preheaders
+
+An edge whose target dominates its source is a back edge, the natural loop of
+a back edge is its target, the header, with all the blocks which reach the
+source without going through the header. Loops with the same header are
+merged into one
+"""
+from src.ControlFlow.BBs import BasicBlock, redirect
+from src.ControlFlow.Dominators import Dominators, predecessors, reverse_postorder
+
+
+class Loop:
+    """
+    + header: the only block of the loop entered from outside of it
+    + body: all the blocks of the loop, header included
+    + latches: the sources of the back edges
+    + parent: the innermost loop containing this one, if any
+    + preheader: the block before the header, once inserted
+    """
+
+    def __init__(self, header: 'BasicBlock'):
+        self.header = header
+        self.body: set['BasicBlock'] = {header}
+        self.latches: list['BasicBlock'] = []
+        self.parent: 'Loop' = None
+        self.preheader: 'BasicBlock' = None
+
+    def depth(self) -> int:
+        d = 1
+        loop = self.parent
+        while loop is not None:
+            d += 1
+            loop = loop.parent
+        return d
+
+    def exiting(self) -> list['BasicBlock']:
+        """The blocks of the loop with a successor outside of it"""
+        return [bb for bb in self.body if any(s not in self.body for s in bb.successors())]
+
+    def __repr__(self):
+        return f"Loop at {self.header.label_in} of {len(self.body)} blocks"
+
+
+def find_loops(dom: Dominators) -> list[Loop]:
+    """
+    :return: The natural loops of the function, inner loops come before the
+             loops containing them
+    """
+    loops: dict['BasicBlock', Loop] = {}
+    for bb in dom.order:
+        for s in bb.successors():
+            if s in dom.rpo_index and dom.dominates(s, bb):
+                loop = loops.setdefault(s, Loop(s))
+                loop.latches.append(bb)
+                work = [bb]
+                while work:
+                    cur = work.pop()
+                    if cur in loop.body:
+                        continue
+                    loop.body.add(cur)
+                    work.extend(dom.preds[cur])
+
+    # Smaller loops first, the first loop found containing a loop is its parent
+    ordered = sorted(loops.values(), key=lambda l: (len(l.body), dom.rpo_index[l.header]))
+    for i, loop in enumerate(ordered):
+        for outer in ordered[i + 1:]:
+            if loop.header in outer.body:
+                loop.parent = outer
+                break
+    return ordered
+
+
+def insert_preheader(loop: Loop, dom: Dominators) -> 'BasicBlock':
+    """
+    Insert an empty block that all the edges entering the loop from outside go
+    through, the header becomes its only successor. The dominators and the
+    loops are not updated, they have to be computed again.
+    A block which is already the only way into the loop and falls through to
+    the header is used as it is
+    """
+    header = loop.header
+    entering = [p for p in dom.preds[header] if p not in loop.body]
+    if len(entering) == 1 and isinstance(entering[0], BasicBlock) and \
+            entering[0].target is None and entering[0].next is header:
+        loop.preheader = entering[0]
+        return entering[0]
+    pre = BasicBlock(header.function, header.symtab)
+    pre.finalize()
+    pre.bind_to_block(header.container_block)
+    for p in entering:
+        redirect(p, header, pre)
+    pre.add_succs(next=header)
+    loop.preheader = pre
+    return pre
+
+
+def remove_preheader(loop: Loop, preds: list['BasicBlock']):
+    """
+    Undo insert_preheader, for a preheader which is still empty
+    :param preds: The predecessors of the preheader
+    """
+    for p in preds:
+        redirect(p, loop.preheader, loop.header)
+    loop.preheader = None
+
+
+def loops_with_preheaders(entry: 'BasicBlock') -> tuple[Dominators, list[Loop]]:
+    """
+    Give a preheader to all the loops of a function
+    :return: The dominators and the loops found again with the preheaders,
+             which are in the body of the enclosing loops
+    """
+    dom = Dominators(entry)
+    loops = find_loops(dom)
+    if not loops:
+        return dom, loops
+    # Inserting a preheader only changes the edges entering its header
+    preheaders = {loop.header: insert_preheader(loop, dom) for loop in loops}
+    dom = Dominators(entry)
+    loops = find_loops(dom)
+    for loop in loops:
+        loop.preheader = preheaders[loop.header]
+    return dom, loops
+
+
+def remove_empty_preheaders(entry: 'BasicBlock', loops: list[Loop]) -> list['BasicBlock']:
+    """
+    Remove the preheaders of loops holding only their label
+    :return: The preheaders which are kept
+    """
+    preds = predecessors(reverse_postorder(entry))
+    filled = []
+    for loop in loops:
+        if len(loop.preheader.statements) == 1:
+            remove_preheader(loop, preds[loop.preheader])
+        else:
+            filled.append(loop.preheader)
+    return filled
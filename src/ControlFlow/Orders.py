@@ -0,0 +1,82 @@
+"""
+The orders of the basic blocks of a function, computed once and kept by its
+LoweredBlock until an edge between its blocks changes (see `LoweredBlock.orders`)
+
+They only depend on the graph, the successors of a block are visited in the
+order of `BasicBlock.successors`, so every pass, the register allocator and the
+code emission see the blocks in the same order at each run.
+
+The layout is the order the code of the blocks is emitted in: the blocks falling
+through to each other are chained, a block is glued to the first block falling
+through to it, and the chains are placed in reverse postorder of their first
+block. The chain ending with the exit, where the epilogue follows, comes last,
+unless it starts with the entry which has to come first, then the exit is left
+alone. A block whose fall through doesn't follow it in the layout gets a jump to
+it when its code is emitted (see `LoweredBlock.emit_body`)
+"""
+from typing import Optional as Opt
+
+from src.ControlFlow.BBs import FakeBlock
+from src.ControlFlow.Dominators import reverse_postorder
+
+
+def fall_through(bb: 'BasicBlock') -> Opt['BasicBlock']:
+    """The block bb continues to without a jump"""
+    if isinstance(bb, FakeBlock):
+        return bb.folls[0] if bb.folls else None
+    return bb.next
+
+
+class BlockOrders:
+    """
+    + reverse_postorder: the blocks reachable from the entry, in reverse postorder
+    + postorder: the same blocks in postorder
+    + layout: the same blocks in the order their code is emitted in
+    + index: the position of each block in reverse postorder
+    The lists are shared by whoever asks for them, they are not to be modified
+    """
+
+    def __init__(self, block: 'LoweredBlock'):
+        self.reverse_postorder: list['BasicBlock'] = reverse_postorder(block.entry_bb)
+        self.postorder: list['BasicBlock'] = self.reverse_postorder[::-1]
+        self.index: dict['BasicBlock', int] = {bb: i for i, bb in enumerate(self.reverse_postorder)}
+        self.layout: list['BasicBlock'] = self.lay_out(block.entry_bb, block.exit_bb)
+
+    def lay_out(self, entry: 'BasicBlock', exit_bb: 'BasicBlock') -> list['BasicBlock']:
+        # The block each one falls through to, a block is only glued to the
+        # first block falling through to it
+        follower: dict['BasicBlock', 'BasicBlock'] = {}
+        glued: set['BasicBlock'] = set()
+        for bb in self.reverse_postorder:
+            f = fall_through(bb)
+            if f in self.index and f not in glued and f is not entry:
+                follower[bb] = f
+                glued.add(f)
+
+        # The chain ending with the exit, the epilogue follows it
+        last = []
+        if exit_bb in self.index:
+            leader = {f: bb for bb, f in follower.items()}
+            bb = exit_bb
+            while bb is not None:
+                last.append(bb)
+                bb = leader.get(bb)
+            last.reverse()
+            if last[0] is entry and len(last) < len(self.index):
+                last = [exit_bb]
+
+        layout = []
+        placed: set['BasicBlock'] = set(last)
+        # A second pass for the chains closing on themselves, none is their head
+        for heads in (lambda bb: bb not in glued, lambda bb: True):
+            for head in self.reverse_postorder:
+                if head in placed or not heads(head):
+                    continue
+                bb = head
+                while bb is not None and bb not in placed:
+                    placed.add(bb)
+                    layout.append(bb)
+                    bb = follower.get(bb)
+        layout.extend(last)
+        return layout
+
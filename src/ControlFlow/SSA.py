@@ -0,0 +1,176 @@
+"""
+Static single assignment form of the registers of a function
+
+Temporaries are defined once, only the registers defined by several statements
+(the induction variables left by strength reduction) get a version for each
+definition. A PhiStat is placed at the start of the blocks of the iterated
+dominance frontier of their definitions where the register is live, then the
+uses are renamed to the version reaching them by walking the dominator tree.
+A use no definition reaches keeps the name of the register.
+
+The definitions of a register and the blocks using it are known in SSA form,
+the optimizations on it (see Optimizer.Propagation) follow these chains
+instead of iterating over the whole function.
+
+Out of SSA form every version is renamed back to its register and the PhiStats
+are removed. This is correct as long as the versions of a register are never
+live at the same time, which the passes preserve by leaving the versions alone:
+they only replace the definition of a version with a constant.
+"""
+from collections import Counter
+from typing import Optional as Opt
+
+import src.Codegen.Lowered as lwr
+from src.ControlFlow.Dataflow import Liveness
+from src.ControlFlow.Dominators import Dominators
+from src.IR.IRUtils import new_temporary
+
+
+def _is_register(symb: 'Symbol') -> bool:
+    return symb.alloct == 'reg'
+
+
+def _phi_index(bb: 'BasicBlock') -> int:
+    """Where the PhiStats of bb start, after its label, which is moved to its own
+    statement when it's carried by a statement doing something"""
+    if not bb.statements or bb.statements[0].label is None:
+        return 0
+    first = bb.statements[0]
+    if type(first) is not lwr.EmptyStat:
+        label = lwr.EmptyStat()
+        label.set_label(first.get_label())
+        first.set_label(None)
+        bb.statements.insert(0, label)
+    return 1
+
+
+def phis(bb: 'BasicBlock') -> list['PhiStat']:
+    """The PhiStats at the start of bb"""
+    found = []
+    for instr in bb.statements:
+        if type(instr) is lwr.PhiStat:
+            found.append(instr)
+        elif type(instr) is not lwr.EmptyStat:
+            break
+    return found
+
+
+class SSAForm:
+    """
+    + dom: the dominators of the function
+    + renamed: the registers defined more than once, which got versions
+    + original: the register each version stands for
+    + definitions: the statement defining each register, with its block
+    + uses: the blocks and statements using each register
+    + phis: the number of PhiStats placed
+    """
+
+    def __init__(self, block: 'LoweredBlock'):
+        """Put the registers of block in SSA form"""
+        self.block = block
+        self.dom = Dominators(block.entry_bb, order=block.orders().reverse_postorder)
+        self.renamed: set['Symbol'] = set()
+        self.original: dict['Symbol', 'Symbol'] = {}
+        self.definitions: dict['Symbol', tuple['BasicBlock', 'LoweredStat']] = {}
+        self.uses: dict['Symbol', list[tuple['BasicBlock', 'LoweredStat']]] = {}
+        self.phis = 0
+
+        defined: Counter['Symbol'] = Counter()
+        def_blocks: dict['Symbol', set['BasicBlock']] = {}
+        for bb in self.dom.order:
+            for instr in bb.statements:
+                for d in instr.get_defined():
+                    if _is_register(d):
+                        defined[d] += 1
+                        def_blocks.setdefault(d, set()).add(bb)
+        self.renamed = {reg for reg, n in defined.items() if n > 1}
+        if self.renamed:
+            self.place_phis(self.renamed, def_blocks)
+            self.rename(self.renamed)
+        self.build_chains()
+
+    def place_phis(self, registers: set['Symbol'], def_blocks: dict['Symbol', set['BasicBlock']]):
+        """Place the PhiStats of registers where their definitions meet and they are live"""
+        frontier = self.dom.frontiers()
+        live = Liveness(self.dom.entry).solve()
+        for reg in sorted(registers, key=lambda r: r.name):
+            placed: set['BasicBlock'] = set()
+            work = list(def_blocks[reg])
+            while work:
+                for f in frontier[work.pop()]:
+                    if f in placed or not live.is_live_in(f, reg):
+                        continue
+                    placed.add(f)
+                    sources = {p: reg for p in self.dom.preds[f]}
+                    f.statements.insert(_phi_index(f), lwr.PhiStat(dest=reg, sources=sources))
+                    self.phis += 1
+                    if f not in def_blocks[reg]:
+                        work.append(f)
+
+    def rename(self, registers: set['Symbol']):
+        """Give each definition of registers its own version and rename the uses,
+        walking the dominator tree with the version of each register in scope"""
+        stacks: dict['Symbol', list['Symbol']] = {reg: [] for reg in registers}
+        work: list[tuple['BasicBlock', Opt[list['Symbol']]]] = [(self.dom.entry, None)]
+        while work:
+            bb, pushed = work.pop()
+            if pushed is not None:
+                for reg in pushed:
+                    stacks[reg].pop()
+                continue
+            pushed = []
+            for instr in bb.statements:
+                if type(instr) is not lwr.PhiStat:
+                    instr.replace_used({u: stacks[u][-1] for u in instr.get_used() if stacks.get(u)})
+                for d in instr.get_defined():
+                    if d in stacks:
+                        version = new_temporary(None, d.stype)
+                        self.original[version] = d
+                        instr.replace_defined({d: version})
+                        stacks[d].append(version)
+                        pushed.append(d)
+            for s in bb.successors():
+                for phi in phis(s):
+                    reg = self.original.get(phi.dest, phi.dest)
+                    if bb in phi.sources and stacks[reg]:
+                        phi.set_source(bb, stacks[reg][-1])
+            work.append((bb, pushed))
+            work.extend((c, None) for c in reversed(self.dom.children[bb]))
+
+    def build_chains(self):
+        self.definitions.clear()
+        self.uses.clear()
+        for bb in self.dom.order:
+            for instr in bb.statements:
+                for d in instr.get_defined():
+                    if _is_register(d):
+                        self.definitions[d] = bb, instr
+                for u in instr.get_used():
+                    if _is_register(u):
+                        self.uses.setdefault(u, []).append((bb, instr))
+
+    def redefine(self, bb: 'BasicBlock', instr: 'LoweredStat'):
+        """Record instr, which replaces the statement defining its register in bb"""
+        self.definitions[instr.dest] = bb, instr
+        for u in instr.get_used():
+            if _is_register(u):
+                self.uses.setdefault(u, []).append((bb, instr))
+
+    def is_version(self, reg: 'Symbol') -> bool:
+        """Whether reg is a version of a register defined more than once, or that register"""
+        return reg in self.original or reg in self.renamed
+
+    def destruct(self):
+        """Rename the versions back to their registers and remove the PhiStats"""
+        for bb in self.block.orders().reverse_postorder:
+            if self.original:
+                statements = []
+                for instr in bb.statements:
+                    if type(instr) is lwr.PhiStat:
+                        continue
+                    instr.replace_used(self.original)
+                    instr.replace_defined(self.original)
+                    statements.append(instr)
+                bb.statements = statements
+            bb.compute_gen_kill()
+        self.original.clear()
@@ -0,0 +1,495 @@
+"""
+Binary encoding of the lowered program: the tree of LoweredBlocks with their
+basic blocks, symbol tables and symbols, and optionally the AllocInfo of each
+function
+
+Objects referenced from more than one place (strings, types, symbols, symbol
+tables, blocks and basic blocks) are numbered densely in the order they are
+first reached and referenced by their index, everything else is a stream of
+32 bit words: each statement is a packed record of an opcode, its label and
+its operands.
+The numbering follows the lists of the program and the successors of the basic
+blocks, never the iteration order of a set, so the same program is always
+encoded to the same bytes.
+
+Layout, all integers little endian:
+    header      magic, version, temporary and label counters, section sizes
+    strings     utf-8, separated by NUL
+    constants   64 bit integers, for immediates and symbol values
+    words       the records below
+        types       kind + fields, the types in TYPENAMES by name. Equal
+                    anonymous types (the type of each temporary) are shared
+        symbols     class, name, type, alloct, level, flags + value and
+                    SymbolLayout if present
+        symtabs     parent, number of symbols + symbols in declaration order
+        blocks      function, symtab, parent block, entry and exit basic block
+        bbs         links, labels, followers and the statement records
+        allocs      block, nregs, numspill + (symbol, register) pairs
+Indices are -1 for None. Liveness is not stored, it is recomputed by the back end.
+"""
+import struct
+import sys
+from array import array
+from typing import Optional as Opt
+
+import src
+import src.IR.IRUtils as IRUtils
+from src.Allocator.Regalloc import AllocInfo
+from src.Codegen.Lowered import BinStat, BranchStat, EmptyStat, LoadImmStat, LoadPtrToSymb, LoadStat, PrintStat, \
+    ReadStat, StatList, StoreStat, UnaryStat
+from src.ControlFlow.BBs import BasicBlock, FakeBlock
+from src.ControlFlow.CodeContainers import LoweredBlock, LoweredDef, LowDefList
+from src.ControlFlow.DataLayout import GlobalSymbolLayout, LocalSymbolLayout
+from src.Symbols.Symbols import ArrayType, PointerType, PrintFun, ReadFun, RegisterSymb, Symbol, SymbolTable, \
+    Type, TYPENAMES
+from src.utils.Exceptions import SerializationException
+
+MAGIC = b'PL0L'
+FORMAT_VERSION = 2
+
+HEADER = struct.Struct('<4sHIIIII')  # magic, version, temps, labels, string bytes, constants, words
+
+# Type kinds
+NAMED_TYPE, SCALAR_TYPE, ARRAY_TYPE, POINTER_TYPE = range(4)
+# Symbol classes, builtin functions are resolved to the existing objects
+NAMED_SYMB, REGISTER_SYMB, BUILTIN_SYMB = range(3)
+BUILTINS = {PrintFun.name: PrintFun, ReadFun.name: ReadFun}
+# Symbol flags
+HAS_VALUE, GLOBAL_LAYOUT, LOCAL_LAYOUT = 1, 2, 4
+
+# Statement opcodes, each record is: opcode, label, operands
+#   EmptyStat
+#   BranchStat      target, condition, returns, negcond
+#   PrintStat       src
+#   ReadStat        dest
+#   LoadPtrToSymb   dest, symbol, levels
+#   StoreStat       dest, symbol, levels
+#   LoadStat        dest, symbol, levels
+#   LoadImmStat     dest, constant
+#   BinStat         dest, op, srca, srcb
+#   UnaryStat       dest, op, src
+# symbols, strings and constants are indices
+OPCODES = [EmptyStat, BranchStat, PrintStat, ReadStat, LoadPtrToSymb, StoreStat, LoadStat, LoadImmStat,
+           BinStat, UnaryStat]
+OPCODE_OF = {cls: op for op, cls in enumerate(OPCODES)}
+EMPTY, BRANCH, PRINT, READ, LOAD_PTR, STORE, LOAD, LOAD_IMM, BIN, UNARY = range(len(OPCODES))
+
+
+class _Numbering(dict):
+    """Assigns to each new key the next index"""
+
+    def __init__(self):
+        super().__init__()
+        self.objects = []
+
+    def index(self, obj, key=None) -> int:
+        """:param key: The key identifying obj, by default its identity"""
+        if obj is None:
+            return -1
+        if key is None:
+            key = id(obj)
+        idx = self.get(key)
+        if idx is None:
+            idx = self[key] = len(self.objects)
+            self.objects.append(obj)
+        return idx
+
+
+class _Writer:
+    def __init__(self):
+        self.strings = _Numbering()
+        self.constants = _Numbering()
+        self.types = _Numbering()
+        self.symbols = _Numbering()
+        self.symtabs = _Numbering()
+        self.blocks = _Numbering()
+        self.bbs = _Numbering()
+        self.words = array('i')
+        # Once everything is numbered symbols and basic blocks are looked up directly
+        self.symbols[id(None)] = -1
+        self.bbs[id(None)] = -1
+
+    def string(self, s: Opt[str]) -> int:
+        if s is not None and '\0' in s:
+            raise SerializationException(f"Can't encode string {s!r}")
+        return self.strings.index(s, s)
+
+    def constant(self, val: int) -> int:
+        return self.constants.index(val, val)
+
+    def type(self, t: 'Type') -> int:
+        idx = self.types.get(id(t))
+        if idx is not None:
+            return idx
+        if TYPENAMES.get(t.name) is t:
+            key = (NAMED_TYPE, t.name)
+        elif isinstance(t, ArrayType):
+            key = (ARRAY_TYPE, t.name, self.type(t.basetype), tuple(t.dims))
+        elif isinstance(t, PointerType):
+            key = (POINTER_TYPE, self.type(t.pointed_type))
+        else:
+            key = (SCALAR_TYPE, t.name, t.size, t.basetype, tuple(t.qual_list))
+        idx = self.types.index(key, key)
+        self.types[id(t)] = idx
+        return idx
+
+    def symbol(self, s: Opt['Symbol']) -> int:
+        idx = self.symbols.get(id(s))
+        if idx is None:
+            self.type(s.stype)
+            idx = self.symbols.index(s)
+        return idx
+
+    def symtab(self, table: 'SymbolTable') -> int:
+        if id(table) not in self.symtabs:
+            if table.par is not None:
+                self.symtab(table.par)
+            for s in table.lst:
+                self.symbol(s)
+        return self.symtabs.index(table)
+
+    def number_program(self, program: 'LoweredBlock'):
+        """Number the blocks and basic blocks depth first, then everything they reference"""
+        def visit(block: 'LoweredBlock'):
+            self.blocks.index(block)
+            for defun in block.defs.lst:
+                visit(defun.body)
+        visit(program)
+
+        sym = self.symbol
+        for block in self.blocks.objects:
+            self.symtab(block.symtab)
+            sym(block.function)
+            stack = [block.entry_bb]
+            while stack:
+                bb = stack.pop()
+                if id(bb) in self.bbs:
+                    continue
+                self.bbs.index(bb)
+                stack.extend(reversed(bb.successors()))
+            self.bbs.index(block.exit_bb)  # not reachable if the function never returns
+
+        for bb in self.bbs.objects:
+            sym(bb.label_in)
+            sym(bb.next_lab)
+            sym(bb.target_lab)
+            for instr in bb.statements:
+                sym(instr.label)
+                for s in self.operands(instr):
+                    sym(s)
+
+    @staticmethod
+    def operands(instr: 'LoweredStat') -> list[Opt['Symbol']]:
+        """:return: The symbols in the record of the statement, in order"""
+        t = type(instr)
+        if t is BinStat:
+            return [instr.dest, instr.srca, instr.srcb]
+        if t in (LoadStat, StoreStat, LoadPtrToSymb):
+            return [instr.dest, instr.symbol]
+        if t in (LoadImmStat, ReadStat):
+            return [instr.dest]
+        if t is UnaryStat:
+            return [instr.dest, instr.src]
+        if t is BranchStat:
+            return [instr.target, instr.condition]
+        if t is PrintStat:
+            return [instr.src]
+        if t is EmptyStat:
+            return []
+        raise SerializationException(f"Can't encode statement {instr}")
+
+    def encode_stat(self, instr: 'LoweredStat'):
+        t = type(instr)
+        ids = self.symbols
+        lab = ids[id(instr.label)]
+        if t is BinStat:
+            rec = (BIN, lab, ids[id(instr.dest)], self.string(instr.op), ids[id(instr.srca)], ids[id(instr.srcb)])
+        elif t is LoadImmStat:
+            rec = (LOAD_IMM, lab, ids[id(instr.dest)], self.constant(instr.val))
+        elif t is UnaryStat:
+            rec = (UNARY, lab, ids[id(instr.dest)], self.string(instr.op), ids[id(instr.src)])
+        elif t is BranchStat:
+            rec = (BRANCH, lab, ids[id(instr.target)], ids[id(instr.condition)], instr.rets, instr.negcond)
+        elif t in (LoadStat, StoreStat, LoadPtrToSymb):
+            rec = (OPCODE_OF[t], lab, ids[id(instr.dest)], ids[id(instr.symbol)], instr.levels)
+        else:
+            rec = (OPCODE_OF[t], lab, *[ids[id(s)] for s in self.operands(instr)])
+        self.words.extend(rec)
+
+    def encode(self, allocs: dict['LoweredBlock', 'AllocInfo']) -> bytes:
+        w = self.words
+        # Type keys reference the types they depend on, which come before them
+        w.append(len(self.types.objects))
+        for key in self.types.objects:
+            kind = key[0]
+            w.append(kind)
+            if kind == NAMED_TYPE:
+                w.append(self.string(key[1]))
+            elif kind == ARRAY_TYPE:
+                _, name, base, dims = key
+                w.extend([self.string(name), base, len(dims)])
+                w.extend(dims)
+            elif kind == POINTER_TYPE:
+                w.append(key[1])
+            else:
+                _, name, size, basetype, quals = key
+                w.extend([self.string(name), size, self.string(basetype), len(quals)])
+                w.extend(self.string(q) for q in quals)
+
+        w.append(len(self.symbols.objects))
+        for s in self.symbols.objects:
+            if BUILTINS.get(s.name) is s:
+                w.extend([BUILTIN_SYMB, self.string(s.name)])
+                continue
+            flags = 0
+            extra = []
+            if s.value is not None:
+                if type(s.value) is not int:
+                    raise SerializationException(f"Can't encode the value of {s.name}")
+                flags |= HAS_VALUE
+                extra.append(self.constant(s.value))
+            lay = s.allocinfo
+            if isinstance(lay, LocalSymbolLayout):
+                flags |= LOCAL_LAYOUT
+                extra += [self.string(lay.symname), lay.bsize, lay.reloff, lay.level]
+            elif lay is not None:
+                flags |= GLOBAL_LAYOUT
+                extra += [self.string(lay.symname), lay.bsize]
+            w.extend([REGISTER_SYMB if isinstance(s, RegisterSymb) else NAMED_SYMB, self.string(s.name),
+                      self.types[id(s.stype)], self.string(s.alloct), -1 if s.level is None else s.level,
+                      flags])
+            w.extend(extra)
+
+        w.append(len(self.symtabs.objects))
+        for table in self.symtabs.objects:
+            w.extend([self.symtabs.index(table.par), len(table.lst)])
+            w.extend(self.symbols[id(s)] for s in table.lst)
+
+        parents = {}
+        for block in self.blocks.objects:
+            for defun in block.defs.lst:
+                parents[id(defun.body)] = self.blocks[id(block)]
+        w.append(len(self.blocks.objects))
+        for block in self.blocks.objects:
+            w.extend([self.symbol(block.function), self.symtabs[id(block.symtab)],
+                      parents.get(id(block), -1), self.bbs[id(block.entry_bb)], self.bbs[id(block.exit_bb)]])
+
+        sym = self.symbol
+        bbi = self.bbs.__getitem__
+        w.append(len(self.bbs.objects))
+        for bb in self.bbs.objects:
+            folls = bb.folls if isinstance(bb, FakeBlock) else []
+            w.extend([isinstance(bb, FakeBlock), self.blocks[id(bb.container_block)], sym(bb.label_in),
+                      bbi(id(bb.next)), bbi(id(bb.target)), sym(bb.next_lab), sym(bb.target_lab),
+                      len(folls), len(bb.statements)])
+            w.extend(bbi(id(f)) for f in folls)
+            for instr in bb.statements:
+                self.encode_stat(instr)
+
+        done = [b for b in self.blocks.objects if b in allocs]
+        w.append(len(done))
+        for block in done:
+            alloc = allocs[block]
+            regs = sorted((sym(s), r) for s, r in alloc.var_to_reg.items())
+            w.extend([self.blocks[id(block)], alloc.nregs, alloc.numspill, len(regs)])
+            for pair in regs:
+                w.extend(pair)
+
+        strings = '\0'.join(self.strings.objects).encode()
+        consts = array('q', self.constants.objects)
+        if sys.byteorder != 'little':
+            w.byteswap()
+            consts.byteswap()
+        return b''.join([HEADER.pack(MAGIC, FORMAT_VERSION, IRUtils.tempcount, TYPENAMES['label'].ids,
+                                     len(strings), len(consts), len(w)),
+                         strings, consts.tobytes(), w.tobytes()])
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        try:
+            magic, version, self.tempcount, self.labelcount, nstr, nconst, nwords = HEADER.unpack_from(data)
+        except struct.error:
+            raise SerializationException("Truncated data")
+        if magic != MAGIC:
+            raise SerializationException("Not a lowered program")
+        if version != FORMAT_VERSION:
+            raise SerializationException(f"Format version {version}, expected {FORMAT_VERSION}")
+
+        pos = HEADER.size
+        if len(data) != pos + nstr + 8 * nconst + 4 * nwords:
+            raise SerializationException("Truncated data")
+        try:
+            self.strings = bytes(data[pos:pos + nstr]).decode().split('\0')
+        except UnicodeDecodeError:
+            raise SerializationException("Corrupted strings")
+        pos += nstr
+        self.constants = array('q', data[pos:pos + 8 * nconst])
+        pos += 8 * nconst
+        self.words = array('i', data[pos:])
+        if sys.byteorder != 'little':
+            self.constants.byteswap()
+            self.words.byteswap()
+
+    def decode(self) -> tuple['LoweredBlock', dict['LoweredBlock', 'AllocInfo']]:
+        try:
+            return self.decode_program()
+        except (IndexError, KeyError, StopIteration) as e:
+            raise SerializationException(f"Corrupted data: {type(e).__name__} {e}")
+
+    def decode_program(self):
+        strings = self.strings
+        constants = self.constants
+        nxt = iter(self.words).__next__
+
+        def string(idx):
+            return None if idx < 0 else strings[idx]
+
+        types = []
+        for _ in range(nxt()):
+            kind = nxt()
+            if kind == NAMED_TYPE:
+                types.append(TYPENAMES[string(nxt())])
+            elif kind == ARRAY_TYPE:
+                name, base, ndims = nxt(), nxt(), nxt()
+                types.append(ArrayType(string(name), [nxt() for _ in range(ndims)], types[base]))
+            elif kind == POINTER_TYPE:
+                types.append(PointerType(types[nxt()]))
+            else:
+                name, size, basetype, nqual = nxt(), nxt(), nxt(), nxt()
+                types.append(Type(string(name), size, string(basetype), [string(nxt()) for _ in range(nqual)]))
+
+        symbols = []
+        for _ in range(nxt()):
+            cls, name = nxt(), string(nxt())
+            if cls == BUILTIN_SYMB:
+                symbols.append(BUILTINS[name])
+                continue
+            typ, alloct, level, flags = types[nxt()], string(nxt()), nxt(), nxt()
+            value = constants[nxt()] if flags & HAS_VALUE else None
+            s = (RegisterSymb if cls == REGISTER_SYMB else Symbol)(name, typ, value=value, alloct=alloct)
+            s.level = None if level < 0 else level
+            if flags & LOCAL_LAYOUT:
+                symname, bsize, reloff, lvl = string(nxt()), nxt(), nxt(), nxt()
+                s.allocinfo = LocalSymbolLayout(symname, reloff, bsize, lvl)
+            elif flags & GLOBAL_LAYOUT:
+                symname, bsize = string(nxt()), nxt()
+                s.allocinfo = GlobalSymbolLayout(symname, bsize)
+            symbols.append(s)
+
+        def sym(idx):
+            return None if idx < 0 else symbols[idx]
+
+        symtabs = []
+        for _ in range(nxt()):
+            par, n = nxt(), nxt()
+            symtabs.append(SymbolTable(*[symbols[nxt()] for _ in range(n)],
+                                       parent=None if par < 0 else symtabs[par]))
+
+        blocks = []
+        ends = []
+        for _ in range(nxt()):
+            function, table, parent, entry, exit_ = nxt(), nxt(), nxt(), nxt(), nxt()
+            block = LoweredBlock(symtab=symtabs[table], function=sym(function),
+                                 body=StatList(children=[]), defs=LowDefList(children=[]))
+            block.statlist = None  # only the basic blocks are kept, as after to_bbs
+            if parent >= 0:
+                blocks[parent].defs.lst.append(LoweredDef(body=block, func=block.function))
+            blocks.append(block)
+            ends.append((entry, exit_))
+
+        decode_stat = self.decode_stat
+        bbs = []
+        links = []
+        for _ in range(nxt()):
+            fake, container = nxt(), blocks[nxt()]
+            label, next_, target, next_lab, target_lab, nfolls, nstats = \
+                nxt(), nxt(), nxt(), nxt(), nxt(), nxt(), nxt()
+            if fake:
+                bb = FakeBlock(container.function, container.symtab)
+            else:
+                bb = BasicBlock(container.function, container.symtab)
+            folls = [nxt() for _ in range(nfolls)]
+            bb.statements = [decode_stat(nxt, sym, string) for _ in range(nstats)]
+            bb.label_in = sym(label)
+            bb.next_lab = sym(next_lab)
+            bb.target_lab = sym(target_lab)
+            bb.bind_to_block(container)
+            if not fake:
+                bb.finalize()
+            bbs.append(bb)
+            links.append((next_, target, folls))
+
+        for bb, (next_, target, folls) in zip(bbs, links):
+            if next_ >= 0:
+                bb.add_succs(next=bbs[next_])
+            if target >= 0:
+                bb.add_succs(alt=bbs[target])
+            if isinstance(bb, FakeBlock):
+                bb.set_folls([bbs[i] for i in folls])
+        for block, (entry, exit_) in zip(blocks, ends):
+            block.entry_bb = bbs[entry]
+            block.exit_bb = bbs[exit_]
+
+        allocs = {}
+        for _ in range(nxt()):
+            block, nregs, numspill, n = nxt(), nxt(), nxt(), nxt()
+            regs = {}
+            for _ in range(n):
+                s = symbols[nxt()]
+                regs[s] = nxt()
+            allocs[blocks[block]] = AllocInfo(regs, numspill, nregs)
+
+        # Building the fake blocks created labels, go back to the numbering of the encoded program
+        IRUtils.tempcount = self.tempcount
+        TYPENAMES['label'].ids = self.labelcount
+        return blocks[0], allocs
+
+    def decode_stat(self, nxt, sym, string) -> 'LoweredStat':
+        cls = OPCODES[nxt()]
+        label = sym(nxt())
+        if cls is BinStat:
+            instr = BinStat(dest=sym(nxt()), op=string(nxt()), srca=sym(nxt()), srcb=sym(nxt()))
+        elif cls is LoadImmStat:
+            instr = LoadImmStat(dest=sym(nxt()), val=self.constants[nxt()])
+        elif cls is UnaryStat:
+            instr = UnaryStat(dest=sym(nxt()), op=string(nxt()), src=sym(nxt()))
+        elif cls is BranchStat:
+            instr = BranchStat(target=sym(nxt()), condition=sym(nxt()), returns=bool(nxt()), negcond=bool(nxt()))
+        elif cls is PrintStat:
+            instr = PrintStat(src=sym(nxt()))
+        elif cls is ReadStat:
+            instr = ReadStat(dest=sym(nxt()))
+        elif cls is EmptyStat:
+            instr = EmptyStat()
+        else:
+            instr = cls(dest=sym(nxt()), symbol=sym(nxt()), levels=nxt())
+        instr.set_label(label)
+        return instr
+
+
+def dumps(program: 'LoweredBlock', allocs: Opt[dict['LoweredBlock', 'AllocInfo']] = None) -> bytes:
+    """
+    :param program: The global block, after the CFG has been built
+    :param allocs: The register allocation of some or all the functions
+    """
+    if program.entry_bb is None:
+        raise SerializationException("The program must be converted to basic blocks first")
+    w = _Writer()
+    w.number_program(program)
+    return w.encode(allocs or {})
+
+
+def loads(data: bytes) -> tuple['LoweredBlock', dict['LoweredBlock', 'AllocInfo']]:
+    """
+    Rebuild the program encoded by dumps, the symbols, labels and blocks are new
+    objects except for the builtin functions.
+    The counters of temporaries and labels are restored to their value when the
+    program was encoded so that new ones don't clash with those in the program
+    :return: The global block and the allocation of the functions which had one
+    """
+    return _Reader(data).decode()
+
+
+if __name__ == '__main__':
+    LoweredStat = src.Codegen.Lowered.LoweredStat
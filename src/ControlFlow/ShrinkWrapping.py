@@ -0,0 +1,76 @@
+"""
+Shrink-wrapping of the register saves of a function
+
+A register the function writes is saved by the prologue and restored by the
+epilogue only when it can't be done closer to its uses. Otherwise it's saved
+at the start of the closest block dominating all the blocks using it and
+restored at the end of the closest block post dominating them, before the
+jump ending it, so the paths which don't use the register don't pay for it.
+
+The two blocks are moved up their trees out of the loops, where they would
+save and restore at every iteration, and they have to enclose each other: the
+save block dominates the restore block and the restore block post dominates
+the save block, so every path through one of them goes through the other. A
+restore block ending with a branch on the register itself moves up too. Blocks
+on every path from the entry to the exit gain nothing over the prologue.
+
+The entry and the exit of the function stand for the prologue and the
+epilogue, registers used where the exit can't be reached go there.
+
+After inlining little is left to wrap: the small leaf procedures are gone and
+the leaves left rarely need more than the caller saved registers. What moves
+is mostly the link register of procedures calling others on some paths only.
+"""
+import src.Codegen.Lowered as lwr
+from src.ControlFlow.Dominators import Dominators
+from src.ControlFlow.Loops import find_loops
+
+
+class ShrinkWrapping:
+    """
+    + dom, pdom: the dominators and the post dominators of the function
+    + in_loops: the blocks belonging to some loop
+    """
+
+    def __init__(self, block: 'LoweredBlock'):
+        self.block = block
+        self.dom = Dominators(block.entry_bb, order=block.orders().reverse_postorder)
+        self.pdom = Dominators(block.exit_bb, lambda bb: self.dom.preds.get(bb, []))
+        self.in_loops: set['BasicBlock'] = set()
+        for loop in find_loops(self.dom):
+            self.in_loops |= loop.body
+
+    def place(self, uses: set['BasicBlock'], registers: set['Symbol']) -> tuple['BasicBlock', 'BasicBlock']:
+        """
+        :param uses: The blocks using the register
+        :param registers: The registers allocated to it, the restore can't come
+                          before a branch on them
+        :return: The blocks to save the register at the start of and to restore
+                 it at the end of, the entry and the exit of the function for the
+                 prologue and the epilogue
+        """
+        entry, exit_ = self.block.entry_bb, self.block.exit_bb
+        uses = list(uses)
+        if not uses or not all(self.pdom.reachable(bb) for bb in uses):
+            return entry, exit_
+
+        save = self.dom.nearest_common(uses)
+        while save in self.in_loops:
+            save = self.dom.idom[save]
+
+        restore = self.pdom.nearest_common(uses)
+        while restore in self.in_loops or self.branches_on(restore, registers):
+            restore = self.pdom.idom[restore]
+
+        if save is entry or restore is exit_ or self.pdom.dominates(save, entry):
+            return entry, exit_  # on every path anyway
+        if not (self.dom.dominates(save, restore) and self.pdom.dominates(restore, save)):
+            return entry, exit_
+        return save, restore
+
+    @staticmethod
+    def branches_on(bb: 'BasicBlock', registers: set['Symbol']) -> bool:
+        if not bb.statements:
+            return False
+        last = bb.statements[-1]
+        return type(last) is lwr.BranchStat and not last.rets and last.condition in registers
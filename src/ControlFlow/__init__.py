@@ -1,4 +1,4 @@
-from . import BBs, CFG, CodeContainers, DataLayout
+from . import BBs, CFG, CodeContainers, DataLayout, Dominators, Dataflow, Loops, Orders, SSA, Serialization, Interpreter
 """
 Code for the steps following the lowering pass, contains the information for
 all lowered statements
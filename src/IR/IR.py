@@ -15,6 +15,7 @@ class IRNode(mxdT, lower=["children"]):
     They can be lowered to lowered statements that are
     then converted into code
     """
+    __slots__ = ('lowered', 'children', 'symtab')
 
     def __init__(self,
                  children: list['IRNode'] = None,
@@ -57,6 +58,7 @@ class Block(IRNode, lower=['body', 'defs']):
     A block with a local symbol table, references to the global
     symbol table and to the definition list
     """
+    __slots__ = ('function', 'body', 'defs')
 
     def __init__(self,
                  symtab: 'SymbolTable' = None,
@@ -78,12 +80,15 @@ class Placebo(IRNode):
     """
     To be returned when no node was created in the parsing
     """
+    __slots__ = ()
 
     def lower(self) -> 'Lowered':
         raise IRException("Lowering shouldn't have reached a placebo Node")
 
 
 class Definition(IRNode):
+    __slots__ = ('symbol',)
+
     def __init__(self, symbol=None):
         super(Definition, self).__init__()
         self.symbol = symbol
@@ -94,6 +99,8 @@ class Definition(IRNode):
 
 
 class FunctionDef(Definition, lower=['body']):
+    __slots__ = ('body',)
+
     def __init__(self, symbol=None, body=None):
         super(FunctionDef, self).__init__(symbol=symbol)
         self.body = body
@@ -103,6 +110,8 @@ class FunctionDef(Definition, lower=['body']):
 
 
 class DefinitionList(IRNode):
+    __slots__ = ()
+
     def append(self, el):
         self.children.append(el)
 
@@ -117,13 +126,14 @@ class Expression(IRNode, ABC):
     """
 
     """
-    pass
+    __slots__ = ()
 
 
 class BinExpr(Expression):
     """
 
     """
+    __slots__ = ('op',)
 
     def __init__(self, op=None, operands=None, symtab=None):
         super(BinExpr, self).__init__(operands, symtab)
@@ -137,10 +147,8 @@ class BinExpr(Expression):
     def lower(self) -> 'Lowered':
         src_a = self.children[0].lowered.destination()
         src_b = self.children[1].lowered.destination()
-        if ('unsigned' in src_a.stype.qual_list) and ('unsigned' in src_b.stype.qual_list):
-            desttype = Type(None, max(src_a.stype.size, src_b.stype.size), 'Int', ['unsigned'])
-        else:
-            desttype = Type(None, max(src_a.stype.size, src_b.stype.size), 'Int')
+        unsigned = ('unsigned' in src_a.stype.qual_list) and ('unsigned' in src_b.stype.qual_list)
+        desttype = int_type(max(src_a.stype.size, src_b.stype.size), unsigned)
 
         dest = new_temporary(self.symtab, desttype)
         stmt = lwr.BinStat(dest=dest,
@@ -155,6 +163,8 @@ class BinExpr(Expression):
 
 
 class UnExpr(Expression):
+    __slots__ = ('op',)
+
     def __init__(self, op, trgt=None, symtab=None):
         super(UnExpr, self).__init__([trgt], symtab)
         if len(self.children) != 1:
@@ -170,6 +180,8 @@ class UnExpr(Expression):
 
 
 class CallExpr(Expression):
+    __slots__ = ('target',)
+
     def __init__(self, function=None, symtab=None, parameters=None):
         super(CallExpr, self).__init__([], symtab)
         self.target: str = function
@@ -186,6 +198,7 @@ class CallExpr(Expression):
 class Const(IRNode):
     """
     """
+    __slots__ = ('value', 'symbol')
 
     def __init__(self, value=None, symtab=None, symb=None):
         super(Const, self).__init__(None, symtab)
@@ -207,18 +220,21 @@ class ArrayElement(IRNode, lower=['offset']):
     Loads in a temporary register the value pointed at by the
     symbol at the given offset
     """
+    __slots__ = ('symbol', 'offset', 'levels')
 
-    def __init__(self, var=None, offset=None, symtab=None):
+    def __init__(self, var=None, offset=None, symtab=None, levels=0):
         """
         Offset must be a single expression, multi dimensional arrays
         have to be flattened
         :param var:
         :param offset:
         :param symtab:
+        :param levels: the nesting distance from symtab to the table of var
         """
         super(ArrayElement, self).__init__([offset], symtab)
         self.symbol = var
         self.offset = offset
+        self.levels = levels
 
     def lower(self) -> 'Lowered':
         dest = new_temporary(self.symtab, self.symbol.stype.basetype)
@@ -226,9 +242,9 @@ class ArrayElement(IRNode, lower=['offset']):
 
         statl = [self.offset.lowered]
 
-        ptrreg = new_temporary(self.symtab, PointerType(self.symbol.stype.basetype))
-        loadptr = lwr.LoadPtrToSymb(dest=ptrreg, symbol=self.symbol)
-        src = new_temporary(self.symtab, PointerType(self.symbol.stype.basetype))
+        ptrreg = new_temporary(self.symtab, pointer_to(self.symbol.stype.basetype))
+        loadptr = lwr.LoadPtrToSymb(dest=ptrreg, symbol=self.symbol, levels=self.levels)
+        src = new_temporary(self.symtab, pointer_to(self.symbol.stype.basetype))
         add = lwr.BinStat(dest=src, op='plus', srca=ptrreg, srcb=off)
 
         statl += [loadptr, add]
@@ -239,16 +255,19 @@ class ArrayElement(IRNode, lower=['offset']):
 
 class Var(IRNode):
     """
-    Loads in a temporary register the value pointed at by the symbol
+    Loads in a temporary register the value pointed at by the symbol, levels is
+    the nesting distance from symtab to the table of the symbol
     """
+    __slots__ = ('symbol', 'levels')
 
-    def __init__(self, var=None, symtab=None):
+    def __init__(self, var=None, symtab=None, levels=0):
         super(Var, self).__init__(None, symtab)
         self.symbol = var
+        self.levels = levels
 
     def lower(self) -> 'Lowered':
         new = new_temporary(self.symtab, self.symbol.stype)
-        loadst = lwr.LoadStat(dest=new, symbol=self.symbol)
+        loadst = lwr.LoadStat(dest=new, symbol=self.symbol, levels=self.levels)
         return loadst
 
 
@@ -256,6 +275,8 @@ class Var(IRNode):
 
 
 class Statement(IRNode, ABC):
+    __slots__ = ('label',)
+
     def __init__(self, children=None, symtab=None):
         super(Statement, self).__init__(children, symtab)
         self.label = None
@@ -266,11 +287,14 @@ class Statement(IRNode, ABC):
 
 
 class AssignStat(Statement, lower=['expr', 'offset']):
+    __slots__ = ('symbol', 'expr', 'offset', 'levels')
+
     def __init__(self,
                  target=None, offset=None,
-                 expression=None, symtab=None):
+                 expression=None, symtab=None, levels=0):
         super(AssignStat, self).__init__([], symtab)
         self.symbol: 'Symbol' = target
+        self.levels = levels  # the nesting distance from symtab to the table of target
 
         self.expr: IRNode = expression
         self.offset: Opt[IRNode] = offset
@@ -287,17 +311,20 @@ class AssignStat(Statement, lower=['expr', 'offset']):
             if type(desttype) is ArrayType:
                 desttype = desttype.basetype
 
-            ptrreg = new_temporary(self.symtab, PointerType(desttype))
-            loadptr = lwr.LoadPtrToSymb(dest=ptrreg, symbol=dst)
-            dst = new_temporary(self.symtab, PointerType(desttype))
+            ptrreg = new_temporary(self.symtab, pointer_to(desttype))
+            loadptr = lwr.LoadPtrToSymb(dest=ptrreg, symbol=dst, levels=self.levels)
+            dst = new_temporary(self.symtab, pointer_to(desttype))
             add = lwr.BinStat(dest=dst, op='plus', srca=ptrreg, srcb=off)
 
             stats += [self.offset.lowered, loadptr, add]
-        stats += [lwr.StoreStat(dest=dst, symbol=src)]
+        # A store through a pointer has it in a register
+        stats += [lwr.StoreStat(dest=dst, symbol=src, levels=0 if self.offset else self.levels)]
         return lwr.StatList(children=stats)
 
 
 class CallStat(Statement):
+    __slots__ = ('call',)
+
     def __init__(self, call_expr: CallExpr = None, symtab=None):
         super(CallStat, self).__init__([], symtab)
         self.call: CallExpr = call_expr
@@ -308,6 +335,8 @@ class CallStat(Statement):
 
 
 class StatList(Statement):
+    __slots__ = ()
+
     def __init__(self, children=None, symtab=None):
         super(StatList, self).__init__(children, symtab)
 
@@ -319,6 +348,8 @@ class StatList(Statement):
 
 
 class IfStat(Statement, lower=['cond', 'then', 'elsep']):
+    __slots__ = ('cond', 'then', 'elsep')
+
     def __init__(self,
                  cond=None, then=None, els=None, symtab=None):
         super(IfStat, self).__init__([], symtab)
@@ -356,6 +387,8 @@ class IfStat(Statement, lower=['cond', 'then', 'elsep']):
 
 
 class WhileStat(Statement, lower=['cond', 'body']):
+    __slots__ = ('cond', 'body')
+
     def __init__(self, cond=None, body=None, symtab=None):
         super(WhileStat, self).__init__([], symtab)
         self.cond: IRNode = cond
@@ -379,6 +412,8 @@ class WhileStat(Statement, lower=['cond', 'body']):
 
 
 class PrintStat(Statement, lower=['expr']):
+    __slots__ = ('expr',)
+
     def __init__(self, exp=None, symtab=None):
         super(PrintStat, self).__init__([], symtab)
         self.expr: IRNode = exp
@@ -389,6 +424,8 @@ class PrintStat(Statement, lower=['expr']):
 
 
 class ReadStat(Statement):
+    __slots__ = ()
+
     def lower(self) -> 'Lowered':
         tmp = new_temporary(self.symtab, TYPENAMES['int'])
         return lwr.ReadStat(dest=tmp)
@@ -8,3 +8,12 @@ def new_temporary(symtab, typ) -> RegisterSymb:
     temp = RegisterSymb(name=f't{tempcount}', stype=typ, alloct='reg')
     tempcount += 1
     return temp
+
+
+def reset_temporaries():
+    """
+    Restart the numbering of temporaries, to call before compiling a new program
+    so that the names don't depend on what was compiled before
+    """
+    global tempcount
+    tempcount = 0
@@ -0,0 +1,171 @@
+"""
+Constant folding and algebraic simplification of the IR tree, before lowering
+
+Every BinExpr lowers to a BinStat and every UnExpr to a UnaryStat, an operation
+removed from the tree is one statement less in the lowered program. The tree is
+rewritten bottom up so the operands of an expression are already simplified
+when the expression itself is visited:
++ operations between constants are evaluated, with the wrap around of 32 bit
+  integers and truncating division. Division by zero is left to the run time
++ constants go to the right of commutative operators, the relations are
+  mirrored for the same purpose, and x - c becomes x + (-c)
++ chains of additions or multiplications by constants are reassociated,
+  (x + c1) + c2 is x + (c1 + c2)
++ identities: x + 0, x * 1 and x / 1 are x, x * 0 is 0, - - x is x and a
+  unary plus is dropped
+
+x * 0 is only replaced when x contains no division, so that a division by zero
+is not optimized away
+"""
+from typing import Optional as Opt
+
+import src.IR.IR as ir
+from src.utils.Arithmetic import BINARY_OPS, COMMUTATIVE, MIRRORED, UNARY_OPS, wrap
+
+ASSOCIATIVE = {'plus', 'times'}
+
+# The attributes holding the nodes below each kind of node, the ones
+# in the children list of IRNode are always visited
+NODE_FIELDS = {
+    ir.Block: ('body', 'defs'),
+    ir.FunctionDef: ('body',),
+    ir.AssignStat: ('expr', 'offset'),
+    ir.IfStat: ('cond', 'then', 'elsep'),
+    ir.WhileStat: ('cond', 'body'),
+    ir.PrintStat: ('expr',),
+}
+
+
+def is_const(node: 'IRNode') -> bool:
+    """A constant known at compile time"""
+    return type(node) is ir.Const and node.symbol is None
+
+
+def count_binary(node: 'IRNode') -> int:
+    """The number of BinExpr in the expression rooted at node"""
+    return (type(node) is ir.BinExpr) + sum(count_binary(c) for c in node.children)
+
+
+def count_unary(node: 'IRNode') -> int:
+    """The number of UnExpr in the expression rooted at node"""
+    return (type(node) is ir.UnExpr) + sum(count_unary(c) for c in node.children)
+
+
+def may_trap(node: 'IRNode') -> bool:
+    """Whether evaluating the expression may fail, it contains a division"""
+    if type(node) is ir.BinExpr and node.op == 'slash':
+        return True
+    return any(may_trap(c) for c in node.children)
+
+
+class ConstFolder:
+    """
+    Folds the expressions of a program in place, see the module docstring
+    + folded: operations evaluated at compile time
+    + simplified: identities and reassociations applied
+    + removed_binary, removed_unary: how many BinExpr and UnExpr left the
+      tree, the BinStat and UnaryStat the lowered program saves
+    """
+
+    def __init__(self):
+        self.folded = 0
+        self.simplified = 0
+        self.removed_binary = 0
+        self.removed_unary = 0
+
+    def __call__(self, program: 'IRNode') -> 'IRNode':
+        return self.visit(program)
+
+    def visit(self, node: Opt['IRNode']) -> Opt['IRNode']:
+        """:return: The node which replaces node in its parent"""
+        if not isinstance(node, ir.IRNode):
+            return node
+        for field in NODE_FIELDS.get(type(node), ()):
+            setattr(node, field, self.visit(getattr(node, field)))
+        node.children = [self.visit(c) for c in node.children]
+
+        if type(node) is ir.BinExpr:
+            return self.binary(node)
+        elif type(node) is ir.UnExpr:
+            return self.unary(node)
+        elif type(node) is ir.ArrayElement:
+            node.offset = node.children[0]
+        return node
+
+    def const(self, value: int, like: 'IRNode') -> 'Const':
+        return ir.Const(value=wrap(value), symtab=like.symtab)
+
+    def binary(self, node: 'BinExpr') -> 'IRNode':
+        left, right = node.children
+        if is_const(left) and is_const(right):
+            if node.op == 'slash' and right.value == 0:
+                return node
+            self.folded += 1
+            self.removed_binary += 1
+            return self.const(BINARY_OPS[node.op](left.value, right.value), node)
+
+        if is_const(left):
+            if node.op in COMMUTATIVE:
+                left, right = right, left
+            elif node.op in MIRRORED:
+                node.op = MIRRORED[node.op]
+                left, right = right, left
+            node.children = [left, right]
+        if not is_const(right):
+            return node
+
+        if node.op == 'minus':
+            node.op = 'plus'
+            right = self.const(-right.value, right)
+            node.children = [left, right]
+
+        value = right.value
+        if (node.op == 'plus' and value == 0) or (node.op in ('times', 'slash') and value == 1):
+            self.simplified += 1
+            self.removed_binary += 1
+            return left
+        if node.op == 'times' and value == 0 and not may_trap(left):
+            self.simplified += 1
+            self.removed_binary += 1 + count_binary(left)
+            self.removed_unary += count_unary(left)
+            return self.const(0, node)
+
+        if node.op in ASSOCIATIVE and type(left) is ir.BinExpr and left.op == node.op \
+                and is_const(left.children[1]):
+            # (x op c1) op c2 is x op (c1 op c2), the result may simplify further
+            self.simplified += 1
+            self.removed_binary += 1
+            inner = self.const(BINARY_OPS[node.op](left.children[1].value, value), node)
+            node.children = [left.children[0], inner]
+            return self.binary(node)
+        return node
+
+    def unary(self, node: 'UnExpr') -> 'IRNode':
+        operand = node.children[0]
+        if node.op == 'plus':
+            self.simplified += 1
+            self.removed_unary += 1
+            return operand
+        if is_const(operand):
+            self.folded += 1
+            self.removed_unary += 1
+            return self.const(UNARY_OPS[node.op](operand.value), node)
+        if node.op == 'minus' and type(operand) is ir.UnExpr and operand.op == 'minus':
+            self.simplified += 1
+            self.removed_unary += 2
+            return operand.children[0]
+        return node
+
+    def report(self) -> str:
+        return f'constant folding: {self.folded} folded, {self.simplified} simplified, ' \
+               f'{self.removed_binary} BinStat and {self.removed_unary} UnaryStat removed'
+
+
+def fold_constants(program: 'IRNode') -> ConstFolder:
+    """
+    Fold the expressions of program in place
+    :return: The folder, with the statistics of the pass
+    """
+    folder = ConstFolder()
+    folder(program)
+    return folder
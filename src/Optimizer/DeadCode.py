@@ -0,0 +1,269 @@
+"""
+Dead code elimination on the CFG
+
+Repeated on every function until nothing changes:
++ branches on a register loaded with a constant become unconditional jumps,
+  or are removed when they are never taken
++ blocks holding only their label, and possibly a jump, are bypassed: their
+  predecessors continue to their successor. A predecessor falling through to
+  the block only falls through to the successor when no other block does,
+  otherwise it ends with a jump to it, or keeps the block when it already ends
+  with a branch. The blocks which can't be reached from the entry are no longer
+  part of the function
++ statements without side effects defining registers or variables which are
+  not live after them are removed, the stores to variables included. So are
+  the registers only used to compute their own next value, like the induction
+  variables left behind by strength reduction. A removed statement carrying a
+  label leaves an EmptyStat with the label
+
+Liveness is computed on the registers and on the variables. A call to a
+procedure may read any variable, since procedures access the variables of the
+enclosing blocks, and a load through a pointer may read any variable whose
+address is taken. At the end of a procedure the variables which are not its
+own are live, at the end of the program nothing is.
+Divisions are kept unless the divisor is a constant other than 0, they fail
+when dividing by 0, and so are reads, which consume the input.
+"""
+from collections import Counter
+
+import src.Codegen.Lowered as lwr
+from src.ControlFlow.BBs import FakeBlock, redirect
+from src.ControlFlow.Dominators import predecessors
+from src.ControlFlow.Orders import fall_through
+from src.Optimizer.ValueNumbering import BUILTINS
+
+PURE = (lwr.BinStat, lwr.UnaryStat, lwr.LoadImmStat, lwr.LoadPtrToSymb, lwr.LoadStat)
+
+
+def _constants(bbs: list['BasicBlock']) -> dict['Symbol', int]:
+    """The registers defined once, by a LoadImmStat, with their value"""
+    constants: dict['Symbol', int] = {}
+    defined: Counter['Symbol'] = Counter()
+    for bb in bbs:
+        for instr in bb.statements:
+            defined.update(instr.get_defined())
+            if type(instr) is lwr.LoadImmStat:
+                constants[instr.dest] = instr.val
+    return {reg: val for reg, val in constants.items() if defined[reg] == 1}
+
+
+def _self_used(bbs: list['BasicBlock']) -> set['Symbol']:
+    """The registers used only by the statements without side effects defining them"""
+    used: set['Symbol'] = set()
+    by_others: set['Symbol'] = set()
+    for bb in bbs:
+        for instr in bb.statements:
+            uses = instr.get_used()
+            used |= uses
+            if type(instr) in PURE:
+                uses = uses - {instr.dest}
+            by_others |= uses
+    return {reg for reg in used - by_others if reg.alloct == 'reg'}
+
+
+class DeadCodeElimination:
+    """
+    + branches: the conditional branches replaced
+    + blocks: the blocks removed, bypassed or no longer reachable
+    + statements: the statements removed
+    """
+
+    def __init__(self):
+        self.branches = 0
+        self.blocks = 0
+        self.statements = 0
+        # The variables of the program, and the ones whose address is taken
+        self.variables: set['Symbol'] = set()
+        self.addressed: set['Symbol'] = set()
+
+    def __call__(self, cfg: 'CFG'):
+        for block in cfg.blocks_in_order():
+            for bb in block.orders().reverse_postorder:
+                for instr in bb.statements:
+                    typ = type(instr)
+                    if typ is lwr.LoadPtrToSymb:
+                        self.addressed.add(instr.symbol)
+                        self.variables.add(instr.symbol)
+                    elif typ is lwr.LoadStat and instr.symbol.alloct != 'reg':
+                        self.variables.add(instr.symbol)
+                    elif typ is lwr.StoreStat and instr.dest.alloct != 'reg':
+                        self.variables.add(instr.dest)
+        for block in cfg.blocks_in_order():
+            self.function(block)
+
+    def function(self, block: 'LoweredBlock'):
+        bbs = block.orders().reverse_postorder
+        changed = True
+        while changed:
+            changed = self.fold_branches(bbs)
+            changed |= self.bypass_empty(block, bbs)
+            reachable = block.orders().reverse_postorder
+            self.blocks += len(bbs) - len(reachable)
+            bbs = reachable
+            changed |= self.remove_dead(block, bbs)
+
+    def fold_branches(self, bbs: list['BasicBlock']) -> bool:
+        """Replace the branches on constant conditions"""
+        constants = _constants(bbs)
+        changed = False
+        for bb in bbs:
+            if isinstance(bb, FakeBlock) or not bb.statements:
+                continue
+            branch = bb.statements[-1]
+            if type(branch) is not lwr.BranchStat or branch.rets or branch.condition is None:
+                continue
+            if branch.condition not in constants:
+                continue
+            if bool(constants[branch.condition]) != branch.negcond:
+                jump = lwr.BranchStat(target=branch.target)
+                jump.set_label(branch.get_label())
+                bb.statements[-1] = jump
+                bb.remove_succs(next=True)
+            else:
+                bb.statements.pop()
+                bb.remove_succs(alt=True)
+            bb.compute_gen_kill()
+            self.branches += 1
+            changed = True
+        return changed
+
+    def bypass_empty(self, block: 'LoweredBlock', bbs: list['BasicBlock']) -> bool:
+        """Make the predecessors of the blocks without statements go to their successor"""
+        preds = predecessors(bbs)
+        changed = False
+        for bb in bbs:
+            if isinstance(bb, FakeBlock):
+                continue
+            succs = bb.successors()
+            if len(succs) != 1 or succs[0] is bb:
+                continue
+            body = [i for i in bb.statements if type(i) is not lwr.EmptyStat]
+            if body and not (len(body) == 1 and type(body[0]) is lwr.BranchStat and
+                             not body[0].rets and body[0].condition is None):
+                continue
+            if not preds[bb]:
+                continue
+            target = succs[0]
+            kept = []
+            for p in preds[bb]:
+                # Only one block can be placed before the target in the layout
+                if fall_through(p) is bb and any(q is not bb and fall_through(q) is target for q in preds[target]):
+                    if not self.jump_to(p, target):
+                        kept.append(p)
+                        continue
+                else:
+                    redirect(p, bb, target)
+                preds[target].append(p)
+                changed = True
+            if not kept:
+                preds[target].remove(bb)
+            preds[bb] = kept
+        return changed
+
+    @staticmethod
+    def jump_to(bb: 'BasicBlock', target: 'BasicBlock') -> bool:
+        """
+        Replace the fall through edge of bb with a jump to target
+        :return: False if bb already ends with a branch or is the entry
+        """
+        if isinstance(bb, FakeBlock):
+            return False
+        last = bb.statements[-1] if bb.statements else None
+        if type(last) is lwr.BranchStat and not last.rets:
+            return False
+        bb.statements.append(lwr.BranchStat(target=target.label_in))
+        bb.remove_succs(next=True)
+        bb.target_lab = target.label_in
+        bb.add_succs(alt=target)
+        return True
+
+    def live_at_exit(self, block: 'LoweredBlock') -> set['Symbol']:
+        if block.function is None:
+            return set()
+        return self.variables - set(block.symtab.lst)
+
+    def remove_dead(self, block: 'LoweredBlock', bbs: list['BasicBlock']) -> bool:
+        """Remove the statements defining symbols which are not live after them"""
+        preds = predecessors(bbs)
+        constants = _constants(bbs)
+        useless = _self_used(bbs)
+        live_in: dict['BasicBlock', set['Symbol']] = {bb: set() for bb in bbs}
+        exit_live = self.live_at_exit(block)
+
+        def live_out(bb: 'BasicBlock') -> set['Symbol']:
+            succs = bb.successors()
+            if not succs:
+                return set(exit_live)
+            return set().union(*(live_in[s] for s in succs if s in live_in))
+
+        # Backwards, from the last blocks of reverse postorder
+        work = list(bbs)
+        queued = set(bbs)
+        while work:
+            bb = work.pop()
+            queued.discard(bb)
+            live = live_out(bb)
+            for instr in reversed(bb.statements):
+                self.transfer(instr, live)
+            if live != live_in[bb]:
+                live_in[bb] = live
+                for p in preds[bb]:
+                    if p not in queued:
+                        queued.add(p)
+                        work.append(p)
+
+        changed = False
+        for bb in bbs:
+            live = live_out(bb)
+            kept = []
+            removed = 0
+            for instr in reversed(bb.statements):
+                if self.is_dead(instr, live, constants, useless):
+                    removed += 1
+                    if instr.label is not None:
+                        label = lwr.EmptyStat()
+                        label.set_label(instr.get_label())
+                        kept.append(label)
+                    continue
+                self.transfer(instr, live)
+                kept.append(instr)
+            if removed:
+                self.statements += removed
+                kept.reverse()
+                bb.statements = kept
+                bb.compute_gen_kill()
+                changed = True
+        return changed
+
+    def transfer(self, instr: 'LoweredStat', live: set['Symbol']):
+        """Update the symbols live after instr to the ones live before it"""
+        live -= instr.get_defined()
+        live |= instr.get_used()
+        if type(instr) is lwr.LoadStat and instr.symbol.alloct == 'reg':
+            live |= self.addressed
+        elif type(instr) is lwr.BranchStat and instr.rets and instr.target not in BUILTINS:
+            live |= self.variables
+
+    @staticmethod
+    def is_dead(instr: 'LoweredStat', live: set['Symbol'], constants: dict['Symbol', int],
+                useless: set['Symbol']) -> bool:
+        typ = type(instr)
+        if typ is lwr.StoreStat:
+            return instr.dest.alloct != 'reg' and instr.dest not in live
+        if typ not in PURE or (instr.dest in live and instr.dest not in useless):
+            return False
+        return typ is not lwr.BinStat or instr.op != 'slash' or constants.get(instr.srcb, 0) != 0
+
+    def report(self) -> str:
+        return f'dead code elimination: {self.statements} statements, {self.blocks} blocks ' \
+               f'and {self.branches} branches removed'
+
+
+def eliminate_dead_code(cfg: 'CFG') -> DeadCodeElimination:
+    """
+    Dead code elimination on every function of cfg
+    :return: The pass, with the statistics
+    """
+    dce = DeadCodeElimination()
+    dce(cfg)
+    return dce
@@ -0,0 +1,260 @@
+"""
+Inlining of the small leaf procedures
+
+A leaf procedure calls no procedure but print and read. Its calls are
+replaced by a copy of its basic blocks when it has at most INLINE_SIZE
+statements or when it's called from a single place: the block of the call is
+split after it, the first part continues to the copy of the entry of the
+procedure and the copies of its last blocks continue to the second part.
+The copy has its own registers and labels, the registers of a procedure are
+only used inside it.
+
+The variables of the blocks enclosing the procedure are used as they are: the
+caller is nested in the block defining the procedure, or is that block, so
+the same variables are visible from it through the same static links. The
+variables of the procedure become variables of the caller, one for each of
+them shared by all the copies in the same caller, and the ones the procedure
+reads are set to 0 before each copy, since every call starts with new
+variables (dead code elimination removes the assignments when the procedure
+always writes before reading). Procedures with array variables are not inlined.
+The variables added are removed by `remove_unused_variables` once the later
+passes removed all the statements using them.
+
+Once the calls to a procedure are inlined its caller may become a leaf, the
+pass is repeated until no call can be inlined. Then the procedures which are
+no longer called from the program are removed, with the procedures they define.
+"""
+import copy
+from collections import Counter
+
+import src.Codegen.Lowered as lwr
+from src.ControlFlow.BBs import BasicBlock, FakeBlock
+from src.IR.IRUtils import new_temporary
+from src.Optimizer.ValueNumbering import BUILTINS
+from src.Symbols.Symbols import ArrayType, TYPENAMES
+
+INLINE_SIZE = 24
+
+
+def _calls(block: 'LoweredBlock') -> set['Symbol']:
+    """The procedures called by block, print and read excluded"""
+    calls = set()
+    for bb in block.orders().reverse_postorder:
+        calls |= bb.func_calls()
+    return calls - set(BUILTINS)
+
+
+def _size(block: 'LoweredBlock') -> int:
+    return sum(type(i) is not lwr.EmptyStat
+               for bb in block.orders().reverse_postorder for i in bb.statements)
+
+
+class Inliner:
+    """
+    + inlined: the calls replaced, by procedure
+    + removed: the procedures removed
+    + variables: the variables added to the callers, by caller and variable
+      of the procedure
+    + unused: the variables added which were removed as no longer used
+    """
+
+    def __init__(self, size: int = INLINE_SIZE):
+        """
+        :param size: The largest procedure inlined at every call, in statements
+        """
+        self.size = size
+        self.inlined: Counter['Symbol'] = Counter()
+        self.removed = 0
+        self.unused = 0
+        self.variables: dict[tuple['LoweredBlock', 'Symbol'], 'Symbol'] = {}
+        self.functions: dict['Symbol', 'LoweredBlock'] = {}
+
+    def __call__(self, cfg: 'CFG'):
+        self.functions = cfg.functions
+        while True:
+            sites: Counter['Symbol'] = Counter()
+            for block in cfg.blocks_in_order():
+                for bb in block.orders().reverse_postorder:
+                    for instr in bb.statements:
+                        if type(instr) is lwr.BranchStat and instr.rets and instr.target not in BUILTINS:
+                            sites[instr.target] += 1
+            inlinable = {f for f in sites if self.inlinable(self.functions[f], sites[f])}
+            if not inlinable:
+                break
+            for block in cfg.blocks_in_order():
+                self.function(block, inlinable)
+        self.remove_uncalled(cfg)
+
+    def inlinable(self, block: 'LoweredBlock', sites: int) -> bool:
+        if _calls(block):
+            return False
+        if any(isinstance(var.stype, ArrayType) for var in block.symtab.lst if var.allocinfo is not None):
+            return False
+        return sites == 1 or _size(block) <= self.size
+
+    def function(self, block: 'LoweredBlock', inlinable: set['Symbol']):
+        """Inline the calls of block to the procedures in inlinable"""
+        work = list(block.orders().reverse_postorder)
+        while work:
+            bb = work.pop()
+            for idx, instr in enumerate(bb.statements):
+                if type(instr) is lwr.BranchStat and instr.rets and instr.target in inlinable:
+                    work.append(self.inline(block, bb, idx))
+                    break
+
+    def inline(self, caller: 'LoweredBlock', bb: 'BasicBlock', idx: int) -> 'BasicBlock':
+        """
+        Replace the call at idx in bb with a copy of the procedure
+        :return: The block with the statements following the call
+        """
+        call = bb.statements[idx]
+        callee = self.functions[call.target]
+        self.inlined[call.target] += 1
+
+        after = BasicBlock(caller.function, caller.symtab)
+        after.bind_to_block(caller)
+        after.statements = bb.statements[idx + 1:]
+        after.finalize()
+        after.target_lab = bb.target_lab
+        after.add_succs(next=bb.next, alt=bb.target)
+
+        bb.statements = bb.statements[:idx]
+        if call.label is not None:
+            label = lwr.EmptyStat()
+            label.set_label(call.get_label())
+            bb.statements.append(label)
+
+        mapping: dict['Symbol', 'Symbol'] = {}
+        read = set()
+        for b in callee.orders().reverse_postorder:
+            for instr in b.statements:
+                if type(instr) is lwr.LoadStat and instr.symbol.alloct != 'reg':
+                    read.add(instr.symbol)
+        zero = None
+        for var in callee.symtab.lst:
+            if var.allocinfo is None:
+                continue
+            mapping[var] = self.variable(caller, callee, var)
+            if var in read:
+                if zero is None:
+                    zero = new_temporary(None, TYPENAMES['int'])
+                    bb.statements.append(lwr.LoadImmStat(dest=zero, val=0))
+                bb.statements.append(lwr.StoreStat(dest=mapping[var], symbol=zero))
+
+        blocks = [b for b in callee.orders().reverse_postorder if not isinstance(b, FakeBlock)]
+        labels = {b.label_in: TYPENAMES['label']() for b in blocks}
+        copies: dict['BasicBlock', 'BasicBlock'] = {}
+        for b in blocks:
+            new = BasicBlock(caller.function, caller.symtab)
+            new.bind_to_block(caller)
+            new.statements = [self.copy(instr, mapping, labels, caller.symtab.lvl - callee.symtab.lvl)
+                              for instr in b.statements]
+            new.add_label(labels[b.label_in])
+            new.target_lab = labels.get(b.target_lab)
+            copies[b] = new
+        for b, new in copies.items():
+            if b.next is not None:
+                new.add_succs(next=copies.get(b.next, after))
+            if b.target is not None:
+                new.add_succs(alt=copies[b.target])
+            new.finalize()
+
+        entry = callee.entry_bb.successors()
+        bb.remove_succs(alt=True)
+        bb.add_succs(next=copies[entry[0]] if entry else after)
+        bb.compute_gen_kill()
+        return after
+
+    def variable(self, caller: 'LoweredBlock', callee: 'LoweredBlock', var: 'Symbol') -> 'Symbol':
+        """The variable of caller holding var in the copies of callee"""
+        key = caller, var
+        if key not in self.variables:
+            self.variables[key] = caller.add_variable(f'{callee.function.name}_{var.name}', var.stype)
+        return self.variables[key]
+
+    @staticmethod
+    def copy(instr: 'LoweredStat', mapping: dict['Symbol', 'Symbol'],
+             labels: dict['Symbol', 'Symbol'], shift: int) -> 'LoweredStat':
+        """
+        A copy of instr with the registers, variables and labels renamed
+        :param shift: How much deeper the caller is nested than the procedure, the
+                      variables of the enclosing blocks are that much further away
+        """
+        new = copy.copy(instr)
+        if type(instr) in (lwr.LoadStat, lwr.StoreStat, lwr.LoadPtrToSymb):
+            var = instr.dest if type(instr) is lwr.StoreStat else instr.symbol
+            # The variables of the procedure become variables of the caller
+            if var.alloct != 'reg':
+                new.levels = 0 if var in mapping else instr.levels + shift
+        for symb in instr.get_used() | instr.get_defined():
+            if symb.alloct == 'reg' and symb not in mapping:
+                mapping[symb] = new_temporary(None, symb.stype)
+        new.replace_used(mapping)
+        new.replace_defined(mapping)
+        if instr.label is not None:
+            new.set_label(labels[instr.label])
+        if type(instr) is lwr.BranchStat and not instr.rets:
+            new.target = labels[instr.target]
+        return new
+
+    def remove_uncalled(self, cfg: 'CFG'):
+        """Remove the procedures not called from the program, directly or not"""
+        called = set()
+        work = [cfg.global_block]
+        while work:
+            for f in _calls(work.pop()) - called:
+                called.add(f)
+                work.append(cfg.functions[f])
+
+        def remove(block: 'LoweredBlock'):
+            for defun in block.defs.lst:
+                remove(defun.body)
+            del cfg.functions[block.function]
+            self.removed += 1
+
+        def visit(block: 'LoweredBlock'):
+            kept = []
+            for defun in block.defs.lst:
+                if defun.function in called:
+                    kept.append(defun)
+                    visit(defun.body)
+                else:
+                    remove(defun.body)
+            block.defs.lst = kept
+
+        visit(cfg.global_block)
+
+    def remove_unused_variables(self, cfg: 'CFG'):
+        """
+        Remove the variables added to the callers which no statement uses, to
+        run after the passes which remove statements
+        """
+        used = set()
+        for block in cfg.blocks_in_order():
+            for _, instr in block.statements():
+                if type(instr) in (lwr.LoadStat, lwr.LoadPtrToSymb):
+                    used.add(instr.symbol)
+                elif type(instr) is lwr.StoreStat:
+                    used.add(instr.dest)
+        unused: dict['LoweredBlock', set['Symbol']] = {}
+        for (caller, _), var in self.variables.items():
+            if var not in used:
+                unused.setdefault(caller, set()).add(var)
+        for caller, variables in unused.items():
+            caller.remove_variables(variables)
+            self.unused += len(variables)
+        self.variables = {key: var for key, var in self.variables.items() if var in used}
+
+    def report(self) -> str:
+        return f'inlining: {sum(self.inlined.values())} calls to {len(self.inlined)} procedures ' \
+               f'inlined, {self.removed} procedures removed, {self.unused} variables removed'
+
+
+def inline_procedures(cfg: 'CFG', size: int = INLINE_SIZE) -> Inliner:
+    """
+    Inline the small leaf procedures of cfg and remove the procedures no longer called
+    :return: The pass, with the statistics
+    """
+    inliner = Inliner(size)
+    inliner(cfg)
+    return inliner
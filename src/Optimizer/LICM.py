@@ -0,0 +1,146 @@
+"""
+Loop invariant code motion
+
+The statements of a loop computing the same value at every iteration are moved
+to the preheader of the loop, so they run once before entering it. Loops are
+processed from the innermost, the statements hoisted out of an inner loop are
+in the body of the outer loop and can be hoisted further.
+
+A statement is invariant when it's a BinStat, UnaryStat, LoadImmStat,
+LoadPtrToSymb or LoadStat defining a register defined nowhere else in the loop
+and all the registers it uses are defined outside of the loop or by invariant
+statements. Moreover:
++ divisions are not moved, they would fail in the preheader when the loop
+  doesn't run or the division is not reached
++ loads of a variable need the loop not to store to the variable and not to
+  call procedures, which may assign it
++ loads through a pointer also need the loop not to store through pointers,
+  and their block to dominate the exits of the loop so that the address is
+  valid whenever the preheader runs
+
+Preheaders which receive nothing are removed, the hoisted statements are
+numbered again (see ValueNumbering) since different blocks of a loop often
+compute the same address.
+"""
+from collections import Counter
+
+import src.Codegen.Lowered as lwr
+from src.ControlFlow.Dominators import Dominators
+from src.ControlFlow.Loops import Loop, loops_with_preheaders, remove_empty_preheaders
+from src.Optimizer.ValueNumbering import BUILTINS, ValueNumbering
+
+HOISTABLE = (lwr.BinStat, lwr.UnaryStat, lwr.LoadImmStat, lwr.LoadPtrToSymb, lwr.LoadStat)
+
+
+class LoopMemory:
+    """What a loop writes: the registers and how many times, the variables, and
+    whether it stores through pointers or calls procedures"""
+
+    def __init__(self, loop: Loop):
+        self.defined: Counter['Symbol'] = Counter()
+        self.stored: set['Symbol'] = set()
+        self.stores_through_pointers = False
+        self.calls = False
+        for bb in loop.body:
+            for instr in bb.statements:
+                for d in instr.get_defined():
+                    if d.alloct == 'reg':
+                        self.defined[d] += 1
+                    else:
+                        self.stored.add(d)
+                if type(instr) is lwr.StoreStat and instr.dest.alloct == 'reg':
+                    self.stores_through_pointers = True
+                elif type(instr) is lwr.BranchStat and instr.rets and instr.target not in BUILTINS:
+                    self.calls = True
+
+
+class LoopInvariantMotion:
+    """
+    + loops: the number of loops found
+    + hoisted: the statements moved out of each loop, by header
+    """
+
+    def __init__(self):
+        self.loops = 0
+        self.hoisted: dict['BasicBlock', int] = {}
+
+    def __call__(self, cfg: 'CFG'):
+        for block in cfg.blocks_in_order():
+            self.function(block)
+
+    def function(self, block: 'LoweredBlock'):
+        dom, loops = loops_with_preheaders(block.entry_bb)
+        if not loops:
+            return
+        self.loops += len(loops)
+        for loop in loops:
+            moved = self.hoist(loop, dom)
+            if moved:
+                self.hoisted[loop.header] = moved
+
+        filled = remove_empty_preheaders(block.entry_bb, loops)
+        if filled:
+            ValueNumbering().function(block, only=filled)
+
+    def hoist(self, loop: Loop, dom: Dominators) -> int:
+        """
+        Move the invariant statements of loop to its preheader
+        :return: The number of statements moved
+        """
+        memory = LoopMemory(loop)
+        exiting = loop.exiting()
+        blocks = [bb for bb in dom.order if bb in loop.body]
+        invariant: set['Symbol'] = set()
+        hoisted = []
+
+        def is_invariant(instr: 'LoweredStat', bb: 'BasicBlock') -> bool:
+            if type(instr) not in HOISTABLE or instr.label is not None:
+                return False
+            if memory.defined[instr.dest] != 1:
+                return False
+            if type(instr) is lwr.BinStat and instr.op == 'slash':
+                return False
+            if type(instr) is lwr.LoadStat:
+                if memory.calls:
+                    return False
+                if instr.symbol.alloct != 'reg':
+                    return instr.symbol not in memory.stored
+                if memory.stores_through_pointers or not all(dom.dominates(bb, e) for e in exiting):
+                    return False
+            return all(u in invariant or memory.defined[u] == 0
+                       for u in instr.get_used() if u.alloct == 'reg')
+
+        changed = True
+        while changed:
+            changed = False
+            for bb in blocks:
+                kept = []
+                for instr in bb.statements:
+                    if is_invariant(instr, bb):
+                        hoisted.append(instr)
+                        invariant.add(instr.dest)
+                        changed = True
+                    else:
+                        kept.append(instr)
+                if len(kept) != len(bb.statements):
+                    bb.statements = kept
+                    bb.compute_gen_kill()
+
+        if hoisted:
+            loop.preheader.statements.extend(hoisted)
+            loop.preheader.compute_gen_kill()
+        return len(hoisted)
+
+    def report(self) -> str:
+        return f'loop invariant code motion: {sum(self.hoisted.values())} statements hoisted ' \
+               f'out of {len(self.hoisted)} of {self.loops} loops'
+
+
+def hoist_invariants(cfg: 'CFG') -> LoopInvariantMotion:
+    """
+    Loop invariant code motion on every function of cfg
+    :return: The pass, with the statistics
+    """
+    licm = LoopInvariantMotion()
+    licm(cfg)
+    return licm
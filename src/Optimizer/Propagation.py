@@ -0,0 +1,331 @@
+"""
+Sparse conditional constant propagation and copy propagation, the passes on
+the SSA form of the registers (see ControlFlow.SSA)
+
+Constant propagation is the algorithm of Wegman and Zadeck: a register is
+unknown until its definition runs, then either a constant or VARYING, and the
+blocks are only visited once an edge reaching them may be taken. Two worklists
+drive it, the edges of the CFG becoming executable and the registers whose
+value changed, whose uses are evaluated again, so every statement is visited a
+bounded number of times. A branch on an unknown or constant register only makes
+the edges it can take executable, and a PhiStat meets the values of the
+predecessors it can be entered from. Then:
++ the statements computing a constant become LoadImmStats, the ones of the
+  PhiStats are moved after the other PhiStats of their block
++ the branches on a constant become jumps or are removed, the blocks which
+  can't be entered are no longer reachable (dead code elimination drops them)
++ the operations with a neutral operand, x + 0, x - 0, x * 1 or x / 1, become
+  copies of x
+
+Copy propagation renames the uses of the destination of a copy to its source
+and removes the copy, so do the PhiStats whose sources are all the same. The
+versions of the registers defined more than once are left alone (see SSA).
+Values are computed as the interpreter does, wrapped to the type of the
+register, and divisions by 0 are not folded, they fail when they run.
+"""
+import time
+from collections import Counter
+
+import src.Codegen.Lowered as lwr
+from src.ControlFlow.SSA import SSAForm, phis
+from src.Symbols.Symbols import PointerType
+from src.utils.Arithmetic import BINARY_OPS, UNARY_OPS, same_representation, wrap_to
+
+VARYING = object()
+
+FOLDABLE = (lwr.PhiStat, lwr.BinStat, lwr.UnaryStat)
+
+
+def _is_pointer(reg: 'Symbol') -> bool:
+    return isinstance(reg.stype, PointerType)
+
+
+def _with_label(new: 'LoweredStat', old: 'LoweredStat') -> 'LoweredStat':
+    new.set_label(old.get_label())
+    return new
+
+
+def _conditional(bb: 'BasicBlock') -> bool:
+    """Whether bb ends with a conditional branch"""
+    if not bb.statements:
+        return False
+    last = bb.statements[-1]
+    return type(last) is lwr.BranchStat and not last.rets and last.condition is not None
+
+
+class ConstantPropagation:
+    """
+    + constants: the statements replaced by a constant
+    + branches: the conditional branches replaced
+    + simplified: the operations replaced by a copy
+    + unreachable: the blocks which can't be entered
+    """
+
+    def __init__(self):
+        self.constants = 0
+        self.branches = 0
+        self.simplified = 0
+        self.unreachable = 0
+
+    def __call__(self, ssa: SSAForm):
+        values, reached = self.evaluate(ssa)
+        self.unreachable += len(ssa.dom.order) - len(reached)
+        for bb in ssa.dom.order:
+            if bb in reached:
+                self.rewrite(ssa, bb, values)
+
+    def evaluate(self, ssa: SSAForm) -> tuple[dict['Symbol', object], set['BasicBlock']]:
+        """
+        :return: The value of the registers, an int, VARYING, or missing when no
+                 definition runs, and the blocks which can be entered
+        """
+        values: dict['Symbol', object] = {reg: VARYING for reg in ssa.uses if reg not in ssa.definitions}
+        edges: set[tuple['BasicBlock', 'BasicBlock']] = set()
+        reached: set['BasicBlock'] = set()
+        flow: list[tuple['BasicBlock', 'BasicBlock']] = [(None, ssa.dom.entry)]
+        changed: list['Symbol'] = []
+
+        def lower(reg: 'Symbol', value: object):
+            old = values.get(reg)
+            if value is None or old is VARYING or old == value:
+                return
+            values[reg] = value if old is None else VARYING
+            changed.append(reg)
+
+        def visit(bb: 'BasicBlock', instr: 'LoweredStat'):
+            if type(instr) is lwr.PhiStat:
+                incoming = [values.get(src) for p, src in instr.sources.items() if (p, bb) in edges]
+                known = [v for v in incoming if v is not None]
+                if VARYING in known or len(set(known)) > 1:
+                    lower(instr.dest, VARYING)
+                elif known:
+                    lower(instr.dest, known[0])
+            elif _conditional(bb) and instr is bb.statements[-1]:
+                flow.extend((bb, s) for s in self.successors(bb, values))
+            else:
+                for d in instr.get_defined():
+                    if d.alloct == 'reg':
+                        lower(d, self.value(instr, values))
+
+        while flow or changed:
+            while flow:
+                pred, bb = flow.pop()
+                if (pred, bb) in edges:
+                    continue
+                edges.add((pred, bb))
+                if bb in reached:
+                    for phi in phis(bb):
+                        visit(bb, phi)
+                    continue
+                reached.add(bb)
+                for instr in bb.statements:
+                    visit(bb, instr)
+                if not _conditional(bb):
+                    flow.extend((bb, s) for s in bb.successors())
+            while changed:
+                for bb, instr in ssa.uses.get(changed.pop(), ()):
+                    if bb in reached:
+                        visit(bb, instr)
+        return values, reached
+
+    @staticmethod
+    def successors(bb: 'BasicBlock', values: dict['Symbol', object]) -> list['BasicBlock']:
+        """The successors bb can continue to, bb ends with a conditional branch"""
+        branch = bb.statements[-1]
+        cond = values.get(branch.condition)
+        if cond is None:
+            return []
+        if cond is VARYING:
+            return bb.successors()
+        taken = bb.target if bool(cond) != branch.negcond else bb.next
+        return [taken] if taken is not None else []
+
+    @staticmethod
+    def value(instr: 'LoweredStat', values: dict['Symbol', object]) -> object:
+        """The value instr gives to the register it defines, None if not known yet"""
+        typ = type(instr)
+        if typ is lwr.LoadImmStat:
+            return wrap_to(instr.val, instr.dest.stype)
+        if typ is lwr.BinStat:
+            a, b = values.get(instr.srca), values.get(instr.srcb)
+            if instr.op == 'times' and 0 in (a, b) and not _is_pointer(instr.dest):
+                return 0
+            if a is VARYING or b is VARYING:
+                return VARYING
+            if a is None or b is None:
+                return None
+            if instr.op == 'slash' and b == 0:
+                return VARYING
+            return wrap_to(BINARY_OPS[instr.op](a, b), instr.dest.stype)
+        if typ is lwr.UnaryStat:
+            a = values.get(instr.src)
+            if a is None or a is VARYING:
+                return a
+            return wrap_to(UNARY_OPS[instr.op](a), instr.dest.stype)
+        return VARYING
+
+    def rewrite(self, ssa: SSAForm, bb: 'BasicBlock', values: dict['Symbol', object]):
+        """Replace the statements of bb computing constants and the branch on a constant"""
+        folded_phis = []
+        for idx, instr in enumerate(bb.statements):
+            typ = type(instr)
+            if typ in FOLDABLE and type(values.get(instr.dest)) is int:
+                new = _with_label(lwr.LoadImmStat(dest=instr.dest, val=values[instr.dest]), instr)
+                if typ is lwr.PhiStat:
+                    folded_phis.append(new)
+                else:
+                    bb.statements[idx] = new
+                ssa.redefine(bb, new)
+                self.constants += 1
+            elif typ is lwr.BinStat:
+                copied = self.neutral_operand(instr, values)
+                if copied is not None:
+                    new = _with_label(lwr.UnaryStat(dest=instr.dest, op='plus', src=copied), instr)
+                    bb.statements[idx] = new
+                    ssa.redefine(bb, new)
+                    self.simplified += 1
+
+        if folded_phis:
+            folded = {i.dest for i in folded_phis}
+            bb.statements = [i for i in bb.statements if type(i) is not lwr.PhiStat or i.dest not in folded]
+            start = 0
+            while start < len(bb.statements) and type(bb.statements[start]) in (lwr.EmptyStat, lwr.PhiStat):
+                start += 1
+            bb.statements[start:start] = folded_phis
+
+        if _conditional(bb) and type(values.get(bb.statements[-1].condition)) is int:
+            branch = bb.statements[-1]
+            if bool(values[branch.condition]) != branch.negcond:
+                bb.statements[-1] = _with_label(lwr.BranchStat(target=branch.target), branch)
+                bb.remove_succs(next=True)
+            else:
+                bb.statements.pop()
+                bb.remove_succs(alt=True)
+            self.branches += 1
+
+    @staticmethod
+    def neutral_operand(instr: 'BinStat', values: dict['Symbol', object]) -> 'Symbol':
+        """The operand instr computes the value of, if the other one is neutral for the operation"""
+        if _is_pointer(instr.dest) or _is_pointer(instr.srca) or _is_pointer(instr.srcb):
+            return None
+        a, b = values.get(instr.srca), values.get(instr.srcb)
+        if instr.op in ('plus', 'minus', 'times', 'slash'):
+            neutral = 0 if instr.op in ('plus', 'minus') else 1
+            if b == neutral:
+                return instr.srca
+            if a == neutral and instr.op in ('plus', 'times'):
+                return instr.srcb
+        return None
+
+    def report(self) -> str:
+        return f'constant propagation: {self.constants} statements and {self.branches} branches ' \
+               f'folded, {self.simplified} operations simplified, {self.unreachable} blocks unreachable'
+
+
+class CopyPropagation:
+    """
+    + copies: the copies and PhiStats removed
+    """
+
+    def __init__(self):
+        self.copies = 0
+
+    def __call__(self, ssa: SSAForm):
+        mapping: dict['Symbol', 'Symbol'] = {}
+        for bb in ssa.dom.order:
+            for instr in bb.statements:
+                source = self.source(instr, ssa)
+                if source is not None:
+                    mapping[instr.dest] = source
+        if not mapping:
+            return
+
+        for dest in mapping:
+            source = mapping[dest]
+            while source in mapping:
+                source = mapping[source]
+            mapping[dest] = source
+
+        removed: dict['BasicBlock', set['LoweredStat']] = {}
+        for dest, source in mapping.items():
+            for _, instr in ssa.uses.get(dest, ()):
+                instr.replace_used({dest: source})
+            ssa.uses.setdefault(source, []).extend(ssa.uses.pop(dest, ()))
+            bb, instr = ssa.definitions.pop(dest)
+            removed.setdefault(bb, set()).add(instr)
+        for bb, instrs in removed.items():
+            kept = []
+            for instr in bb.statements:
+                if instr not in instrs:
+                    kept.append(instr)
+                elif instr.label is not None:
+                    kept.append(_with_label(lwr.EmptyStat(), instr))
+            bb.statements = kept
+            self.copies += len(instrs)
+
+    @staticmethod
+    def source(instr: 'LoweredStat', ssa: SSAForm) -> 'Symbol':
+        """The register instr copies, if it's a copy which can be removed"""
+        typ = type(instr)
+        if typ is lwr.PhiStat:
+            sources = set(instr.sources.values()) - {instr.dest}
+            return sources.pop() if len(sources) == 1 else None
+        if typ is not lwr.UnaryStat or instr.op != 'plus' or instr.src.alloct != 'reg':
+            return None
+        if ssa.is_version(instr.dest) or ssa.is_version(instr.src):
+            return None
+        if _is_pointer(instr.dest) or _is_pointer(instr.src):
+            return None
+        return instr.src if same_representation(instr.src.stype, instr.dest.stype) else None
+
+    def report(self) -> str:
+        return f'copy propagation: {self.copies} copies removed'
+
+
+class Propagation:
+    """
+    + constants, copies: the passes, with their statistics
+    + times: the seconds spent by each step, building the SSA form, the two
+      passes and going out of SSA form
+    + phis: the PhiStats placed
+    """
+
+    def __init__(self):
+        self.constants = ConstantPropagation()
+        self.copies = CopyPropagation()
+        self.times: Counter[str] = Counter()
+        self.phis = 0
+
+    def __call__(self, cfg: 'CFG'):
+        for block in cfg.blocks_in_order():
+            self.function(block)
+
+    def function(self, block: 'LoweredBlock'):
+        start = time.perf_counter()
+        ssa = SSAForm(block)
+        built = time.perf_counter()
+        self.constants(ssa)
+        propagated = time.perf_counter()
+        self.copies(ssa)
+        copied = time.perf_counter()
+        ssa.destruct()
+        end = time.perf_counter()
+
+        self.phis += ssa.phis
+        self.times['construction'] += built - start
+        self.times['constants'] += propagated - built
+        self.times['copies'] += copied - propagated
+        self.times['destruction'] += end - copied
+
+    def report(self) -> str:
+        return f'ssa: {self.phis} phis placed\n{self.constants.report()}\n{self.copies.report()}'
+
+
+def propagate(cfg: 'CFG') -> Propagation:
+    """
+    Constant and copy propagation on the SSA form of every function of cfg
+    :return: The passes, with the statistics and the timings
+    """
+    passes = Propagation()
+    passes(cfg)
+    return passes
@@ -0,0 +1,456 @@
+"""
+Strength reduction of the induction variables of the loops
+
+A basic induction variable of a loop is a variable stored once in the loop,
+with its own value plus a constant step, in a loop which doesn't call
+procedures. The values computed in a basic block of the loop from a load of
+the variable by adding, subtracting and multiplying by constants and by
+registers defined outside of the loop are affine functions of the variable:
+
+    scale * v + offset + coef_1 * term_1 + ... (+ base, the address of an array)
+
+Such a value whose computation includes a multiplication or an address is
+replaced by a register initialized in the preheader and incremented by
+scale * step right after the store to the variable, so that it's always the
+function of the current value of the variable. Array indexing in a loop turns
+into a pointer moving by a constant stride. A value is replaced only when it's
+used in the block computing it and the variable is not stored between the load
+and the uses, values computed from the same variable in the same way share the
+register.
+
+Once the values are replaced the variable itself is eliminated when it's
+otherwise only compared with registers defined outside of the loop: the
+comparisons are done on one of its pointers, against the address the limit
+corresponds to, and its store is removed. The variable has to be assigned
+before every entry to the loop and not be read anywhere else, so that nobody
+sees that it's no longer updated.
+
+Registers are defined once in the rest of the program, the registers of the
+reduced values are the exception: they are defined in the preheader and in
+the loop.
+"""
+from collections import Counter, namedtuple
+from typing import Optional as Opt
+
+import src.Codegen.Lowered as lwr
+from src.ControlFlow.Dominators import Dominators
+from src.ControlFlow.Loops import Loop, loops_with_preheaders, remove_empty_preheaders
+from src.IR.IRUtils import new_temporary
+from src.Optimizer.LICM import HOISTABLE, LoopMemory
+from src.Symbols.Symbols import PointerType, TYPENAMES
+from src.utils.Arithmetic import INT_BITS, MIRRORED, RELATIONS, wrap
+
+# scale * iv + offset + sum(coef * reg for reg, coef in terms) + base
+# iv is None for the values which don't depend on a variable
+Affine = namedtuple('Affine', 'iv scale offset terms base')
+
+
+def _add(a: Affine, b: Affine) -> Opt[Affine]:
+    if a.iv is not None and b.iv is not None and a.iv is not b.iv:
+        return None
+    if a.base is not None and b.base is not None:
+        return None
+    terms = dict(a.terms)
+    for reg, coef in b.terms:
+        terms[reg] = terms.get(reg, 0) + coef
+    return Affine(a.iv if a.iv is not None else b.iv, a.scale + b.scale, a.offset + b.offset,
+                  tuple(sorted(((r, c) for r, c in terms.items() if c), key=lambda t: t[0].name)),
+                  a.base if a.base is not None else b.base)
+
+
+def _multiply(a: Affine, factor: int) -> Opt[Affine]:
+    if a.base is not None:
+        return None
+    return Affine(a.iv, a.scale * factor, a.offset * factor,
+                  tuple((r, c * factor) for r, c in a.terms if c * factor), None)
+
+
+def _constant(a: Affine) -> Opt[int]:
+    if a.iv is None and not a.terms and a.base is None:
+        return a.offset
+    return None
+
+
+def _users(bbs: list['BasicBlock']) -> dict['Symbol', list[tuple['BasicBlock', 'LoweredStat']]]:
+    """The statements using each symbol"""
+    users = {}
+    for bb in bbs:
+        for instr in bb.statements:
+            for u in getattr(instr, 'use_set', ()):
+                users.setdefault(u, []).append((bb, instr))
+    return users
+
+
+def _immediate(val: int, immediates: dict[int, 'Symbol'], stats: list['LoweredStat']) -> 'Symbol':
+    """A register holding val, loaded by a statement added to stats if not in immediates"""
+    val = wrap(val)
+    if val not in immediates:
+        immediates[val] = new_temporary(None, TYPENAMES['int'])
+        stats.append(lwr.LoadImmStat(dest=immediates[val], val=val))
+    return immediates[val]
+
+
+class LoopValues:
+    """
+    The registers of a loop with a known affine value
+    + memory: what the loop writes
+    + defined: how many times each register is defined in the function
+    + constants: the values of the registers defined by LoadImmStat
+    """
+
+    def __init__(self, loop: Loop, bbs: list['BasicBlock']):
+        self.memory = LoopMemory(loop)
+        self.defined: Counter['Symbol'] = Counter()
+        self.constants: dict['Symbol', int] = {}
+        for bb in bbs:
+            for instr in bb.statements:
+                for d in instr.get_defined():
+                    self.defined[d] += 1
+                if type(instr) is lwr.LoadImmStat:
+                    self.constants[instr.dest] = instr.val
+
+    def invariant(self, reg: 'Symbol') -> bool:
+        """Whether reg is defined once, outside of the loop"""
+        return self.defined[reg] == 1 and not self.memory.defined[reg]
+
+    def operand(self, reg: 'Symbol') -> Opt[Affine]:
+        """The value of a register which doesn't change in the loop"""
+        if self.defined[reg] != 1:
+            return None
+        if reg in self.constants:
+            return Affine(None, 0, self.constants[reg], (), None)
+        if self.memory.defined[reg]:
+            return None
+        if isinstance(reg.stype, PointerType):
+            return Affine(None, 0, 0, (), reg)
+        return Affine(None, 0, 0, ((reg, 1),), None)
+
+    def forms(self, bb: 'BasicBlock', ivs) -> tuple[dict['Symbol', Affine], dict['Symbol', int]]:
+        """
+        :param ivs: The variables to consider induction variables
+        :return: The affine values of the registers defined in bb from the
+                 loads of ivs, and the position of the first load each of
+                 them depends on
+        """
+        forms: dict['Symbol', Affine] = {}
+        first_load: dict['Symbol', int] = {}
+        for i, instr in enumerate(bb.statements):
+            typ = type(instr)
+            if typ not in (lwr.LoadStat, lwr.BinStat, lwr.UnaryStat):
+                continue
+            dest = instr.dest
+            if self.memory.defined[dest] != 1 or dest.stype.size != INT_BITS:
+                continue
+            if typ is lwr.LoadStat:
+                if instr.symbol in ivs:
+                    forms[dest] = Affine(instr.symbol, 1, 0, (), None)
+                    first_load[dest] = i
+                continue
+
+            srcs = [instr.srca, instr.srcb] if typ is lwr.BinStat else [instr.src]
+            if all(s not in forms for s in srcs):
+                continue
+            values = [forms.get(s) or self.operand(s) for s in srcs]
+            if None in values:
+                continue
+            form = None
+            if typ is lwr.UnaryStat:
+                if instr.op in ('plus', 'minus'):
+                    form = _multiply(values[0], -1 if instr.op == 'minus' else 1)
+            elif instr.op == 'plus':
+                form = _add(*values)
+            elif instr.op == 'minus':
+                negated = _multiply(values[1], -1)
+                form = _add(values[0], negated) if negated else None
+            elif instr.op == 'times':
+                if _constant(values[1]) is not None:
+                    form = _multiply(values[0], _constant(values[1]))
+                elif _constant(values[0]) is not None:
+                    form = _multiply(values[1], _constant(values[0]))
+            if form is not None and form.scale != 0:
+                forms[dest] = form
+                first_load[dest] = min(first_load[s] for s in srcs if s in forms)
+        return forms, first_load
+
+
+class InductionVariable:
+    """
+    + var: the variable
+    + bb, store: the block of the loop storing it and the store
+    + step: what the store adds to it
+    """
+
+    def __init__(self, var: 'Symbol', bb: 'BasicBlock', store: 'LoweredStat', step: int):
+        self.var = var
+        self.bb = bb
+        self.store = store
+        self.step = step
+
+    def stored_between(self, bb: 'BasicBlock', start: int, end: int) -> bool:
+        """Whether the store is in bb after the statement start and not after end"""
+        return self.bb is bb and start < bb.statements.index(self.store) <= end
+
+
+class StrengthReduction:
+    """
+    + loops: the number of loops found
+    + reduced: the values replaced by a register incremented in the loop
+    + added: the registers incremented in the loops
+    + eliminated: the induction variables eliminated
+    """
+
+    def __init__(self):
+        self.loops = 0
+        self.reduced = 0
+        self.added = 0
+        self.eliminated = 0
+        # How many statements of the program load each variable, and the variables whose address is taken
+        self.reads: Counter['Symbol'] = Counter()
+        self.addressed: set['Symbol'] = set()
+
+    def __call__(self, cfg: 'CFG'):
+        for block in cfg.blocks_in_order():
+            for bb in block.orders().reverse_postorder:
+                for instr in bb.statements:
+                    if type(instr) is lwr.LoadStat and instr.symbol.alloct != 'reg':
+                        self.reads[instr.symbol] += 1
+                    elif type(instr) is lwr.LoadPtrToSymb:
+                        self.addressed.add(instr.symbol)
+        for block in cfg.blocks_in_order():
+            self.function(block)
+
+    def function(self, block: 'LoweredBlock'):
+        dom, loops = loops_with_preheaders(block.entry_bb)
+        if not loops:
+            return
+        self.loops += len(loops)
+        for loop in loops:
+            blocks = [bb for bb in dom.order if bb in loop.body]
+            values = LoopValues(loop, dom.order)
+            if values.memory.calls:
+                continue
+            # Incrementing in an inner loop costs more than what is saved in this one
+            inner = {bb for other in loops if other.parent is loop for bb in other.body}
+            ivs = self.induction_variables(blocks, values, inner)
+            if not ivs:
+                continue
+            # The constants already in the preheader are reused
+            immediates = {instr.val: instr.dest for instr in loop.preheader.statements
+                          if type(instr) is lwr.LoadImmStat and values.defined[instr.dest] == 1
+                          and instr.dest.stype.size == INT_BITS}
+            registers = self.reduce(loop, blocks, dom, values, ivs, immediates)
+            for iv in ivs.values():
+                pointers = [(form, reg) for (form, _), reg in registers.items()
+                            if form.iv is iv.var and form.base is not None]
+                if pointers:
+                    self.eliminate(iv, *pointers[0], loop, blocks, dom, values, immediates)
+            for bb in blocks + [loop.preheader]:
+                bb.compute_gen_kill()
+        remove_empty_preheaders(block.entry_bb, loops)
+
+    def induction_variables(self, blocks: list['BasicBlock'], values: LoopValues,
+                            inner: set['BasicBlock']) -> dict['Symbol', InductionVariable]:
+        """
+        :param inner: The blocks of the loops nested in the loop
+        :return: The basic induction variables of the loop of blocks which are
+                 not stored in inner
+        """
+        stores: dict['Symbol', list[tuple['BasicBlock', 'LoweredStat']]] = {}
+        for bb in blocks:
+            for instr in bb.statements:
+                if type(instr) is lwr.StoreStat and instr.dest.alloct != 'reg':
+                    stores.setdefault(instr.dest, []).append((bb, instr))
+        candidates = dict.fromkeys(v for v, places in stores.items()
+                                   if len(places) == 1 and v.stype.size == INT_BITS and v not in self.addressed)
+        ivs = {}
+        for v in candidates:
+            bb, store = stores[v][0]
+            if bb in inner:
+                continue
+            form = values.forms(bb, candidates)[0].get(store.symbol)
+            if form is not None and form.iv is v and form.scale == 1 and \
+                    not form.terms and form.base is None:
+                ivs[v] = InductionVariable(v, bb, store, form.offset)
+        return ivs
+
+    def reduce(self, loop: Loop, blocks: list['BasicBlock'], dom: Dominators,
+               values: LoopValues, ivs: dict['Symbol', InductionVariable],
+               immediates: dict[int, 'Symbol']) -> dict:
+        """
+        Replace the values computed from the induction variables
+        :return: The registers replacing them, by affine function and type
+        """
+        users = _users(dom.order)
+        replaced: dict[tuple[Affine, 'Type'], list['Symbol']] = {}
+        for bb in blocks:
+            forms, first_load = values.forms(bb, ivs)
+            for reg, form in forms.items():
+                if abs(form.scale) == 1 and form.base is None:
+                    continue  # as cheap to compute as to increment
+                uses = users.get(reg, [])
+                if any(ubb is not bb for ubb, _ in uses):
+                    continue
+                if all(type(u) in (lwr.BinStat, lwr.UnaryStat) and u.dest in forms for _, u in uses):
+                    continue  # only used to compute other values
+                last = max(bb.statements.index(u) for _, u in uses)
+                if ivs[form.iv].stored_between(bb, first_load[reg], last):
+                    continue
+                replaced.setdefault((form, reg.stype), []).append(reg)
+
+        registers = {}
+        initial = []
+        loaded: dict['Symbol', 'Symbol'] = {}
+        for (form, typ), regs in replaced.items():
+            reg = registers[form, typ] = new_temporary(None, typ)
+            for old in regs:
+                for _, u in users[old]:
+                    u.replace_used({old: reg})
+            self.reduced += len(regs)
+            self.added += 1
+
+            iv = ivs[form.iv]
+            if iv.var not in loaded:
+                loaded[iv.var] = new_temporary(None, iv.var.stype)
+                initial.append(lwr.LoadStat(dest=loaded[iv.var], symbol=iv.var, levels=iv.store.levels))
+                self.reads[iv.var] += 1
+            initial.extend(self.materialize(form, loaded[iv.var], reg, immediates))
+            if form.scale * iv.step:
+                step = _immediate(form.scale * iv.step, immediates, initial)
+                iv.bb.statements.insert(iv.bb.statements.index(iv.store) + 1,
+                                        lwr.BinStat(dest=reg, op='plus', srca=reg, srcb=step))
+        loop.preheader.statements.extend(initial)
+        self.remove_dead(blocks, dom)
+        return registers
+
+    def eliminate(self, iv: InductionVariable, form: Affine, pointer: 'Symbol', loop: Loop,
+                  blocks: list['BasicBlock'], dom: Dominators, values: LoopValues,
+                  immediates: dict[int, 'Symbol']):
+        """
+        Compare pointer, which is form of iv, instead of iv and remove its
+        store if the loop reads iv only to compare it and to increment it
+        """
+        # Assigned before each entry: by a block dominating the preheader within the enclosing loop
+        if not any(bb not in loop.body and dom.dominates(bb, loop.preheader) and
+                   (loop.parent is None or bb in loop.parent.body) and
+                   any(type(s) is lwr.StoreStat and s.dest is iv.var for s in bb.statements)
+                   for bb in dom.order):
+            return
+        loads = [(bb, instr) for bb in blocks for instr in bb.statements
+                 if type(instr) is lwr.LoadStat and instr.symbol is iv.var]
+        initial = sum(1 for instr in loop.preheader.statements
+                      if type(instr) is lwr.LoadStat and instr.symbol is iv.var)
+        if len(loads) + initial != self.reads[iv.var]:
+            return  # read somewhere else
+
+        users = _users(dom.order)
+        if [u for _, u in users.get(iv.store.symbol, [])] != [iv.store]:
+            return
+        comparisons = []
+        for bb, load in loads:
+            at = bb.statements.index(load)
+            for ubb, u in users.get(load.dest, []):
+                if u.dest is iv.store.symbol:
+                    continue
+                if ubb is not bb or type(u) is not lwr.BinStat or u.op not in RELATIONS:
+                    return
+                limit = u.srcb if u.srca is load.dest else u.srca
+                if limit is load.dest or not values.invariant(limit):
+                    return
+                if iv.stored_between(bb, at, bb.statements.index(u)):
+                    return
+                comparisons.append((bb, u, limit))
+
+        limits: dict['Symbol', 'Symbol'] = {}
+        for bb, u, limit in comparisons:
+            if limit not in limits:
+                limits[limit] = new_temporary(None, pointer.stype)
+                at = form
+                if limit in values.constants:
+                    at = form._replace(scale=0, offset=form.offset + form.scale * values.constants[limit])
+                loop.preheader.statements.extend(self.materialize(at, limit, limits[limit], immediates))
+            op = u.op if u.srcb is limit else MIRRORED.get(u.op, u.op)
+            if form.scale < 0:
+                op = MIRRORED.get(op, op)
+            new = lwr.BinStat(dest=u.dest, op=op, srca=pointer, srcb=limits[limit])
+            new.set_label(u.get_label())
+            bb.statements[bb.statements.index(u)] = new
+        iv.bb.statements.remove(iv.store)
+        self.remove_dead(blocks, dom)
+        self.eliminated += 1
+
+    def materialize(self, form: Affine, value: 'Symbol', dest: 'Symbol',
+                    immediates: dict[int, 'Symbol']) -> list['LoweredStat']:
+        """
+        :param value: The register holding the value of the induction
+                      variable, not used when the scale of form is 0
+        :param immediates: The registers loaded with constants by the previous
+                           statements, which are reused
+        :return: The statements computing form into dest
+        """
+        stats = []
+        ints = TYPENAMES['int'] if isinstance(dest.stype, PointerType) else dest.stype
+
+        def binary(op: str, a: 'Symbol', b: 'Symbol') -> 'Symbol':
+            res = new_temporary(None, ints)
+            stats.append(lwr.BinStat(dest=res, op=op, srca=a, srcb=b))
+            return res
+
+        def immediate(val: int) -> 'Symbol':
+            return _immediate(val, immediates, stats)
+
+        res = None
+
+        def add(reg: 'Symbol'):
+            nonlocal res
+            res = reg if res is None else binary('plus', res, reg)
+
+        if form.scale:
+            add(value if form.scale == 1 else binary('times', value, immediate(form.scale)))
+        for reg, coef in form.terms:
+            add(reg if coef == 1 else binary('times', reg, immediate(coef)))
+        if form.offset or res is None:
+            add(immediate(form.offset))
+        if form.base is not None:
+            stats.append(lwr.BinStat(dest=dest, op='plus', srca=form.base, srcb=res))
+        else:
+            # There is at least the multiplication, its result goes to dest
+            last = stats.pop()
+            stats.append(lwr.BinStat(dest=dest, op=last.op, srca=last.srca, srcb=last.srcb))
+        return stats
+
+    def remove_dead(self, blocks: list['BasicBlock'], dom: Dominators):
+        """Remove the statements of blocks which define registers no longer used"""
+        uses: Counter['Symbol'] = Counter()
+        for bb in dom.order:
+            for instr in bb.statements:
+                uses.update(getattr(instr, 'use_set', ()))
+        changed = True
+        while changed:
+            changed = False
+            for bb in blocks:
+                kept = []
+                for instr in reversed(bb.statements):
+                    if type(instr) in HOISTABLE and instr.label is None and uses[instr.dest] == 0 and \
+                            not (type(instr) is lwr.BinStat and instr.op == 'slash'):
+                        uses.subtract(getattr(instr, 'use_set', ()))
+                        if type(instr) is lwr.LoadStat and instr.symbol.alloct != 'reg':
+                            self.reads[instr.symbol] -= 1
+                        changed = True
+                    else:
+                        kept.append(instr)
+                kept.reverse()
+                bb.statements = kept
+
+    def report(self) -> str:
+        return f'strength reduction: {self.reduced} values replaced by {self.added} registers ' \
+               f'incremented in {self.loops} loops, {self.eliminated} induction variables eliminated'
+
+
+def reduce_strength(cfg: 'CFG') -> StrengthReduction:
+    """
+    Strength reduction of the induction variables on every function of cfg
+    :return: The pass, with the statistics
+    """
+    sr = StrengthReduction()
+    sr(cfg)
+    return sr
@@ -0,0 +1,174 @@
+"""
+Local value numbering on the basic blocks of the CFG
+
+Within a block a statement computing a value which is already held by a
+register is removed and the register it defined is renamed to the one holding
+the value in the whole function. Temporaries are defined once and only after
+the statements they depend on, the register holding the value is defined
+before every use of the removed one.
+
+The values are keyed by the operation and the registers of the operands, after
+renaming, so equal expressions get the same key:
++ BinStat, UnaryStat and LoadImmStat by operation and operands, the operands of
+  the commutative operators in any order
++ LoadPtrToSymb by symbol, the address of a variable doesn't change
++ LoadStat of a variable by variable and of a pointer by the register of the
+  pointer. The value of a store is also known as the value of the variable or
+  of the pointed memory, unless the store truncates it.
+
+Memory values are invalidated by the statements defining memory: a store to a
+variable invalidates the variable, a store through a pointer all the pointed
+values and a call to a procedure everything in memory, since procedures can
+assign the variables of the enclosing blocks. Calls to the read and print
+builtins don't access the variables.
+"""
+from typing import Optional as Opt
+
+import src.Codegen.Lowered as lwr
+from src.Symbols.Symbols import PrintFun, ReadFun
+from src.utils.Arithmetic import COMMUTATIVE, same_representation
+
+BUILTINS = (PrintFun, ReadFun)
+
+
+def _registers(key: tuple) -> set['Symbol']:
+    """The registers a value depends on"""
+    regs = set()
+    for part in key[1:]:
+        if isinstance(part, (tuple, frozenset)):
+            regs.update(part)
+        elif getattr(part, 'alloct', None) == 'reg':
+            regs.add(part)
+    return regs
+
+
+class ValueNumbering:
+    """
+    + eliminated: the number of statements removed from each basic block
+    """
+
+    def __init__(self):
+        self.eliminated: dict['BasicBlock', int] = {}
+
+    def __call__(self, cfg: 'CFG'):
+        for block in cfg.blocks_in_order():
+            self.function(block)
+
+    def function(self, block: 'LoweredBlock', only: Opt[list['BasicBlock']] = None):
+        """
+        :param only: The basic blocks to number, all the blocks of the function if None.
+                     Registers are renamed in all of them anyway
+        """
+        renamed: dict['Symbol', 'Symbol'] = {}
+        bbs = block.orders().reverse_postorder
+        for bb in (bbs if only is None else only):
+            removed = self.basic_block(bb, renamed)
+            if removed:
+                self.eliminated[bb] = removed
+        if not renamed:
+            return
+        for bb in bbs:
+            changed = bb in self.eliminated
+            for instr in bb.statements:
+                if not renamed.keys().isdisjoint(getattr(instr, 'use_set', ())):
+                    instr.replace_used(renamed)
+                    changed = True
+            if changed:
+                bb.compute_gen_kill()
+
+    @staticmethod
+    def key(instr: 'LoweredStat', renamed: dict['Symbol', 'Symbol']) -> Opt[tuple]:
+        """The value computed by instr, None if it doesn't compute a value"""
+        typ = type(instr)
+        if typ is lwr.BinStat:
+            srca = renamed.get(instr.srca, instr.srca)
+            srcb = renamed.get(instr.srcb, instr.srcb)
+            operands = frozenset((srca, srcb)) if instr.op in COMMUTATIVE else (srca, srcb)
+            return 'bin', instr.op, operands, instr.dest.stype
+        elif typ is lwr.UnaryStat:
+            return 'unary', instr.op, renamed.get(instr.src, instr.src), instr.dest.stype
+        elif typ is lwr.LoadImmStat:
+            return 'imm', instr.val, instr.dest.stype
+        elif typ is lwr.LoadPtrToSymb:
+            return 'addr', instr.symbol
+        elif typ is lwr.LoadStat:
+            if instr.symbol.alloct == 'reg':
+                return 'deref', renamed.get(instr.symbol, instr.symbol), instr.dest.stype
+            return 'load', instr.symbol, instr.dest.stype
+        return None
+
+    def basic_block(self, bb: 'BasicBlock', renamed: dict['Symbol', 'Symbol']) -> int:
+        """
+        Number the values of a block, registers to rename are added to renamed
+        :return: The number of statements removed
+        """
+        values: dict[tuple, 'Symbol'] = {}
+        registers: set['Symbol'] = set()  # the registers in the keys and values
+        kept = []
+        for instr in bb.statements:
+            key = self.key(instr, renamed)
+            if key is not None and instr.label is None and instr.dest.alloct == 'reg':
+                holder = values.get(key)
+                if holder is not None:
+                    renamed[instr.dest] = holder
+                    continue
+            kept.append(instr)
+
+            self.invalidate(instr, values, registers, renamed)
+            if key is not None:
+                values[key] = instr.dest
+                registers.update(_registers(key))
+                registers.add(instr.dest)
+            elif type(instr) is lwr.StoreStat:
+                src = renamed.get(instr.symbol, instr.symbol)
+                if instr.dest.alloct == 'reg':
+                    memory_type = instr.dest.stype.pointed_type
+                    key = 'deref', renamed.get(instr.dest, instr.dest), memory_type
+                else:
+                    memory_type = instr.dest.stype
+                    key = 'load', instr.dest, memory_type
+                if same_representation(src.stype, memory_type):
+                    values[key] = src
+                    registers.update(_registers(key))
+                    registers.add(src)
+
+        removed = len(bb.statements) - len(kept)
+        bb.statements = kept
+        return removed
+
+    @staticmethod
+    def invalidate(instr: 'LoweredStat', values: dict[tuple, 'Symbol'], registers: set['Symbol'],
+                   renamed: dict['Symbol', 'Symbol']):
+        """Forget the values instr changes"""
+        typ = type(instr)
+        if typ is lwr.StoreStat:
+            if instr.dest.alloct == 'reg':
+                stale = [k for k in values if k[0] == 'deref']
+            else:
+                stale = [k for k in values if k[0] == 'load' and k[1] is instr.dest]
+        elif typ is lwr.BranchStat and instr.rets and instr.target not in BUILTINS:
+            stale = [k for k in values if k[0] in ('load', 'deref')]
+        else:
+            # A register defined again, values computed from it or held by it are stale
+            defined = {renamed.get(d, d) for d in instr.get_defined()} & registers
+            if not defined:
+                return
+            stale = [k for k, h in values.items()
+                     if h in defined or not defined.isdisjoint(_registers(k))]
+        for k in stale:
+            del values[k]
+
+    def report(self) -> str:
+        blocks = sorted(self.eliminated.values(), reverse=True)
+        return f'value numbering: {sum(blocks)} statements eliminated in {len(blocks)} blocks, ' \
+               f'at most {blocks[0] if blocks else 0} in a block'
+
+
+def number_values(cfg: 'CFG') -> ValueNumbering:
+    """
+    Local value numbering of every basic block of cfg
+    :return: The pass, with the statistics
+    """
+    lvn = ValueNumbering()
+    lvn(cfg)
+    return lvn
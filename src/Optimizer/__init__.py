@@ -0,0 +1,4 @@
+from . import ConstFold, ValueNumbering, LICM, StrengthReduction, DeadCode, Inlining, Propagation
+"""
+Optimizations of the program, the passes on the IR run before lowering
+"""
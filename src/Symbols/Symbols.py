@@ -1,4 +1,5 @@
 from functools import reduce
+from typing import Optional as Opt
 
 import src
 from MixedTrees.src.MixedTrees import MixedTree
@@ -16,14 +17,33 @@ class SymbolTable:
 
     Each table has a level starting with 0 for the global one and increasing
     as the distance from the global symbol table
+
+    Symbols are kept in declaration order in `lst` and indexed by name in
+    `index`. Names resolved in an enclosing table are cached in `outer`, the
+    cache is dropped whenever a symbol is added anywhere in the chain (tracked
+    by the epoch of the global table), which only happens while parsing
+    declarations
     """
     def __init__(self, *args, parent=None):
         self.lst = list(args)
+        self.index: dict[str, 'Symbol'] = {}
+        for s in self.lst:
+            self.index.setdefault(s.name, s)
         self.par = parent
         if self.par is None:
             self.lvl = 0
+            self.glob = self
         else:
             self.lvl = self.par.lvl + 1
+            self.glob = self.par.glob
+
+        self.outer: dict[str, tuple['Symbol', int]] = {}
+        self.outer_epoch = 0
+        self.epoch = 0  # only used by the global table
+
+        # Cached by the global table, reset whenever a symbol is added to it
+        self._global_symbols: Opt[tuple['Symbol', ...]] = None
+        self._global_symbol_set: Opt[frozenset['Symbol']] = None
 
     def append(self, symb: 'Symbol'):
         if symb.level is not None:
@@ -31,24 +51,54 @@ class SymbolTable:
         symb.set_level(self.lvl)
         symb.level = self.lvl
         self.lst.append(symb)
-
-    def lookup(self, targ: str, direct=True):
+        self.index.setdefault(symb.name, symb)  # the first definition wins
+        self.glob.epoch += 1
+        if self.lvl == 0:
+            self._global_symbols = None
+            self._global_symbol_set = None
+
+    def remove(self, symbols: set['Symbol']):
+        """Remove symbols from the table, a name they hid resolves to the symbol defined next"""
+        self.lst = [s for s in self.lst if s not in symbols]
+        self.index = {}
         for s in self.lst:
-            if s.name == targ:
-                if direct:
-                    return s
-                if self.lvl == 0:
-                    return s  # global vars
-                else:
-                    return s # TODO should I handle them differently?
-                    raise NotImplementedError("Need to implement properly indirect "
-                                              "lookup so that the symbol knows it "
-                                              "references a different stack frame "
-                                              "during codegen")
-        if self.par is not None:
-            return self.par.lookup(targ, direct=False)
+            self.index.setdefault(s.name, s)
+        self.glob.epoch += 1
+        if self.lvl == 0:
+            self._global_symbols = None
+            self._global_symbol_set = None
+
+    def resolve(self, targ: str) -> tuple[Opt['Symbol'], int]:
+        """
+        Find the symbol with the given name in this table or in the closest
+        enclosing one
+        :return: the symbol and the nesting distance between this table and the
+                 table defining it (0 for local symbols), None and -1 if not found
+        """
+        s = self.index.get(targ)
+        if s is not None:
+            return s, 0
+
+        if self.outer_epoch != self.glob.epoch:
+            self.outer = {}
+            self.outer_epoch = self.glob.epoch
+        elif (found := self.outer.get(targ)) is not None:
+            return found
+
+        table = self.par
+        dist = 1
+        while table is not None:
+            s = table.index.get(targ)
+            if s is not None:
+                self.outer[targ] = (s, dist)
+                return s, dist
+            table = table.par
+            dist += 1
         print(f"Lookup for {targ} failed in {self}")
-        return None
+        return None, -1
+
+    def lookup(self, targ: str) -> Opt['Symbol']:
+        return self.resolve(targ)[0]
 
     def create_local(self) -> 'SymbolTable':
         return SymbolTable(parent=self)
@@ -57,23 +107,29 @@ class SymbolTable:
         return iter(self.lst[:])
 
     def get_global(self) -> 'SymbolTable':
-        v = self
-        while v.lvl != 0:
-            v = v.par
-        return v
+        return self.glob
 
-    def get_global_symbols(self):
-        g = self.get_global()
-        syms = []
+    def get_global_symbols(self) -> tuple['Symbol', ...]:
+        """
+        :return: The global variables, in declaration order
+        """
+        g = self.glob
+        if g._global_symbols is None:
+            g._global_symbols = tuple(s for s in g.lst
+                                      if s.stype not in [TYPENAMES['function'], TYPENAMES['label']]
+                                      and s.alloct != 'const')
+        return g._global_symbols
 
-        s: Symbol
-        for s in g:
-            if s.stype not in [TYPENAMES['function'], TYPENAMES['label']]:
-                syms.append(s)
-        return syms
+    def get_global_symbol_set(self) -> frozenset['Symbol']:
+        g = self.glob
+        if g._global_symbol_set is None:
+            g._global_symbol_set = frozenset(self.get_global_symbols())
+        return g._global_symbol_set
 
 
 class Type:
+    __slots__ = ('qual_list', 'size', 'basetype', 'name')
+
     def __init__(self, name, size, basetype, qualifiers=None):
         """
 
@@ -104,6 +160,8 @@ class Type:
 
 
 class LabelType(Type):
+    __slots__ = ('ids',)
+
     def __init__(self):
         super().__init__('label', 0, 'Label', [])
         self.ids = 0
@@ -112,13 +170,21 @@ class LabelType(Type):
         self.ids += 1
         return Symbol(name='label_' + repr(self.ids), stype=self, value=target)
 
+    def reset(self):
+        """Restart the numbering of labels, see IRUtils.reset_temporaries"""
+        self.ids = 0
+
 
 class FunctionType(Type):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__('function', 0, 'Function', [])
 
 
 class ArrayType(Type):
+    __slots__ = ('dims',)
+
     def __init__(self, name, dims, basetype: Type):
         self.dims = dims
         super().__init__(name,
@@ -127,6 +193,8 @@ class ArrayType(Type):
 
 
 class PointerType(Type):
+    __slots__ = ('pointed_type',)
+
     def __init__(self, ptr_to: Type):
         super().__init__('&' + ptr_to.name, 32, 'Int', ['unsigned'])
         self.pointed_type = ptr_to
@@ -144,6 +212,28 @@ TYPENAMES = {
     'function': FunctionType(),
 }
 
+# Types of temporaries, each is created once and shared by all the temporaries
+# of that type instead of creating one for each temporary
+_int_types: dict[tuple[int, bool], Type] = {}
+_pointer_types: dict[Type, PointerType] = {}
+
+
+def int_type(size: int, unsigned=False) -> Type:
+    """
+    :return: The unnamed integer type with the given size in bits
+    """
+    t = _int_types.get((size, unsigned))
+    if t is None:
+        t = _int_types[(size, unsigned)] = Type(None, size, 'Int', ['unsigned'] if unsigned else [])
+    return t
+
+
+def pointer_to(ptr_to: Type) -> PointerType:
+    t = _pointer_types.get(ptr_to)
+    if t is None:
+        t = _pointer_types[ptr_to] = PointerType(ptr_to)
+    return t
+
 
 class Symbol(MixedTree, Codegen):
     """
@@ -155,12 +245,14 @@ class Symbol(MixedTree, Codegen):
     + a name
     + an stype denoting the type of the value it represents
     + a value (not sure the function)
-    + an allocation type
+    + an allocation type, 'const' for the constants, which have no storage
+      and are replaced by their value
     + an allocation info object describing its location in memory
     + a level representing the level of the symbol table it was defined in
 
     """
     # Mixed tree as a base class is necessary since it's a node of a tree
+    __slots__ = ('name', 'stype', 'value', 'alloct', 'allocinfo', 'level')
 
     def __init__(self, name, stype, value=None, alloct='auto'):
         self.name = name
@@ -277,6 +369,8 @@ class RegisterSymb(Symbol):
     """
     A class specific for register temporaries
     """
+    __slots__ = ()
+
     def set_level(self, lvl):
         raise NotImplementedError("Trying to bind a register symbol to symtab")
 
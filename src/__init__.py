@@ -1 +1 @@
-from . import IR, Codegen, Allocator, ControlFlow, utils, Symbols
+from . import IR, Codegen, Allocator, ControlFlow, utils, Symbols, Optimizer
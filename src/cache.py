@@ -0,0 +1,193 @@
+"""
+Content addressed on-disk cache of compilation artifacts
+
+Artifacts are stored under a key derived from the source, the compiler options
+and the versions of the passes that produced them: changing any of them gives
+a new key so stale artifacts are never read, they just age out of the cache.
+
+Several processes can share a cache directory, every file is written to a
+temporary name and then renamed. The least recently used artifacts are removed
+by `trim` once the directory grows beyond its size limit, reading an artifact
+updates its modification time which is used as the time of last use.
+Temporary files are left alone by `trim` until they are older than TMP_GRACE,
+another process may still be writing them.
+
+An artifact which can't be decoded, truncated by a crash or pickled by another
+version of the compiler, is discarded with `invalidate` and counts as a miss.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+from typing import Optional as Opt
+
+# Bump the version of a pass whenever its output changes for the same input,
+# this invalidates all the artifacts it contributed to
+PASS_VERSIONS = {
+    'lexer': 2,
+    'parser': 2,
+    'constfold': 1,
+    'lowering': 2,
+    'layout': 2,
+    'cfg': 2,
+    'inlining': 1,
+    'valuenumbering': 1,
+    'licm': 2,
+    'strength': 1,
+    'propagation': 1,
+    'deadcode': 2,
+    'regalloc': 3,
+    'codegen': 4,
+}
+
+# The passes each kind of artifact depends on
+ARTIFACT_PASSES = {
+    'tokens': ['lexer'],
+    'lowered': ['lexer', 'parser', 'constfold', 'lowering', 'layout', 'cfg', 'inlining', 'valuenumbering', 'licm', 'strength', 'propagation', 'deadcode'],
+    'asm': list(PASS_VERSIONS),
+}
+
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+HASH_WINDOW = 1 << 16
+# Seconds after which a temporary file is assumed to be left over by a process
+# which died while writing it
+TMP_GRACE = 3600
+
+
+def source_digest(path: str) -> str:
+    """The hash of a source file, read a window at a time"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_WINDOW):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    """
+    + directory: where the artifacts are stored
+    + max_bytes: the size `trim` reduces the cache to
+    + hits, misses, stores, evicted: counters for the report, for this
+      process only
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evicted = 0
+
+    @staticmethod
+    def key(digest: str, kind: str, options: Opt[dict] = None) -> str:
+        """
+        :param digest: The hash of the source, see source_digest
+        :param kind: The kind of artifact, one of ARTIFACT_PASSES
+        :param options: The compiler options which affect the artifact
+        """
+        versions = {p: PASS_VERSIONS[p] for p in ARTIFACT_PASSES[kind]}
+        h = hashlib.sha256(digest.encode())
+        h.update(json.dumps([kind, versions, options or {}], sort_keys=True).encode())
+        return h.hexdigest()
+
+    def _path(self, key: str, kind: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}.{kind}')
+
+    def get(self, key: str, kind: str) -> Opt[bytes]:
+        path = self._path(key, kind)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass  # trimmed by another process in the meantime, the data is still good
+        self.hits += 1
+        return data
+
+    def put(self, key: str, kind: str, data: bytes):
+        path = self._path(key, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        self.stores += 1
+
+    def invalidate(self, key: str, kind: str):
+        """Remove an artifact returned by `get` which turned out to be unusable, it counts as a miss"""
+        try:
+            os.unlink(self._path(key, kind))
+        except FileNotFoundError:
+            pass
+        self.hits -= 1
+        self.misses += 1
+
+    def get_object(self, key: str, kind: str):
+        data = self.get(key, kind)
+        if data is None:
+            return None
+        try:
+            return pickle.loads(data)
+        except Exception:  # unpickling can fail with about any exception
+            self.invalidate(key, kind)
+            return None
+
+    def put_object(self, key: str, kind: str, obj):
+        self.put(key, kind, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def entries(self) -> list[tuple[float, int, str]]:
+        """:return: (last use, size, path) of every artifact"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for f in files:
+                path = os.path.join(root, f)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def trim(self) -> int:
+        """
+        Remove the least recently used artifacts until the cache is within max_bytes,
+        temporary files younger than TMP_GRACE are being written and are kept
+        :return: The size of the cache after trimming
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        stale = time.time() - TMP_GRACE
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path.endswith('.tmp') and mtime > stale:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evicted += 1
+        return total
+
+    def report(self) -> str:
+        return f'cache: {self.hits} hits, {self.misses} misses, {self.stores} stored, ' \
+               f'{self.evicted} evicted'
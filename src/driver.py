@@ -0,0 +1,341 @@
+"""
+The compilation pipeline: front end, lowering, CFG construction and the per
+function back end (liveness, register allocation, layout and code emission)
+
+The back end treats each function as an independent unit, it can run either
+serially or over a pool of worker processes. In both cases each function is
+allocated and emitted on its own and the code is concatenated in the order
+given by `CFG.blocks_in_order`, so the output of the two paths is the same
+"""
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from typing import Optional as Opt
+
+import src
+import src.parser as parser
+from src.Allocator.GraphColoring import GraphColoringRegAlloc
+from src.Allocator.LinearScan import IntervalScanRegAlloc
+from src.Allocator.Regalloc import AllocInfo
+from src.cache import ArtifactCache, source_digest
+from src.Codegen.Code import Code
+from src.IR.IRUtils import reset_temporaries
+from src.ControlFlow import Serialization
+from src.ControlFlow.CFG import CFG
+from src.ControlFlow.CodeContainers import LoweredBlock
+from src.Optimizer.ConstFold import fold_constants
+from src.Optimizer.DeadCode import eliminate_dead_code
+from src.Optimizer.Inlining import inline_procedures
+from src.Optimizer.LICM import hoist_invariants
+from src.Optimizer.Propagation import propagate
+from src.Optimizer.StrengthReduction import reduce_strength
+from src.Optimizer.ValueNumbering import number_values
+from src.Symbols.Symbols import TYPENAMES
+from src.lexer import Lexer, TokenStream
+from src.tableparser import TableParser
+from src.utils.Exceptions import SerializationException
+
+PARSERS = {
+    'classic': lambda lex: parser.Program(lex).parse(),
+    'table': lambda lex: TableParser(lex).parse(),
+}
+
+NREGS = 6
+
+# 0 compiles the program as it is written, 1 folds constant expressions,
+# removes the values computed again in a basic block and the dead code, 2 also
+# inlines the small leaf procedures, moves the loop invariant statements out of
+# the loops, reduces the strength of their induction variables and propagates
+# the constants and the copies on the SSA form of the registers and allocates the
+# registers by coloring their interference graph instead of the linear scan
+OPT_LEVEL = 2
+
+
+def lower_func(obj, log, errs):
+    if not isinstance(obj, src.IR.IR.IRNode):
+        errs.append(obj)
+        return None
+    low = obj.lower()
+    log.append((obj, low))
+    return low
+
+
+def front_end(lex, parser_name='classic', optimize=OPT_LEVEL) -> 'LoweredBlock':
+    """
+    Parse, optimize and lower the program, then lay out its variables
+    :param lex: The Lexer or TokenStream of the source
+    :param parser_name: One of PARSERS
+    :param optimize: The optimization level, see OPT_LEVEL
+    """
+    prog = PARSERS[parser_name](lex)
+    if optimize >= 1:
+        fold_constants(prog)
+    log = []
+    errs = []
+    prog.mxdt_navigate(lower_func, log, errs)
+    prog: LoweredBlock = prog.lowered
+    prog.perform_data_layout()
+    return prog
+
+
+def allocate_function(cfg: 'CFG', block: 'LoweredBlock', nregs=NREGS, optimize=OPT_LEVEL) -> AllocInfo:
+    """
+    Liveness and register allocation for the blocks of a single function, the
+    coloring spills fewer registers used in the loops but takes longer
+    """
+    cfg.function_liveness(block)
+    allocator = GraphColoringRegAlloc if optimize >= 2 else IntervalScanRegAlloc
+    return allocator(nregs, lambda _: block.orders().layout)(cfg)
+
+
+def emit_function(block: 'LoweredBlock', layout: 'StackLayout', allocinfo: AllocInfo) -> list[str]:
+    code = Code()
+    code.set_ident(1)
+    block.emit_body(code, layout=layout, regalloc=allocinfo)
+    return code.lines
+
+
+def prepare_layouts(cfg: 'CFG', allocs: dict['LoweredBlock', AllocInfo]) -> dict['LoweredBlock', 'StackLayout']:
+    """
+    Prepare the stack layout of every function, the layout of a function depends
+    on the layout of the function defining it
+    """
+    layouts = {}
+
+    def visit(block: 'LoweredBlock', parent: Opt['StackLayout']):
+        layouts[block] = block.prepare_layout(layout=parent, allocinfo=allocs[block])
+        for defun in block.defs.lst:
+            visit(defun.body, layouts[block])
+
+    visit(cfg.global_block, None)
+    return layouts
+
+
+def assemble(cfg: 'CFG', bodies: list[list[str]]) -> Code:
+    """
+    Put together the global declarations and the code of every function
+    :param bodies: The code of the functions, in the order of `cfg.blocks_in_order`
+    """
+    code = Code()
+    cfg.global_block.emit_globals(code)
+    for lines in bodies:
+        code.lines.extend(lines)
+    return code
+
+
+def back_end(cfg: 'CFG', nregs=NREGS, optimize=OPT_LEVEL) -> Code:
+    blocks = cfg.blocks_in_order()
+    allocs = {b: allocate_function(cfg, b, nregs, optimize) for b in blocks}
+    layouts = prepare_layouts(cfg, allocs)
+    return assemble(cfg, [emit_function(b, layouts[b], allocs[b]) for b in blocks])
+
+
+# State shared with the worker processes of parallel_back_end, they are forked
+# after it is set so they inherit it instead of receiving it through pipes
+_shared: dict = {}
+
+
+def _allocate_worker(idx: int) -> tuple[dict[str, int], int]:
+    cfg = _shared['cfg']
+    alloc = allocate_function(cfg, _shared['blocks'][idx], _shared['nregs'], _shared['optimize'])
+    # Symbols are compared by identity, the parent maps the names back to its objects
+    return {var.name: reg for var, reg in alloc.var_to_reg.items()}, alloc.numspill
+
+
+def _emit_worker(idx: int) -> list[str]:
+    block = _shared['blocks'][idx]
+    return emit_function(block, _shared['layouts'][block], _shared['allocs'][block])
+
+
+def _register_symbols(block: 'LoweredBlock') -> dict[str, 'Symbol']:
+    names = {}
+    for _, instr in block.statements():
+        for var in instr.get_used() | instr.get_defined():
+            if var.alloct == 'reg':
+                names[var.name] = var
+    return names
+
+
+def parallel_back_end(cfg: 'CFG', jobs: int, nregs=NREGS, optimize=OPT_LEVEL) -> Code:
+    """
+    Same as `back_end` with the liveness, register allocation and code emission of
+    the functions distributed over `jobs` worker processes. The layouts are
+    prepared in this process between the two parallel phases.
+    Needs the fork start method, without it the back end runs serially
+    """
+    if jobs <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return back_end(cfg, nregs, optimize)
+
+    blocks = cfg.blocks_in_order()
+    ctx = multiprocessing.get_context('fork')
+    _shared.update(cfg=cfg, blocks=blocks, nregs=nregs, optimize=optimize)
+    try:
+        with ctx.Pool(jobs) as pool:
+            results = pool.map(_allocate_worker, range(len(blocks)))
+
+        allocs = {}
+        for block, (regs, numspill) in zip(blocks, results):
+            names = _register_symbols(block)
+            allocs[block] = AllocInfo({names[n]: r for n, r in regs.items()}, numspill, nregs)
+        layouts = prepare_layouts(cfg, allocs)
+
+        _shared.update(allocs=allocs, layouts=layouts)
+        with ctx.Pool(jobs) as pool:
+            bodies = pool.map(_emit_worker, range(len(blocks)))
+    finally:
+        _shared.clear()
+    return assemble(cfg, bodies)
+
+
+def build_cfg(lex, parser_name='classic', optimize=OPT_LEVEL) -> CFG:
+    # Names of temporaries and labels only depend on the program being compiled
+    reset_temporaries()
+    TYPENAMES['label'].reset()
+
+    cfg = CFG(front_end(lex, parser_name, optimize))
+    if optimize >= 2:
+        inliner = inline_procedures(cfg)
+    if optimize >= 1:
+        number_values(cfg)
+    if optimize >= 2:
+        hoist_invariants(cfg)
+        reduce_strength(cfg)
+        propagate(cfg)
+    if optimize >= 1:
+        eliminate_dead_code(cfg)
+    if optimize >= 2:
+        inliner.remove_unused_variables(cfg)
+    return cfg
+
+
+def generate(cfg: 'CFG', jobs=1, nregs=NREGS, optimize=OPT_LEVEL) -> Code:
+    if jobs > 1:
+        return parallel_back_end(cfg, jobs, nregs, optimize)
+    return back_end(cfg, nregs, optimize)
+
+
+def compile_program(lex, parser_name='classic', jobs=1, nregs=NREGS, optimize=OPT_LEVEL) -> Code:
+    return generate(build_cfg(lex, parser_name, optimize), jobs, nregs, optimize)
+
+
+def compile_cached(source: str, cache: ArtifactCache, parser_name='classic', jobs=1,
+                   nregs=NREGS, optimize=OPT_LEVEL) -> tuple[list[str], bool]:
+    """
+    Compile a file going through the cache, reusing the latest artifact which
+    is still valid: the assembly if the source and all the options are unchanged,
+    the lowered program (see Serialization) if only the back end options changed
+    and the token stream if only the source is unchanged. Artifacts which can't
+    be decoded are removed and rebuilt
+    :return: The lines of assembly and whether they came from the cache
+    """
+    digest = source_digest(source)
+    asm_key = cache.key(digest, 'asm', {'parser': parser_name, 'nregs': nregs, 'optimize': optimize})
+    asm = cache.get(asm_key, 'asm')
+    if asm is not None:
+        try:
+            return asm.decode().split('\n'), True
+        except UnicodeDecodeError:
+            cache.invalidate(asm_key, 'asm')
+
+    low_key = cache.key(digest, 'lowered', {'parser': parser_name, 'optimize': optimize,
+                                            'format': Serialization.FORMAT_VERSION})
+    lowered = cache.get(low_key, 'lowered')
+    if lowered is not None:
+        try:
+            prog, _ = Serialization.loads(lowered)
+        except SerializationException:
+            cache.invalidate(low_key, 'lowered')
+            lowered = None
+        else:
+            cfg = CFG(prog)
+    if lowered is None:
+        tok_key = cache.key(digest, 'tokens')
+        tokens = cache.get_object(tok_key, 'tokens')
+        if tokens is None:
+            tokens = TokenStream.from_lexer(Lexer.from_file(source))
+            cache.put_object(tok_key, 'tokens', tokens)
+        cfg = build_cfg(tokens, parser_name, optimize)
+        cache.put(low_key, 'lowered', Serialization.dumps(cfg.global_block))
+
+    code = generate(cfg, jobs, nregs, optimize)
+    cache.put(asm_key, 'asm', '\n'.join(code.lines).encode())
+    return code.lines, False
+
+
+FileResult = namedtuple("FileResult", ["source", "output", "seconds", "error", "cached"],
+                        defaults=[False])
+FileResult.__doc__ = """The outcome of compiling one file in a batch,
+`error` is None if the compilation succeeded and `cached` is True if the
+assembly came from the cache"""
+
+SOURCE_SUFFIX = '.pl0'
+
+
+def find_sources(paths: list[str]) -> list[str]:
+    """
+    :param paths: Files and directories, directories are searched recursively
+                  for files ending in SOURCE_SUFFIX
+    :return: The source files, files found in the same directory are sorted
+    """
+    sources = []
+    for path in paths:
+        if not os.path.isdir(path):
+            sources.append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            sources.extend(os.path.join(root, f) for f in sorted(files) if f.endswith(SOURCE_SUFFIX))
+    return sources
+
+
+def compile_file(source: str, parser_name='classic', nregs=NREGS, cache_dir: Opt[str] = None,
+                 optimize=OPT_LEVEL) -> FileResult:
+    """
+    Compile a file writing the assembly next to it, with the suffix replaced by .s
+    :param cache_dir: The directory of the ArtifactCache to use, if any
+    """
+    output = os.path.splitext(source)[0] + '.s'
+    start = time.perf_counter()
+    cached = False
+    try:
+        if cache_dir is None:
+            lines = compile_program(Lexer.from_file(source), parser_name, nregs=nregs, optimize=optimize).lines
+        else:
+            lines, cached = compile_cached(source, ArtifactCache(cache_dir), parser_name, nregs=nregs,
+                                           optimize=optimize)
+        with open(output, 'w') as f:
+            f.write('\n'.join(lines))
+            f.write('\n')
+    except Exception as e:
+        return FileResult(source, None, time.perf_counter() - start, f'{type(e).__name__}: {e}')
+    return FileResult(source, output, time.perf_counter() - start, None, cached)
+
+
+def _compile_file_worker(args) -> FileResult:
+    return compile_file(*args)
+
+
+def compile_batch(sources: list[str], jobs=1, parser_name='classic', nregs=NREGS,
+                  tasks_per_worker=64, cache_dir: Opt[str] = None, optimize=OPT_LEVEL):
+    """
+    Compile many files over a pool of `jobs` worker processes, each worker pays
+    the startup and import cost once and compiles many files.
+    Files are handed out one at a time and a worker is replaced after
+    `tasks_per_worker` files, which bounds the memory a worker can accumulate
+    :return: A generator of FileResult in the order the compilations complete
+    """
+    tasks = [(s, parser_name, nregs, cache_dir, optimize) for s in sources]
+    if jobs <= 1:
+        for task in tasks:
+            yield _compile_file_worker(task)
+        return
+
+    with multiprocessing.Pool(jobs, maxtasksperchild=tasks_per_worker) as pool:
+        for res in pool.imap_unordered(_compile_file_worker, tasks, chunksize=1):
+            yield res
+
+
+if __name__ == '__main__':
+    Symbol = src.Symbols.Symbols.Symbol
+    StackLayout = src.Codegen.FrameUtils.StackLayout
@@ -1,4 +1,10 @@
 #!/usr/bin/env python3
+import codecs
+import mmap
+import os
+import re
+import sys
+from array import array
 from typing import Optional
 
 from src.utils.Exceptions import LexerException
@@ -46,63 +52,121 @@ TOKEN_DEFS = {
 }
 
 
+KEYWORDS = {s: t for t, ss in TOKEN_DEFS.items() for s in ss if s.isalpha()}
+SYMBOLS = sorted([(s, t) for t, ss in TOKEN_DEFS.items() for s in ss if not s.isalpha()],
+                 key=lambda a: -len(a[0]))
+
+# A single pattern built once from TOKEN_DEFS: every alternative is tried at the
+# same position by the regex engine, longer symbols first so that ':=' wins over ':'.
+# Keywords are matched as words and then looked up in KEYWORDS.
+MASTER_PATTERN = re.compile('|'.join([
+    r'(?P<skip>(?:\s+|\{[^}]*\}?)+)',  # whitespace and (possibly unterminated) comments
+    r'(?P<number>[0-9]+)',
+    r'(?P<word>\w+)',
+    '(?P<symbol>' + '|'.join(re.escape(s) for s, _ in SYMBOLS) + ')',
+    r'(?P<illegal>.)'
+]))
+SYMBOL_TOKENS = dict(SYMBOLS)
+WINDOW_SIZE = 1 << 16  # bytes read at a time when streaming from a file
+
+
 class Lexer:
     """The lexer. Decomposes a string in tokens."""
 
     def __init__(self, text):
         self.text = text
-        self.pos = 0
-        self.str_to_token = list([(s, t) for t, ss in TOKEN_DEFS.items() for s in ss])
-        self.str_to_token.sort(key=lambda a: -len(a[0]))
-
-    def skip_whitespace(self):
-        in_comment = False
-        while self.pos < len(self.text) and (self.text[self.pos].isspace() or self.text[self.pos] == '{' or in_comment):
-            if self.text[self.pos] == '{' and not in_comment:
-                in_comment = True
-            elif in_comment and self.text[self.pos] == '}':
-                in_comment = False
-            self.pos += 1
-
-    def check_symbol(self):
-        for s, t in self.str_to_token:
-            if self.text[self.pos:self.pos + len(s)].lower() == s:
-                self.pos += len(s)
-                return t, s
-        return None, None
-
-    def check_regex(self, regex):
-        import re
-        match = re.match(regex, self.text[self.pos:])
-        if not match:
-            return None
-        found = match.group(0)
-        self.pos += len(found)
-        return found
+        self.path = None
+        self.window = WINDOW_SIZE
+
+    @classmethod
+    def from_file(cls, path, window: int = WINDOW_SIZE) -> 'Lexer':
+        """
+        Create a lexer which streams the source from a file instead of holding
+        all of it in a string. The file is memory mapped and decoded one window at
+        a time so the memory used doesn't grow with the size of the file
+        :param path: The path of the source file, utf-8 encoded
+        :param window: The number of bytes decoded and scanned at a time
+        """
+        lxr = cls(None)
+        lxr.path = path
+        lxr.window = window
+        return lxr
+
+    def chunks(self):
+        """Returns a generator of (text, is_last) pairs covering the whole source"""
+        if self.path is None:
+            yield self.text, True
+            return
+
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:  # empty files can't be mapped
+                yield '', True
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+                for start in range(0, size, self.window):
+                    last = start + self.window >= size
+                    yield decoder.decode(buf[start:start + self.window], last), last
+
+    def positioned_tokens(self):
+        """Returns a generator which will produce a stream of (token identifier, token value,
+        line, column) tuples, lines and columns start from 1.
+
+        Each window is scanned with MASTER_PATTERN, the position is never used to
+        slice the text so the cost is linear in the size of the input. A token which
+        reaches the end of a window is carried over to the next one since it might
+        continue there, comments are carried over as a lone '{'.
+        Keywords are case insensitive and their value is the canonical spelling,
+        identifiers keep their case.
+        """
+        keywords = KEYWORDS
+        symbols = SYMBOL_TOKENS
+        line = 1
+        line_start = 0  # offset in the current text of the first character of the line
+        carry = ''
+        for chunk, last in self.chunks():
+            text = carry + chunk if carry else chunk
+            end = len(text)
+            carry = ''
+            for match in MASTER_PATTERN.finditer(text):
+                start, stop = match.span()
+                kind = match.lastgroup
+                if kind == 'skip':
+                    newlines = text.count('\n', start, stop)
+                    if newlines:
+                        line += newlines
+                        line_start = text.rindex('\n', start, stop) + 1
+                    if stop == end and not last and text.rfind('{', start) > text.rfind('}', start):
+                        carry = '{'  # still inside a comment
+                    continue
+                if stop == end and not last:
+                    carry = text[start:]
+                    break
+
+                col = start - line_start + 1
+                if kind == 'word':
+                    word = match.group()
+                    low = word.lower()
+                    if low in keywords:
+                        yield keywords[low], low, line, col
+                    else:
+                        yield 'ident', word, line, col
+                elif kind == 'number':
+                    yield 'number', int(match.group()), line, col
+                elif kind == 'symbol':
+                    sym = match.group()
+                    yield symbols[sym], sym, line, col
+                else:
+                    yield 'illegal', match.group(), line, col
+            # rebase the start of the line on the text of the next window
+            line_start -= end - len(carry)
+        yield 'illegal', 'end of file', line, 1 - line_start
 
     def tokens(self):
         """Returns a generator which will produce a stream of (token identifier, token value) pairs."""
-
-        while self.pos < len(self.text):
-            self.skip_whitespace()
-            t, s = self.check_symbol()
-            if s:
-                yield t, s
-                continue
-            t = self.check_regex(r'[0-9]+')
-            if t:
-                yield 'number', int(t)
-                continue
-            t = self.check_regex(r'\w+')
-            if t:
-                yield 'ident', t
-                continue
-            try:
-                t = self.text[self.pos]
-            except Exception:
-                t = 'end of file'  # at end of file this will fail because self.pos >= len(self.text)
-                yield 'illegal', t
-                break
+        for t, v, _, _ in self.positioned_tokens():
+            yield t, v
 
     def __iter__(self) -> 'LexerIter':
         return LexerIter(self)
@@ -110,7 +174,7 @@ class Lexer:
 
 class LexerIter():
     def __init__(self, lexer):
-        self.lxr = lexer.tokens()
+        self.lxr = lexer.positioned_tokens()
 
         # Current symbol/value, updated on succesful accept
         self.sym = None
@@ -119,6 +183,8 @@ class LexerIter():
         # Buffer values for rollback
         self.prev_val = None  # Updated on every non rollback next
         self.prev_sym = None  # See prev_val
+        self.prev_line = 0  # Position of prev_sym in the source
+        self.prev_col = 0
         self.has_prev = False  # Becomes true after a non rollback next,
         # is false after a rollback
         self.rollback = False
@@ -129,6 +195,16 @@ class LexerIter():
         self.rollback = True
         self.has_prev = False
 
+    def position(self) -> tuple[int, int]:
+        """The (line, column) of the last token read, rolled back or not"""
+        return self.prev_line, self.prev_col
+
+    def peek(self) -> str:
+        """:return: the identifier of the next token without consuming it"""
+        s, _ = next(self)
+        self.roll_back()
+        return s
+
     def preview(self, sym, *alts) -> bool:
         r = self.accept(sym, *alts)
         if r is None:
@@ -155,7 +231,7 @@ class LexerIter():
         """
         r = self.accept(sym, *alts)
         if r is None:
-            raise LexerException("Expecting ", sym, " failed")
+            raise LexerException("Expecting ", sym, " failed at line %d, column %d" % self.position())
         return r
 
     def __next__(self):
@@ -166,13 +242,173 @@ class LexerIter():
             self.has_prev = True
             return s, v
 
-        s, v = next(self.lxr)
+        s, v, self.prev_line, self.prev_col = next(self.lxr)
         self.prev_val = v
         self.prev_sym = s
         self.has_prev = True
         return s, v
 
 
+TOKEN_KINDS = tuple(TOKEN_DEFS) + ('number', 'ident', 'illegal')
+KIND_IDS = {k: i for i, k in enumerate(TOKEN_KINDS)}
+NUMBER_KIND = KIND_IDS['number']
+
+
+class TokenStream:
+    """
+    A pre tokenized source, lexing it is a separate phase from parsing and the
+    result can be stored or reused.
+    Tokens are kept in parallel arrays instead of a tuple per token:
+    + kinds: the index of the token identifier in TOKEN_KINDS
+    + values: the value for numbers, the index in strings for all other tokens
+    + lines, cols: the position of the token in the source
+
+    Identifiers and keyword spellings are interned, each distinct name is stored
+    once and all the tokens with that name share the same string object, so
+    comparisons between names (eg in SymbolTable.lookup) are identity checks
+    """
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.values = array('q')
+        self.lines = array('i')
+        self.cols = array('i')
+        self.strings: list[str] = []
+        self.string_ids: dict[str, int] = {}
+
+    @classmethod
+    def from_lexer(cls, lexer: Lexer) -> 'TokenStream':
+        stream = cls()
+        kind_ids = KIND_IDS
+        kinds, values = stream.kinds, stream.values
+        lines, cols = stream.lines, stream.cols
+        intern = stream.intern
+        for t, v, line, col in lexer.positioned_tokens():
+            kind = kind_ids[t]
+            kinds.append(kind)
+            values.append(v if kind == NUMBER_KIND else intern(v))
+            lines.append(line)
+            cols.append(col)
+        return stream
+
+    def intern(self, name: str) -> int:
+        """
+        :return: The index of name in the string table, adding it if needed
+        """
+        idx = self.string_ids.get(name)
+        if idx is None:
+            idx = len(self.strings)
+            self.strings.append(sys.intern(name))
+            self.string_ids[name] = idx
+        return idx
+
+    def __setstate__(self, state):
+        # Unpickled strings are new objects, intern them again
+        self.__dict__.update(state)
+        self.strings = [sys.intern(s) for s in self.strings]
+        self.string_ids = {s: i for i, s in enumerate(self.strings)}
+
+    def token(self, idx: int) -> tuple:
+        """
+        :return: The (token identifier, token value) pair at position idx
+        """
+        kind = self.kinds[idx]
+        val = self.values[idx]
+        if kind == NUMBER_KIND:
+            return TOKEN_KINDS[kind], val
+        return TOKEN_KINDS[kind], self.strings[val]
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __iter__(self) -> 'TokenCursor':
+        return TokenCursor(self)
+
+
+class TokenCursor:
+    """
+    A position in a TokenStream with the same interface as LexerIter.
+    Since the tokens are already stored moving in the stream is just changing an
+    index: lookahead with peek and going back any number of tokens with roll_back
+    or reset are O(1)
+    """
+
+    def __init__(self, stream: TokenStream):
+        self.stream = stream
+        self.idx = 0  # The next token to read
+        self.last = 0  # The last token read, for position()
+
+        # Current symbol/value, updated on succesful accept
+        self.sym = None
+        self.val = None
+
+    def mark(self) -> int:
+        """:return: a value to give to reset to go back to the current position"""
+        return self.idx
+
+    def reset(self, mark: int):
+        self.idx = mark
+
+    def roll_back(self, count=1):
+        if count > self.idx:
+            raise LexerException("Can't rollback more")
+        self.idx -= count
+
+    def position(self) -> tuple[int, int]:
+        """The (line, column) of the last token read, rolled back or not"""
+        return self.stream.lines[self.last], self.stream.cols[self.last]
+
+    def peek(self, ahead=0) -> Optional[str]:
+        """:return: the identifier of the token ahead positions after the next one,
+        None past the end of the stream"""
+        idx = self.idx + ahead
+        if idx >= len(self.stream.kinds):
+            return None
+        self.last = idx
+        return TOKEN_KINDS[self.stream.kinds[idx]]
+
+    def preview(self, sym, *alts) -> bool:
+        s = self.peek()
+        return (s == sym) or (s in alts)
+
+    def accept(self, sym, *alts) -> Optional[tuple]:
+        """If the first item is the expected symbol return the symbol/value
+        and move past it, otherwise return None"""
+        idx = self.idx
+        stream = self.stream
+        if idx >= len(stream.kinds):
+            raise StopIteration()
+        self.last = idx
+        kind = stream.kinds[idx]
+        s = TOKEN_KINDS[kind]
+        if (s == sym) or (s in alts):
+            v = stream.values[idx]
+            if kind != NUMBER_KIND:
+                v = stream.strings[v]
+            self.idx = idx + 1
+            self.sym = s
+            self.val = v
+            return s, v
+        return None
+
+    def expect(self, sym, *alts) -> tuple:
+        """
+        Call accept and Error on False
+        """
+        r = self.accept(sym, *alts)
+        if r is None:
+            raise LexerException("Expecting ", sym, " failed at line %d, column %d" % self.position())
+        return r
+
+    def __next__(self):
+        idx = self.idx
+        if idx >= len(self.stream.kinds):
+            raise StopIteration()
+        self.last = idx
+        self.idx = idx + 1
+        return self.stream.token(idx)
+
+
 # Test support
 __test_program = '''VAR x, y, squ;
 VAR arr[5]: char;
@@ -14,7 +14,7 @@ ir = src.IR.IR
 
 class Parser(Logged, ABC):
     def __init__(self, lxr: lexer.Lexer):
-        if type(lxr) is src.lexer.LexerIter:
+        if type(lxr) in (src.lexer.LexerIter, src.lexer.TokenCursor):
             self.lxr = lxr
         else:
             self.lxr: src.lexer.LexerIter = iter(lxr)
@@ -31,6 +31,17 @@ class Parser(Logged, ABC):
         parse_el = cls_to_parse.create_parser(self.lxr)
         return parse_el.parse(*args, **kwargs)
 
+    def assignment_target(self, symtab: SymbolTable, name: str) -> tuple[Symbol, int]:
+        """
+        The symbol assigned by an assignment or a read, with its nesting
+        distance, constants can't be assigned
+        """
+        target, levels = symtab.resolve(name)
+        if target is not None and target.alloct == 'const':
+            raise ParseException("Assignment to the constant %s at line %d, column %d"
+                                 % ((name,) + self.lxr.position()))
+        return target, levels
+
     @abc.abstractmethod
     def parse(self, *args, **kwargs) -> IRNode:
         pass
@@ -114,10 +125,11 @@ class ConstDef(Parser):
             _, name = self.lxr.expect('ident')
             self.lxr.expect('eql')
             _, val = self.lxr.expect('number')
+            # Constants are replaced by their value when used, they take no storage
             symtab.append(Symbol(name,
                                  TYPENAMES['int'],
-                                 alloct=alloct),
-                          int(val))
+                                 value=int(val),
+                                 alloct='const'))
             if not self.lxr.accept('comma'):
                 break
         return src.IR.IR.Placebo()
@@ -174,20 +186,22 @@ class Statement(Parser):
         elif self.lxr.preview('read'):
             return self.parse_item(Read, symtab)
         else:
-            raise ParseException("Can't parse Statement")
+            raise ParseException("Can't parse Statement at line %d, column %d"
+                                 % self.lxr.position())
 
 
 class Assignment(Statement, ArrayUtils):
     def parse(self, symtab: SymbolTable, *args, **kwargs) -> IRNode:
         _, targ = self.lxr.expect('ident')
+        target, levels = self.assignment_target(symtab, targ)
         offset = self.array_offset(symtab, targ)
         self.lxr.expect('becomes')
         expr = self.parse_item(Expression, symtab)
-        targ = symtab.lookup(targ)
-        return src.IR.IR.AssignStat(target=targ,
+        return src.IR.IR.AssignStat(target=target,
                                     offset=offset,
                                     expression=expr,
-                                    symtab=symtab)
+                                    symtab=symtab,
+                                    levels=levels)
 
 
 class FuncCall(Statement):
@@ -247,12 +261,13 @@ class Read(ArrayUtils, Statement):
     def parse(self, symtab: SymbolTable, *args, **kwargs) -> IRNode:
         self.lxr.expect('read')
         _, targ = self.lxr.expect('ident')
-        target = symtab.lookup(targ)
+        target, levels = self.assignment_target(symtab, targ)
         offset = self.array_offset(symtab, targ)
         return ir.AssignStat(target=target,
                              offset=offset,
                              expression=ir.ReadStat(symtab=symtab),
-                             symtab=symtab)
+                             symtab=symtab,
+                             levels=levels)
 
 
 class Expression(Parser):
@@ -296,19 +311,22 @@ class Condition(Parser):
                 expr2 = self.parse_item(Expression, symtab)
                 return ir.BinExpr(op=op, operands=[expr, expr2], symtab=symtab)
             else:
-                raise ParseException("Invalid operator for condition")
+                raise ParseException("Invalid operator for condition at line %d, column %d"
+                                     % self.lxr.position())
 
 
 class Factor(ArrayUtils, Parser):
     def parse(self, symtab, *args, **kwargs) -> IRNode:
         if tup := self.lxr.accept('ident'):
             _, var_n = tup
-            var = symtab.lookup(var_n)
+            var, levels = symtab.resolve(var_n)
+            if var is not None and var.alloct == 'const':
+                return ir.Const(value=var.value, symtab=symtab)
             offs = self.array_offset(symtab, var_n)
             if offs is None:
-                return ir.Var(var=var, symtab=symtab)
+                return ir.Var(var=var, symtab=symtab, levels=levels)
             else:
-                return ir.ArrayElement(var=var, offset=offs, symtab=symtab)
+                return ir.ArrayElement(var=var, offset=offs, symtab=symtab, levels=levels)
         elif tup := self.lxr.accept('number'):
             _, num = tup
             return ir.Const(value=int(num), symtab=symtab)
@@ -317,4 +335,5 @@ class Factor(ArrayUtils, Parser):
             self.lxr.expect('rparen')
             return expr
         else:
-            raise ParseException("Syntax error while parsing Factor")
+            raise ParseException("Syntax error while parsing Factor at line %d, column %d"
+                                 % self.lxr.position())
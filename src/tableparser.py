@@ -0,0 +1,256 @@
+"""
+Alternative parser engine producing the same src.IR.IR tree as the classes in
+src.parser.
+
+A single TableParser object parses the whole program: statements are chosen by
+looking up the next token in a dispatch table instead of trying each production
+in turn, and expressions are parsed by precedence climbing over the binary
+operator table instead of creating an Expression, Term and Factor parser for
+every operand.
+"""
+from typing import Optional as Opt
+
+import src.IR.IR
+import src.lexer as lexer
+from src.IR.IR import IRNode
+from src.Symbols.Symbols import Symbol, SymbolTable, ArrayType, TYPENAMES
+from src.parser import ArrayUtils
+from src.utils.Exceptions import ParseException
+
+ir = src.IR.IR
+
+BINARY_PRECEDENCE = {
+    'plus': 1,
+    'minus': 1,
+    'times': 2,
+    'slash': 2,
+}
+UNARY_PRECEDENCE = 2  # A leading sign applies to the whole first term
+RELATIONS = ('eql', 'neq', 'lss', 'leq', 'gtr', 'geq')
+
+
+class TableParser:
+    def __init__(self, lxr):
+        if type(lxr) in (lexer.LexerIter, lexer.TokenCursor):
+            self.lxr = lxr
+        else:
+            self.lxr = iter(lxr)
+
+        self.statements = {
+            'ident': self.assignment,
+            'callsym': self.func_call,
+            'beginsym': self.stat_list,
+            'ifsym': self.if_stat,
+            'whilesym': self.while_stat,
+            'print': self.print_stat,
+            'read': self.read_stat,
+        }
+
+    def error(self, msg: str) -> ParseException:
+        return ParseException(msg + " at line %d, column %d" % self.lxr.position())
+
+    def assignment_target(self, symtab: SymbolTable, name: str) -> tuple[Symbol, int]:
+        target, levels = symtab.resolve(name)
+        if target is not None and target.alloct == 'const':
+            raise self.error(f"Assignment to the constant {name}")
+        return target, levels
+
+    def parse(self) -> IRNode:
+        global_symtab = SymbolTable()
+        prog = self.block(global_symtab)
+        self.lxr.expect('period')
+        return prog
+
+    # Declarations
+
+    def block(self, symtab: SymbolTable, alloct='auto', function=None) -> IRNode:
+        if function is None:
+            local = symtab  # the global block uses the global table
+        else:
+            local = symtab.create_local()
+        defs = ir.DefinitionList()
+
+        while True:
+            if self.lxr.accept('constsym'):
+                self.const_def(local, alloct)
+            elif self.lxr.accept('varsym'):
+                self.var_def(local, alloct)
+                while self.lxr.accept('comma'):
+                    self.var_def(local, alloct)
+            else:
+                break
+            self.lxr.expect('semicolon')
+
+        while self.lxr.accept('procsym'):
+            defs.append(self.func_def(local))
+
+        stat = self.statement(local)
+        return ir.Block(symtab=local, defs=defs, body=stat, function=function)
+
+    def const_def(self, symtab: SymbolTable, alloct):
+        while True:
+            _, name = self.lxr.expect('ident')
+            self.lxr.expect('eql')
+            _, val = self.lxr.expect('number')
+            symtab.append(Symbol(name, TYPENAMES['int'], value=int(val), alloct='const'))
+            if not self.lxr.accept('comma'):
+                break
+
+    def var_def(self, symtab: SymbolTable, alloct):
+        _, name = self.lxr.expect('ident')
+        size = []
+        while self.lxr.accept('lspar'):
+            _, n = self.lxr.expect('number')
+            size.append(int(n))
+            self.lxr.expect('rspar')
+
+        typ = TYPENAMES['int']
+        if self.lxr.accept('colon'):
+            _, typ = self.lxr.accept('ident')
+            typ = TYPENAMES[typ]
+
+        if len(size) > 0:
+            symtab.append(Symbol(name, ArrayType(None, size, typ), alloct=alloct))
+        else:
+            symtab.append(Symbol(name, typ, alloct=alloct))
+
+    def func_def(self, symtab: SymbolTable) -> IRNode:
+        _, fname = self.lxr.expect('ident')
+        self.lxr.expect('semicolon')
+        fsym = Symbol(fname, TYPENAMES['function'])
+        symtab.append(fsym)
+
+        fbody = self.block(symtab, function=fsym)
+        self.lxr.expect('semicolon')
+        return ir.FunctionDef(symbol=symtab.lookup(fname), body=fbody)
+
+    # Statements
+
+    def statement(self, symtab: SymbolTable) -> IRNode:
+        handler = self.statements.get(self.lxr.peek())
+        if handler is None:
+            raise self.error("Can't parse Statement")
+        return handler(symtab)
+
+    def assignment(self, symtab: SymbolTable) -> IRNode:
+        _, targ = self.lxr.expect('ident')
+        target, levels = self.assignment_target(symtab, targ)
+        offset = self.array_offset(symtab, targ)
+        self.lxr.expect('becomes')
+        expr = self.expression(symtab)
+        return ir.AssignStat(target=target,
+                             offset=offset,
+                             expression=expr,
+                             symtab=symtab,
+                             levels=levels)
+
+    def func_call(self, symtab: SymbolTable) -> IRNode:
+        self.lxr.expect('callsym')
+        _, fun = self.lxr.expect('ident')
+        return ir.CallStat(call_expr=ir.CallExpr(function=fun, symtab=symtab),
+                           symtab=symtab)
+
+    def stat_list(self, symtab: SymbolTable) -> IRNode:
+        self.lxr.expect('beginsym')
+        stat_list = ir.StatList(symtab=symtab)
+        while True:
+            stat_list.append(self.statement(symtab))
+            if not self.lxr.accept('semicolon'):
+                break
+        self.lxr.expect('endsym')
+        return stat_list
+
+    def if_stat(self, symtab: SymbolTable) -> IRNode:
+        self.lxr.expect('ifsym')
+        cond = self.condition(symtab)
+        self.lxr.expect('thensym')
+        then = self.statement(symtab)
+        els = None
+        if self.lxr.accept('elsesym'):
+            els = self.statement(symtab)
+        return ir.IfStat(cond=cond, then=then, els=els, symtab=symtab)
+
+    def while_stat(self, symtab: SymbolTable) -> IRNode:
+        self.lxr.expect('whilesym')
+        cond = self.condition(symtab)
+        self.lxr.expect('dosym')
+        body = self.statement(symtab)
+        return ir.WhileStat(cond=cond, body=body, symtab=symtab)
+
+    def print_stat(self, symtab: SymbolTable) -> IRNode:
+        self.lxr.expect('print')
+        return ir.PrintStat(exp=self.expression(symtab), symtab=symtab)
+
+    def read_stat(self, symtab: SymbolTable) -> IRNode:
+        self.lxr.expect('read')
+        _, targ = self.lxr.expect('ident')
+        target, levels = self.assignment_target(symtab, targ)
+        offset = self.array_offset(symtab, targ)
+        return ir.AssignStat(target=target,
+                             offset=offset,
+                             expression=ir.ReadStat(symtab=symtab),
+                             symtab=symtab,
+                             levels=levels)
+
+    # Expressions
+
+    def condition(self, symtab: SymbolTable) -> IRNode:
+        if self.lxr.accept('oddsym'):
+            return ir.UnExpr(op='odd', trgt=self.expression(symtab), symtab=symtab)
+        expr = self.expression(symtab)
+        if tup := self.lxr.accept(*RELATIONS):
+            op, _ = tup
+            return ir.BinExpr(op=op, operands=[expr, self.expression(symtab)], symtab=symtab)
+        raise self.error("Invalid operator for condition")
+
+    def expression(self, symtab: SymbolTable) -> IRNode:
+        if tup := self.lxr.accept('plus', 'minus'):
+            op, _ = tup
+            operand = self.climb(self.factor(symtab), UNARY_PRECEDENCE, symtab)
+            left = ir.UnExpr(op=op, trgt=operand, symtab=symtab)
+        else:
+            left = self.factor(symtab)
+        return self.climb(left, 1, symtab)
+
+    def climb(self, left: IRNode, min_prec: int, symtab: SymbolTable) -> IRNode:
+        """
+        Extend left with all the binary operators of precedence at least min_prec,
+        operators of the same precedence associate to the left
+        """
+        while (prec := BINARY_PRECEDENCE.get(self.lxr.peek(), 0)) >= min_prec:
+            op, _ = next(self.lxr)
+            right = self.factor(symtab)
+            while BINARY_PRECEDENCE.get(self.lxr.peek(), 0) > prec:
+                right = self.climb(right, prec + 1, symtab)
+            left = ir.BinExpr(op=op, operands=[left, right], symtab=symtab)
+        return left
+
+    def factor(self, symtab: SymbolTable) -> IRNode:
+        if tup := self.lxr.accept('ident'):
+            _, var_n = tup
+            var, levels = symtab.resolve(var_n)
+            if var is not None and var.alloct == 'const':
+                return ir.Const(value=var.value, symtab=symtab)
+            offs = self.array_offset(symtab, var_n)
+            if offs is None:
+                return ir.Var(var=var, symtab=symtab, levels=levels)
+            return ir.ArrayElement(var=var, offset=offs, symtab=symtab, levels=levels)
+        elif tup := self.lxr.accept('number'):
+            _, num = tup
+            return ir.Const(value=int(num), symtab=symtab)
+        elif self.lxr.accept('lparen'):
+            expr = self.expression(symtab)
+            self.lxr.expect('rparen')
+            return expr
+        raise self.error("Syntax error while parsing Factor")
+
+    def array_offset(self, symtab: SymbolTable, target: str) -> Opt[IRNode]:
+        target: Symbol = symtab.lookup(target)
+        if not isinstance(target.stype, ArrayType):
+            return None
+        idxs = []
+        for _ in target.stype.dims:
+            self.lxr.expect('lspar')
+            idxs.append(self.expression(symtab))
+            self.lxr.expect('rspar')
+        return ArrayUtils.linearize_multid_vector(idxs, target, symtab)
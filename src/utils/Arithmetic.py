@@ -0,0 +1,62 @@
+"""
+The meaning of the operators of the language on integers, shared by constant
+folding, constant propagation, the interpreter of the lowered program and the
+register allocators
+"""
+INT_BITS = 32
+
+
+def wrap(value: int) -> int:
+    """Reduce value to a signed integer of INT_BITS bits"""
+    value &= (1 << INT_BITS) - 1
+    if value >> (INT_BITS - 1):
+        value -= 1 << INT_BITS
+    return value
+
+
+def wrap_to(value: int, stype: 'Type') -> int:
+    """Reduce value to the range of the integer type"""
+    bits = stype.size or 32
+    value &= (1 << bits) - 1
+    if 'unsigned' not in stype.qual_list and value >> (bits - 1):
+        value -= 1 << bits
+    return value
+
+
+def same_representation(value_type: 'Type', memory_type: 'Type') -> bool:
+    """Whether storing a value of value_type to memory_type and loading it back gives the same value"""
+    return value_type.size == memory_type.size and \
+        ('unsigned' in value_type.qual_list) == ('unsigned' in memory_type.qual_list)
+
+
+def divide(a: int, b: int) -> int:
+    """Division truncating towards zero"""
+    quot = abs(a) // abs(b)
+    return quot if (a < 0) == (b < 0) else -quot
+
+
+BINARY_OPS = {
+    'plus': lambda a, b: a + b,
+    'minus': lambda a, b: a - b,
+    'times': lambda a, b: a * b,
+    'slash': divide,
+    'eql': lambda a, b: int(a == b),
+    'neq': lambda a, b: int(a != b),
+    'lss': lambda a, b: int(a < b),
+    'leq': lambda a, b: int(a <= b),
+    'gtr': lambda a, b: int(a > b),
+    'geq': lambda a, b: int(a >= b),
+}
+
+UNARY_OPS = {
+    'plus': lambda a: a,
+    'minus': lambda a: -a,
+    'odd': lambda a: a & 1,
+}
+
+COMMUTATIVE = {'plus', 'times', 'eql', 'neq'}
+
+RELATIONS = {'eql', 'neq', 'lss', 'leq', 'gtr', 'geq'}
+
+# a op b is the same as b MIRRORED[op] a for the relations which are not commutative
+MIRRORED = {'lss': 'gtr', 'gtr': 'lss', 'leq': 'geq', 'geq': 'leq'}
@@ -16,3 +16,11 @@ class CFGException(Exception):
 
 class CodegenException(Exception):
     pass
+
+
+class SerializationException(Exception):
+    pass
+
+
+class InterpreterException(Exception):
+    pass
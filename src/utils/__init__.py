@@ -1 +1 @@
-from . import Exceptions, Logger, markers
+from . import Arithmetic, Exceptions, Logger, markers
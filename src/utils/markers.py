@@ -5,6 +5,7 @@ import src
 
 
 class Codegen(abc.ABC):
+    __slots__ = ()
 
     # TODO: @abc.abstractmethod
     def emit_code(self, code: 'Code', *,
@@ -25,6 +26,8 @@ class Codegen(abc.ABC):
 
 
 class Lowered(Codegen):
+    __slots__ = ()
+
     def set_label(self, label):
         raise NotImplementedError()
 